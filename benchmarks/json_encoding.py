@@ -0,0 +1,128 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+"""
+Benchmark: marshal() against the compiled ModelEncoder
+
+Builds a Wishlist with many items in memory, then times the encoding of
+the bodies of GET /wishlists/{id} and GET /wishlists/{id}/items both ways:
+serialize(), marshal() and json.dumps as the routes did, and the
+ModelEncoder the routes use now. The two bodies are checked to be equal.
+
+    python -m benchmarks.json_encoding --items 1000
+
+No query is run, the app only needs a DATABASE_URI it can create
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+
+def build_wishlist(items: int, seed: int):
+    """Returns a Wishlist with items, none of them in the database"""
+    from service.models import Wishlist, WishlistItem  # pylint: disable=import-outside-toplevel
+
+    rng = random.Random(seed)
+    wishlist = Wishlist()
+    wishlist.id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    wishlist.customer_id = "customer"
+    wishlist.name = "benchmark"
+    wishlist.created_date = date(2024, 1, 1)
+    wishlist.modified_date = date(2024, 6, 1)
+    for _ in range(items):
+        item = WishlistItem()
+        item.id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        item.wishlist_id = wishlist.id
+        item.product_id = f"product-{rng.randrange(100000)}"
+        item.description = f"Item number {rng.randrange(100000)} é"
+        item.price_cents = rng.randrange(100, 100000)
+        item.added_date = item.modified_date = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+        wishlist.items.append(item)
+    return wishlist
+
+
+def timings(encode, repeat: int) -> list:
+    """Returns the seconds taken by each call"""
+    result = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode()
+        result.append(time.perf_counter() - start)
+    return result
+
+
+def percentile(values, fraction) -> float:
+    """Returns a percentile of the timings in milliseconds"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1e3
+
+
+def run(items: int, repeat: int, seed: int):
+    """Times both encodings of both bodies and prints the measurements"""
+    # pylint: disable=import-outside-toplevel
+    from flask_restx import marshal
+    from wsgi import app
+    from service import routes
+
+    with app.app_context():
+        wishlist = build_wishlist(items, seed)
+        cases = {
+            "wishlist": (
+                lambda: json.dumps(marshal(wishlist.serialize(), routes.wishlist_model)).encode(),
+                lambda: routes.wishlist_json.encode(wishlist),
+            ),
+            "items": (
+                lambda: json.dumps(marshal([item.serialize() for item in wishlist.items], routes.item_model)).encode(),
+                lambda: routes.item_json.encode_list(wishlist.items),
+            ),
+        }
+        print(f"{items} items, {repeat} runs")
+        print(f"{'body':<10}{'encoder':<10}{'KiB':>8}{'p50 ms':>10}{'p95 ms':>10}{'speedup':>10}")
+        for body, (marshalled, encoded) in cases.items():
+            report(body, marshalled, encoded, repeat)
+
+
+def report(body: str, marshalled, encoded, repeat: int):
+    """Checks that both encodings give the same bytes and prints their timings"""
+    if marshalled() != encoded():
+        raise SystemExit(f"The {body} bodies differ")
+    size = len(encoded()) / 1024
+    before = timings(marshalled, repeat)
+    for label, values in (("marshal", before), ("compiled", timings(encoded, repeat))):
+        speedup = percentile(before, 0.5) / percentile(values, 0.5)
+        print(
+            f"{body:<10}{label:<10}{size:>8.0f}{percentile(values, 0.5):>10.2f}"
+            f"{percentile(values, 0.95):>10.2f}{speedup:>9.1f}x"
+        )
+
+
+def main():
+    """Parses the command line and runs the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    os.environ.setdefault("DATABASE_URI", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'json_encoding.db')}")
+    run(args.items, args.repeat, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+"""
+Benchmark: latency and throughput of every route
+
+Seeds the database with flask db-seed datasets of several sizes, then sends
+each route of service/routes.py through app.test_client() and reports the
+requests per second and the p50/p95/p99 latency of each one. The wishlists
+and items a request needs are picked from the dataset, or created before the
+timed request when it deletes them.
+
+    python -m benchmarks.routes --sizes 100,1000 --output baseline.json
+    python -m benchmarks.routes --sizes 100,1000 --compare baseline.json --threshold 0.25
+
+With --compare the run fails when the chosen latency of a route grew by more
+than the threshold (and more than --noise-ms) against the baseline.
+
+The response cache is turned off, so that the GETs are timed end to end
+rather than as replays of their first response.
+
+Every table of the database is dropped and created again for each size:
+point --database-uri at a scratch database, a temporary SQLite file by default
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+# A route to time: prepare(client, targets) returns the method, URL and body of one request
+Scenario = namedtuple("Scenario", ["name", "prepare"])
+# Latency metrics of the JSON results, in milliseconds
+METRICS = ("p50", "p95", "p99")
+SAMPLE_SIZE = 1000
+WARMUP = 5
+
+
+class Targets:
+    """Wishlists and items of the dataset that the requests are sent to"""
+
+    def __init__(self, rng, wishlists, items):
+        self.rng = rng
+        self.wishlists = wishlists
+        self.items = items
+        self.created = 0
+
+    def wishlist(self):
+        """Returns the id and the customer_id of a Wishlist of the dataset"""
+        return self.rng.choice(self.wishlists)
+
+    def item(self):
+        """Returns the id and the wishlist_id of an item of the dataset"""
+        return self.rng.choice(self.items)
+
+    def new_wishlist(self, items=3):
+        """Returns the body of a new Wishlist of a new customer"""
+        self.created += 1
+        return {
+            "customer_id": f"bench-{self.created:08d}",
+            "name": f"Benchmark {self.created}",
+            "items": [self.new_item(None) for _ in range(items)],
+        }
+
+    def new_item(self, wishlist_id):
+        """Returns the body of a new item"""
+        return {
+            # deserialize() wants one even in a new Wishlist, which sets its own
+            "wishlist_id": wishlist_id or "00000000-0000-0000-0000-000000000000",
+            "product_id": f"product-{self.rng.randrange(10000):06d}",
+            "description": "Benchmark item",
+            "price": self.rng.randrange(100, 50000) / 100,
+        }
+
+
+def created(client, url, body) -> str:
+    """POSTs a body, untimed, and returns the id it created"""
+    resp = client.post(url, json=body)
+    if resp.status_code != 201:
+        raise SystemExit(f"POST {url} answered {resp.status_code}: {resp.get_data(as_text=True)}")
+    return resp.get_json()["id"]
+
+
+def move(client, targets):
+    """Moves an item between two Wishlists of a customer created beforehand"""
+    body = targets.new_wishlist(0)
+    wishlist_id = created(client, "/api/wishlists", body)
+    target_id = created(client, "/api/wishlists", dict(body, name="Target"))
+    item_id = created(client, f"/api/wishlists/{wishlist_id}/items", targets.new_item(wishlist_id))
+    return "PUT", f"/api/wishlists/{wishlist_id}/items/{item_id}/move-to/{target_id}", None
+
+
+def scenarios() -> list:
+    """Returns a Scenario for each route, with the query parameters clients use"""
+    # pylint: disable=unnecessary-lambda-assignment
+    wishlist = lambda t: t.wishlist()[0]  # noqa: E731
+    return [
+        Scenario("GET /", lambda c, t: ("GET", "/", None)),
+        Scenario("GET /health", lambda c, t: ("GET", "/health", None)),
+        Scenario("GET /health/pool", lambda c, t: ("GET", "/health/pool", None)),
+        Scenario("GET /health/cache", lambda c, t: ("GET", "/health/cache", None)),
+        Scenario("GET /wishlists", lambda c, t: ("GET", "/api/wishlists?limit=20", None)),
+        Scenario("GET /wishlists?view=summary", lambda c, t: ("GET", "/api/wishlists?view=summary", None)),
+        Scenario(
+            "GET /wishlists?customer_id", lambda c, t: ("GET", f"/api/wishlists?customer_id={t.wishlist()[1]}", None)
+        ),
+        Scenario("GET /wishlists/{id}", lambda c, t: ("GET", f"/api/wishlists/{wishlist(t)}", None)),
+        Scenario(
+            "GET /wishlists/{id}?fields",
+            lambda c, t: ("GET", f"/api/wishlists/{wishlist(t)}?fields=id,name,item_count,total_value", None),
+        ),
+        Scenario(
+            "GET /wishlists/{id}/items?sort_by",
+            lambda c, t: ("GET", f"/api/wishlists/{wishlist(t)}/items?sort_by=price&order=desc&limit=20", None),
+        ),
+        Scenario(
+            "GET /wishlists/{id}/items?min_price",
+            lambda c, t: ("GET", f"/api/wishlists/{wishlist(t)}/items?min_price=10&price=250", None),
+        ),
+        Scenario("GET /wishlists/{id}/items/{id}", get_item),
+        Scenario(
+            "GET /wishlists/export?customer_id",
+            lambda c, t: ("GET", f"/api/wishlists/export?customer_id={t.wishlist()[1]}", None),
+        ),
+        Scenario("POST /wishlists", lambda c, t: ("POST", "/api/wishlists", t.new_wishlist())),
+        Scenario(
+            "POST /wishlists:batch",
+            lambda c, t: ("POST", "/api/wishlists:batch", [t.new_wishlist(2) for _ in range(10)]),
+        ),
+        Scenario(
+            "PUT /wishlists/{id}",
+            lambda c, t: ("PUT", f"/api/wishlists/{wishlist(t)}", dict(t.new_wishlist(0), customer_id="bench")),
+        ),
+        Scenario("POST /wishlists/{id}/items", post_item),
+        Scenario("POST /wishlists/{id}/items:batch", post_items),
+        Scenario("PUT /wishlists/{id}/items/{id}", put_item),
+        Scenario("PUT /wishlists/{id}/items/{id}/move-to/{id}", move),
+        Scenario("DELETE /wishlists/{id}/items/{id}", delete_item),
+        Scenario("DELETE /wishlists/{id}/items", delete_items),
+        Scenario("DELETE /wishlists/{id}", delete_wishlist),
+        Scenario("DELETE /wishlists/customers/{id}", delete_customer),
+    ]
+
+
+def get_item(client, targets):  # pylint: disable=unused-argument
+    """Reads an item of the dataset"""
+    item_id, wishlist_id = targets.item()
+    return "GET", f"/api/wishlists/{wishlist_id}/items/{item_id}", None
+
+
+def post_item(client, targets):  # pylint: disable=unused-argument
+    """Adds an item to a Wishlist of the dataset"""
+    wishlist_id = targets.wishlist()[0]
+    return "POST", f"/api/wishlists/{wishlist_id}/items", targets.new_item(wishlist_id)
+
+
+def post_items(client, targets):  # pylint: disable=unused-argument
+    """Adds ten items to a Wishlist of the dataset"""
+    wishlist_id = targets.wishlist()[0]
+    return "POST", f"/api/wishlists/{wishlist_id}/items:batch", [targets.new_item(wishlist_id) for _ in range(10)]
+
+
+def put_item(client, targets):  # pylint: disable=unused-argument
+    """Reprices an item of the dataset"""
+    item_id, wishlist_id = targets.item()
+    return "PUT", f"/api/wishlists/{wishlist_id}/items/{item_id}", targets.new_item(wishlist_id)
+
+
+def delete_item(client, targets):
+    """Deletes an item added beforehand to a Wishlist of the dataset"""
+    wishlist_id = targets.wishlist()[0]
+    item_id = created(client, f"/api/wishlists/{wishlist_id}/items", targets.new_item(wishlist_id))
+    return "DELETE", f"/api/wishlists/{wishlist_id}/items/{item_id}", None
+
+
+def delete_items(client, targets):
+    """Deletes the items of a Wishlist created beforehand"""
+    wishlist_id = created(client, "/api/wishlists", targets.new_wishlist(5))
+    return "DELETE", f"/api/wishlists/{wishlist_id}/items", None
+
+
+def delete_wishlist(client, targets):
+    """Deletes a Wishlist created beforehand"""
+    wishlist_id = created(client, "/api/wishlists", targets.new_wishlist())
+    return "DELETE", f"/api/wishlists/{wishlist_id}", None
+
+
+def delete_customer(client, targets):
+    """Deletes the Wishlists of a customer created beforehand"""
+    body = targets.new_wishlist()
+    created(client, "/api/wishlists", body)
+    created(client, "/api/wishlists", dict(body, name="Second"))
+    return "DELETE", f"/api/wishlists/customers/{body['customer_id']}", None
+
+
+######################################################################
+#  M E A S U R E M E N T S
+######################################################################
+def percentile(values, fraction) -> float:
+    """Returns a percentile of the timings in milliseconds"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1e3
+
+
+def measure(client, targets, scenario, requests) -> dict:
+    """Sends the requests of a scenario one at a time and returns their metrics"""
+    timings = []
+    for number in range(WARMUP + requests):
+        method, url, body = scenario.prepare(client, targets)
+        start = time.perf_counter()
+        resp = client.open(url, method=method, json=body)
+        resp.get_data()  # streamed bodies are produced while they are read
+        elapsed = time.perf_counter() - start
+        resp.close()
+        if resp.status_code >= 400:
+            raise SystemExit(f"{scenario.name} answered {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+        if number >= WARMUP:
+            timings.append(elapsed)
+    return {
+        "requests_per_second": round(len(timings) / sum(timings), 1),
+        "p50": round(percentile(timings, 0.50), 3),
+        "p95": round(percentile(timings, 0.95), 3),
+        "p99": round(percentile(timings, 0.99), 3),
+    }
+
+
+def seed_targets(size, seed_value) -> Targets:
+    """Recreates the tables, seeds size customers and samples the dataset"""
+    # pylint: disable=import-outside-toplevel
+    from sqlalchemy import select
+    from service.common import seed
+    from service.models import Wishlist, WishlistItem, db
+
+    db.drop_all()
+    db.create_all()
+    seeded = seed.seed_database(size, seed=seed_value)
+    print(f"{size} customers: {seeded['wishlists']} wishlists, {seeded['items']} items", file=sys.stderr)
+    wishlists = db.session.execute(
+        select(Wishlist.id, Wishlist.customer_id).order_by(Wishlist.id).limit(SAMPLE_SIZE)
+    ).all()
+    items = db.session.execute(
+        select(WishlistItem.id, WishlistItem.wishlist_id).order_by(WishlistItem.id).limit(SAMPLE_SIZE)
+    ).all()
+    db.session.remove()
+    return Targets(random.Random(seed_value), [tuple(row) for row in wishlists], [tuple(row) for row in items])
+
+
+def run(sizes, requests, seed_value) -> dict:
+    """Measures every scenario at every size and returns the results"""
+    from wsgi import app  # pylint: disable=import-outside-toplevel
+    from service.common import response_cache  # pylint: disable=import-outside-toplevel
+
+    app.logger.setLevel("ERROR")
+    # Time the database and the encoders, not the replay of cached GETs
+    response_cache.cache.configure(0, app.config["RESPONSE_CACHE_MAX_BYTES"])
+    results = {}
+    with app.app_context():
+        for size in sizes:
+            targets = seed_targets(size, seed_value)
+            client = app.test_client()
+            results[str(size)] = {
+                scenario.name: measure(client, targets, scenario, requests) for scenario in scenarios()
+            }
+            print_results(size, results[str(size)])
+        database = app.config["SQLALCHEMY_DATABASE_URI"].split(":", 1)[0]
+    return {
+        "database": database,
+        "python": platform.python_version(),
+        "requests": requests,
+        "seed": seed_value,
+        "results": results,
+    }
+
+
+def print_results(size, routes):
+    """Prints the metrics of every route at one size"""
+    print(f"\n{size} customers")
+    print(f"{'route':<46}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, metrics in routes.items():
+        print(
+            f"{name:<46}{metrics['requests_per_second']:>9.0f}{metrics['p50']:>9.2f}"
+            f"{metrics['p95']:>9.2f}{metrics['p99']:>9.2f}"
+        )
+
+
+######################################################################
+#  C O M P A R I S O N
+######################################################################
+def regressions(baseline, current, metric="p50", threshold=0.25, noise_ms=0.2) -> list:
+    """Returns a line for each route whose metric grew past the threshold
+
+    A route only regresses when its latency grew by more than threshold
+    (a fraction of the baseline) and by more than noise_ms. Sizes and
+    routes missing from the baseline are skipped
+    """
+    found = []
+    for size, routes in current["results"].items():
+        for name, metrics in routes.items():
+            before = baseline["results"].get(size, {}).get(name)
+            if before is None:
+                continue
+            grown = metrics[metric] - before[metric]
+            if grown > noise_ms and grown > threshold * before[metric]:
+                found.append(
+                    f"{name} at {size} customers: {metric} {before[metric]:.2f} -> {metrics[metric]:.2f} ms "
+                    f"(+{grown / max(before[metric], 1e-9):.0%})"
+                )
+    return found
+
+
+def main():
+    """Parses the command line, runs the benchmark and writes or compares its results"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000", help="Comma separated customers of each dataset")
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per route and size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-uri", default=None)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Fail when a route regressed against this JSON baseline")
+    parser.add_argument("--metric", choices=METRICS, default="p50", help="Latency compared, p50 is the steadiest")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Largest growth allowed, 0.25 is 25%%")
+    parser.add_argument("--noise-ms", type=float, default=0.2, help="Growth always allowed, in milliseconds")
+    args = parser.parse_args()
+    # Never the DATABASE_URI of the environment, its tables are dropped
+    os.environ["DATABASE_URI"] = args.database_uri or (
+        f"sqlite:///{os.path.join(tempfile.gettempdir(), 'routes_benchmark.db')}"
+    )
+    results = run([int(size) for size in args.sizes.split(",")], args.requests, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as compared:
+            found = regressions(json.load(compared), results, args.metric, args.threshold, args.noise_ms)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            raise SystemExit(1)
+        print(f"\nNo route regressed by more than {args.threshold:.0%} on {args.metric}")
+
+
+if __name__ == "__main__":
+    main()
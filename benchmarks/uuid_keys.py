@@ -0,0 +1,141 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+"""
+Benchmark: String(36) keys against UUID keys
+
+Fills two scratch tables with the same keys, one storing them as text
+and one with the UUIDKey type of the models, then reports the size of
+their indexes and the latency of primary and foreign key lookups.
+
+    python -m benchmarks.uuid_keys --database-uri postgresql+psycopg://...
+
+The scratch tables are dropped when the benchmark ends
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+from sqlalchemy import Column, MetaData, String, Table, create_engine, select, text
+from sqlalchemy.exc import OperationalError
+from service.models import UUIDKey
+
+metadata = MetaData()
+TABLES = {
+    "String(36)": Table(
+        "bench_text_keys",
+        metadata,
+        Column("id", String(36), primary_key=True),
+        Column("parent_id", String(36), nullable=False, index=True),
+    ),
+    "UUIDKey": Table(
+        "bench_uuid_keys",
+        metadata,
+        Column("id", UUIDKey, primary_key=True),
+        Column("parent_id", UUIDKey, nullable=False, index=True),
+    ),
+}
+
+
+def index_bytes(connection, table: Table):
+    """Returns the bytes used by the indexes of a table, None if unknown"""
+    if connection.dialect.name == "postgresql":
+        return connection.execute(text("SELECT pg_indexes_size(:name)"), {"name": table.name}).scalar()
+    try:
+        return connection.execute(
+            text(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :name)"
+            ),
+            {"name": table.name},
+        ).scalar()
+    except OperationalError:  # SQLite built without the dbstat table
+        return None
+
+
+def lookup_latency(connection, column, keys) -> list:
+    """Returns the seconds taken by one lookup of each key"""
+    timings = []
+    for key in keys:
+        start = time.perf_counter()
+        connection.execute(select(column.table.c.id).where(column == key)).all()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def percentile(timings, fraction) -> float:
+    """Returns a percentile of the timings in microseconds"""
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1e6
+
+
+def fill(engine, table: Table, rows: list, batch_size: int = 10000):
+    """Inserts the (id, parent_id) rows into a table in batches"""
+    with engine.begin() as connection:
+        for start in range(0, len(rows), batch_size):
+            connection.execute(
+                table.insert(),
+                [{"id": key, "parent_id": parent} for key, parent in rows[start:start + batch_size]],
+            )
+        if engine.dialect.name == "postgresql":
+            connection.execute(text(f"ANALYZE {table.name}"))
+
+
+def run(database_uri: str, rows: int, lookups: int, seed: int):
+    """Fills both tables and prints the measurements"""
+    engine = create_engine(database_uri)
+    rng = random.Random(seed)
+    keys = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(rows)]
+    parents = [keys[rng.randrange(max(1, rows // 10))] for _ in range(rows)]
+    samples = [rng.choice(keys) for _ in range(lookups)]
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    try:
+        print(f"{rows} rows, {lookups} lookups on {engine.dialect.name}")
+        print(f"{'keys':<12}{'index KiB':>12}{'pk p50 us':>12}{'pk p99 us':>12}{'fk p50 us':>12}{'fk p99 us':>12}")
+        for label, table in TABLES.items():
+            fill(engine, table, list(zip(keys, parents)))
+            with engine.connect() as connection:
+                size = index_bytes(connection, table)
+                by_id = lookup_latency(connection, table.c.id, samples)
+                by_parent = lookup_latency(connection, table.c.parent_id, samples)
+            print(
+                f"{label:<12}{size / 1024 if size else float('nan'):>12.0f}"
+                f"{percentile(by_id, 0.5):>12.1f}{percentile(by_id, 0.99):>12.1f}"
+                f"{percentile(by_parent, 0.5):>12.1f}{percentile(by_parent, 0.99):>12.1f}"
+            )
+    finally:
+        metadata.drop_all(engine)
+        engine.dispose()
+
+
+def main():
+    """Parses the command line and runs the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--database-uri",
+        default=os.getenv("DATABASE_URI", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'uuid_keys.db')}"),
+    )
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.database_uri, args.rows, args.lookups, args.seed)
+
+
+if __name__ == "__main__":
+    main()
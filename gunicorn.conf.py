@@ -0,0 +1,47 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+"""
+gunicorn settings, read from the working directory when gunicorn starts
+
+With PROMETHEUS_MULTIPROC_DIR set, the workers write their metrics into that
+directory: it is emptied when gunicorn starts, and the gauges of a worker
+that exits are dropped.
+
+The access log, when --access-logfile turns it on, ends with the
+Server-Timing header that SQL_PROFILE adds to the responses
+"""
+import os
+import shutil
+from prometheus_client import multiprocess
+
+# The default format of gunicorn, then the SQL statements of the request
+access_log_format = (  # pylint: disable=invalid-name
+    '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" "%({server-timing}o)s"'
+)
+
+
+def on_starting(server):  # pylint: disable=unused-argument
+    """Empties the metrics directory of an earlier run"""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):  # pylint: disable=unused-argument
+    """Forgets the live gauges of a worker that exited"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -24,7 +24,7 @@ import sys
 from flask import Flask
 from flask_restx import Api
 from service import config
-from service.common import log_handlers
+from service.common import log_handlers, pool_metrics, prometheus, sql_profiler, response_cache, invalidation_bus, fast_json
 
 
 # Will be initialize when app is created
@@ -44,6 +44,11 @@ def create_app():
     # pylint: disable=import-outside-toplevel
     from service.models import db
 
+    pool_metrics.init_pool_metrics(app)
+    prometheus.init_prometheus(app)
+    sql_profiler.init_sql_profiler(app)
+    response_cache.init_response_cache(app)
+    invalidation_bus.init_invalidation_bus(app)
     db.init_app(app)
 
     ######################################################################
@@ -60,12 +65,16 @@ def create_app():
         doc="/apidocs",  # default also could use doc='/apidocs/'
         prefix="/api",
     )
+    # Responses encoded by the routes are sent as they are
+    api.representation("application/json")(fast_json.output_json)
 
     with app.app_context():
         # Dependencies require we import the routes AFTER the Flask app is created
         # pylint: disable=wrong-import-position, wrong-import-order, unused-import, cyclic-import
         from service import routes, models  # noqa: F401 E402
-        from service.common import error_handlers, cli_commands  # noqa: F401, E402
+        from service.common import error_handlers, cli_commands, unit_of_work, read_replicas  # noqa: F401, E402
+
+        pool_metrics.instrument_engine(db.engine)
 
         try:
             db.create_all()
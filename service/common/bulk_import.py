@@ -0,0 +1,314 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Module: bulk_import
+
+Loads the Wishlists of an NDJSON or CSV file, such as the ones written by
+GET /wishlists/export, without going through the REST API.
+
+The file is read as a stream of chunks of Wishlists. Each chunk is
+validated with the deserialize() of the models, in a process pool for big
+files, then written by Wishlist.load_rows() and committed. Each commit
+also records in the import_checkpoint table how many Wishlists of the
+file are done, so that an interrupted import resumes exactly from there
+"""
+import csv
+import json
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import islice
+from sqlalchemy import BigInteger, Column, MetaData, String, Table, delete, insert, select
+from service.models import DataValidationError, Wishlist, WishlistItem, db
+from service.models.wishlist_item import to_cents
+
+FORMATS = ("ndjson", "csv")
+# Errors listed before the import gives up
+MAX_ERRORS = 10
+# Chunks each worker of the pool may hold ahead of the database
+CHUNKS_PER_WORKER = 2
+
+# Progress of each import, written in the transaction of the rows it counts
+import_checkpoint = Table(
+    "import_checkpoint",
+    MetaData(),
+    Column("path", String(1024), primary_key=True),
+    Column("wishlists", BigInteger, nullable=False),
+    Column("items", BigInteger, nullable=False),
+)
+
+
+def file_format(path) -> str:
+    """Returns the format of a file from its extension, NDJSON by default"""
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+def checkpoint_key(path) -> str:
+    """Returns the key of the checkpoint of an import, the absolute path of its file"""
+    return os.path.abspath(path)
+
+
+def read_checkpoint(path) -> dict:
+    """Returns the Wishlists and items an earlier import of the file committed"""
+    connection = db.session.connection()
+    import_checkpoint.create(connection, checkfirst=True)
+    row = connection.execute(
+        select(import_checkpoint.c.wishlists, import_checkpoint.c["items"]).where(
+            import_checkpoint.c.path == checkpoint_key(path)
+        )
+    ).first()
+    return dict(row._mapping) if row else {"wishlists": 0, "items": 0}
+
+
+def write_checkpoint(path, done) -> None:
+    """Replaces the checkpoint of an import in the transaction of the session
+
+    It is committed with the rows that it counts, or rolled back with them
+    """
+    connection = db.session.connection()
+    connection.execute(delete(import_checkpoint).where(import_checkpoint.c.path == checkpoint_key(path)))
+    connection.execute(insert(import_checkpoint).values(path=checkpoint_key(path), **done))
+
+
+def remove_checkpoint(path) -> None:
+    """Forgets the checkpoint of an import that is complete"""
+    db.session.connection().execute(delete(import_checkpoint).where(import_checkpoint.c.path == checkpoint_key(path)))
+    db.session.commit()
+
+
+######################################################################
+#  R E A D I N G
+######################################################################
+def read_records(path, fmt, skip=0):
+    """Yields the line number and the record of each Wishlist of a file
+
+    NDJSON records are the text of their line, parsed later by the workers.
+    CSV records are dicts gathered from the consecutive rows of the same
+    wishlist_id, or of the same customer_id and name when it is empty
+
+    Args:
+        skip (int): Wishlists at the start of the file that are not yielded
+    """
+    with open(path, encoding="utf-8", newline="") as file:
+        records = ndjson_records(file) if fmt == "ndjson" else csv_records(file)
+        yield from islice(records, skip, None)
+
+
+def ndjson_records(file):
+    """Yields the non-blank lines of an NDJSON file"""
+    for number, line in enumerate(file, 1):
+        if line.strip():
+            yield number, line
+
+
+def csv_records(file):
+    """Yields the Wishlists of a CSV file with one row per item, as the export writes them"""
+    reader = csv.DictReader(file)
+    number, key, wishlist = 0, None, None
+    for row in reader:
+        if wishlist is None or wishlist_key(row) != key:
+            if wishlist is not None:
+                yield number, wishlist
+            number, key = reader.line_num, wishlist_key(row)
+            wishlist = {
+                "id": row.get("wishlist_id"),
+                "customer_id": row.get("customer_id"),
+                "name": row.get("name"),
+                "created_date": row.get("created_date"),
+                "modified_date": row.get("modified_date"),
+                "items": [],
+            }
+        if row.get("item_id") or row.get("product_id"):
+            wishlist["items"].append(
+                {
+                    "id": row.get("item_id"),
+                    "product_id": row.get("product_id"),
+                    "description": row.get("description"),
+                    "price": number_or_text(row.get("price")),
+                    "added_date": row.get("added_date"),
+                    "modified_date": row.get("item_modified_date"),
+                }
+            )
+    if wishlist is not None:
+        yield number, wishlist
+
+
+def wishlist_key(row) -> tuple:
+    """Returns what the CSV rows of one Wishlist share
+
+    Rows without a wishlist_id get a new id each, so they are told apart by
+    their customer_id and name rather than all joining one Wishlist
+    """
+    if row.get("wishlist_id"):
+        return (row["wishlist_id"],)
+    return (None, row.get("customer_id"), row.get("name"))
+
+
+def number_or_text(value):
+    """Returns a CSV price as a number, or as it is for deserialize() to reject"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+######################################################################
+#  V A L I D A T I O N
+######################################################################
+def validate_chunk(records) -> tuple:
+    """Validates a chunk of records, in a worker of the pool or in the caller
+
+    Returns:
+        tuple: the Wishlist rows, the item rows and the errors of the chunk
+    """
+    wishlist_rows, item_rows, errors = [], [], []
+    for number, record in records:
+        try:
+            data = json.loads(record) if isinstance(record, str) else record
+            wishlist, items = wishlist_rows_of(data)
+        except (DataValidationError, TypeError, ValueError) as error:
+            errors.append(f"line {number}: {error}")
+            continue
+        wishlist_rows.append(wishlist)
+        item_rows.extend(items)
+    return wishlist_rows, item_rows, errors
+
+
+def wishlist_rows_of(data) -> tuple:
+    """Returns the row of a Wishlist and the rows of its items
+
+    The fields are checked by the deserialize() of the models, the ids and
+    dates that the file carries are kept and the missing ones are made up
+    """
+    if not isinstance(data, dict):
+        raise DataValidationError("Invalid Wishlist: not an object")
+    wishlist = Wishlist().deserialize(dict(data, items=None))
+    wishlist_id = uuid_of(data.get("id"))
+    today = date.today()
+    items = []
+    for item_data in data.get("items") or []:
+        if not isinstance(item_data, dict):
+            raise DataValidationError("Invalid WishlistItem: not an object")
+        item = WishlistItem().deserialize(dict(item_data, wishlist_id=wishlist_id))
+        items.append(
+            {
+                "id": uuid_of(item_data.get("id")),
+                "wishlist_id": wishlist_id,
+                "product_id": item.product_id,
+                "description": item.description,
+                "price_cents": to_cents(item.price),
+                "added_date": date_of(item_data.get("added_date"), today),
+                "modified_date": date_of(item_data.get("modified_date"), today),
+            }
+        )
+    row = {
+        "id": wishlist_id,
+        "customer_id": wishlist.customer_id,
+        "name": wishlist.name,
+        "created_date": date_of(data.get("created_date"), today),
+        "modified_date": date_of(data.get("modified_date"), today),
+        "item_count": len(items),
+        "total_value_cents": sum(item["price_cents"] for item in items),
+        "last_item_added": max((item["added_date"] for item in items), default=None),
+        "version": 1,
+    }
+    return row, items
+
+
+def uuid_of(value) -> str:
+    """Returns an id in its canonical form, or a new one when there is none"""
+    if not value:
+        return str(uuid.uuid4())
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError as error:
+        raise DataValidationError(f"Invalid id: {value}") from error
+
+
+def date_of(value, default) -> date:
+    """Returns the date of an ISO date or datetime, or the default when there is none"""
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError as error:
+        raise DataValidationError(f"Invalid date: {value}") from error
+
+
+def validated_chunks(chunks, workers):
+    """Yields the result of validate_chunk() for each chunk, in the order of the file
+
+    With more than one worker the chunks are validated by a process pool,
+    holding only a few chunks per worker so that the file is still streamed
+    """
+    if workers <= 1:
+        yield from map(validate_chunk, chunks)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(pool.submit(validate_chunk, chunk))
+                if len(pending) >= workers * CHUNKS_PER_WORKER:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+######################################################################
+#  I M P O R T
+######################################################################
+def import_file(path, fmt=None, chunk_size=1000, workers=1, restart=False):  # pylint: disable=too-many-arguments
+    """Loads the Wishlists of a file, committing them chunk_size at a time
+
+    Args:
+        fmt (string): ndjson or csv, from the extension of the file when None
+        workers (int): processes that validate the chunks
+        restart (bool): ignore the checkpoint of an earlier import
+
+    Yields:
+        dict: the Wishlists and items committed so far, and the rows per
+            second of this run, after each chunk
+
+    Raises:
+        DataValidationError: when a chunk holds invalid records, none of
+            them is written and the import stops after the previous chunk
+    """
+    # Reading the checkpoint also creates the table that holds them
+    done = read_checkpoint(path)
+    if restart:
+        done = {"wishlists": 0, "items": 0}
+    records = read_records(path, fmt or file_format(path), skip=done["wishlists"])
+    chunks = iter(lambda: list(islice(records, chunk_size)), [])
+    start, rows = time.perf_counter(), 0
+    for wishlist_rows, item_rows, errors in validated_chunks(chunks, workers):
+        if errors:
+            more = f"\n... and {len(errors) - MAX_ERRORS} more" if len(errors) > MAX_ERRORS else ""
+            raise DataValidationError("\n".join(errors[:MAX_ERRORS]) + more)
+        done = {"wishlists": done["wishlists"] + len(wishlist_rows), "items": done["items"] + len(item_rows)}
+        # load_rows() commits the checkpoint with the rows, so a resumed import never loads them twice
+        write_checkpoint(path, done)
+        Wishlist.load_rows(wishlist_rows, item_rows)
+        rows += len(wishlist_rows) + len(item_rows)
+        yield dict(done, rows_per_second=rows / max(time.perf_counter() - start, 1e-9))
+    remove_checkpoint(path)
@@ -16,8 +16,11 @@
 """
 Flask CLI Command Extensions
 """
+import os
+import click
 from flask import current_app as app  # Import Flask application
-from service.models import db
+from service.models import DataValidationError, Wishlist, db
+from service.common import bulk_import, migrations, seed
 
 
 ######################################################################
@@ -34,3 +37,107 @@ def db_create():
     db.drop_all()
     db.create_all()
     db.session.commit()
+
+
+######################################################################
+# Command to fill the database with a synthetic dataset
+# Usage:
+#   flask db-seed [--customers N] [--seed N] [--max-wishlists N] ...
+######################################################################
+@app.cli.command("db-seed")
+@click.option("--customers", type=click.IntRange(min=1), default=1000, help="Customers to generate")
+@click.option("--seed", "seed_value", type=int, default=42, help="Seed of the random generator")
+@click.option("--max-wishlists", type=click.IntRange(min=1), default=20, help="Most wishlists of a customer")
+@click.option("--wishlist-skew", type=click.FloatRange(min=0), default=1.2, help="Zipf exponent of the wishlists per customer")
+@click.option("--max-items", type=click.IntRange(min=1), default=200, help="Most items of a wishlist")
+@click.option("--item-tail", type=click.FloatRange(min=0.1), default=1.2, help="Pareto shape of the items, lower is heavier")
+@click.option("--products", type=click.IntRange(min=1), default=10000, help="Products the items are picked from")
+def db_seed(customers, seed_value, **shape):
+    """
+    Adds customers, wishlists and items with skewed distributions to the
+    database. The same seed always gives the same rows
+    """
+    try:
+        seeded = seed.seed_database(customers, seed.Shape(**shape), seed_value, app.config["IMPORT_CHUNK_SIZE"])
+    except DataValidationError as error:
+        raise click.ClickException(f"{error}\nAn earlier run with the same seed left the same ids") from error
+    click.echo(
+        f"Seeded {customers} customers, {seeded['wishlists']} wishlists and {seeded['items']} items "
+        f"in {seeded['seconds']:.1f}s, {seeded['rows_per_second']:.0f} rows/s"
+    )
+
+
+######################################################################
+# Command to apply the pending schema migrations
+# Usage:
+#   flask db-migrate [--target VERSION]
+######################################################################
+@app.cli.command("db-migrate")
+@click.option("--target", type=int, default=None, help="Last version to apply")
+def db_migrate(target):
+    """
+    Applies the schema migrations that the database is missing. It is
+    safe to run on a live database
+    """
+    applied = migrations.migrate(db.engine, target)
+    for migration in applied:
+        click.echo(f"Applied {migration.version}: {migration.description}")
+    if not applied:
+        click.echo("The database is up to date")
+
+
+######################################################################
+# Command to repair the item totals of the wishlists
+# Usage:
+#   flask wishlists-recount
+######################################################################
+@app.cli.command("wishlists-recount")
+def wishlists_recount():
+    """
+    Recomputes the item_count, total_value and last_item_added of every
+    wishlist from its items
+    """
+    repaired = Wishlist.recount_totals()
+    click.echo(f"Repaired the totals of {repaired} wishlists")
+
+
+######################################################################
+# Command to bulk load wishlists and items from a file
+# Usage:
+#   flask wishlists-import FILE [--format ndjson|csv] [--chunk-size N] [--workers N] [--restart]
+######################################################################
+@app.cli.command("wishlists-import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--format", "fmt", type=click.Choice(bulk_import.FORMATS), help="Format of the file, from its extension by default"
+)
+@click.option("--chunk-size", type=click.IntRange(min=1), default=None, help="Wishlists committed at a time")
+@click.option("--workers", type=click.IntRange(min=1), default=None, help="Processes that validate the file")
+@click.option("--restart", is_flag=True, help="Ignore the checkpoint of an earlier import")
+def wishlists_import(path, fmt, chunk_size, workers, restart):  # pylint: disable=too-many-arguments
+    """
+    Loads the wishlists and items of an NDJSON or CSV file, like the ones of
+    GET /wishlists/export. An interrupted import resumes after the last
+    chunk it committed
+    """
+    if workers is None:
+        big = os.path.getsize(path) >= app.config["IMPORT_POOL_MIN_BYTES"]
+        workers = (os.cpu_count() or 1) if big else 1
+    done = None if restart else bulk_import.read_checkpoint(path)
+    if done and done["wishlists"]:
+        click.echo(f"Resuming after {done['wishlists']} wishlists")
+    progress = {"wishlists": 0, "items": 0, "rows_per_second": 0.0}
+    try:
+        for progress in bulk_import.import_file(
+            path, fmt, chunk_size or app.config["IMPORT_CHUNK_SIZE"], workers, restart
+        ):
+            click.echo(
+                f"Committed {progress['wishlists']} wishlists and {progress['items']} items, "
+                f"{progress['rows_per_second']:.0f} rows/s"
+            )
+    except DataValidationError as error:
+        raise click.ClickException(f"{error}\nRun the command again to resume after the last commit") from error
+    click.echo(
+        f"Imported {progress['wishlists']} wishlists and {progress['items']} items "
+        f"at {progress['rows_per_second']:.0f} rows/s"
+    )
@@ -18,7 +18,7 @@ Module: error_handlers
 """
 from flask import jsonify
 from flask import current_app as app  # Import Flask application
-from service.models import DataValidationError
+from service.models import DataValidationError, VersionConflictError
 from service.common import status
 
 
@@ -31,6 +31,17 @@ def request_validation_error(error):
     return bad_request(error)
 
 
+@app.errorhandler(VersionConflictError)
+def version_conflict(error):
+    """Handles a record that another request changed meanwhile with 409_CONFLICT"""
+    message = str(error)
+    app.logger.warning(message)
+    return (
+        jsonify(status=status.HTTP_409_CONFLICT, error="Conflict", message=message),
+        status.HTTP_409_CONFLICT,
+    )
+
+
 @app.errorhandler(status.HTTP_400_BAD_REQUEST)
 def bad_request(error):
     """Handles bad requests with 400_BAD_REQUEST"""
@@ -0,0 +1,87 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Module: export
+
+Turns the Wishlists yielded by Wishlist.export() into the lines of an
+NDJSON or CSV export. Everything here is a generator, so a response
+streams the export while it is read from the database
+"""
+import csv
+import io
+
+# Columns of the CSV export, one row per item, the Wishlist columns repeated
+CSV_COLUMNS = (
+    "wishlist_id",
+    "customer_id",
+    "name",
+    "created_date",
+    "modified_date",
+    "item_id",
+    "product_id",
+    "description",
+    "price",
+    "added_date",
+    "item_modified_date",
+)
+NO_ITEMS = [{}]
+
+
+def ndjson_lines(wishlists, encoder):
+    """Yields one line of JSON per Wishlist
+
+    Args:
+        encoder (ModelEncoder): encodes each Wishlist
+    """
+    for wishlist in wishlists:
+        yield encoder.encode(wishlist) + b"\n"
+
+
+def csv_lines(wishlists):
+    """Yields the header, then the rows of the items of each Wishlist
+
+    A Wishlist without items still gets one row, with empty item columns
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(CSV_COLUMNS)
+    for wishlist in wishlists:
+        head = [wishlist[name] for name in ("id", "customer_id", "name", "created_date", "modified_date")]
+        for item in wishlist["items"] or NO_ITEMS:
+            writer.writerow(
+                head
+                + [
+                    item.get(name)
+                    for name in ("id", "product_id", "description", "price", "added_date", "modified_date")
+                ]
+            )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def chunked(lines, chunk_bytes):
+    """Joins the lines into chunks of about chunk_bytes, so that each write carries many of them"""
+    chunk, size = [], 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b"".join(chunk)
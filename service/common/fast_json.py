@@ -0,0 +1,229 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Fast JSON Encoding
+
+marshal() walks the fields of a model to build a dict of every response,
+then the json module walks that dict again. A ModelEncoder compiles the
+fields of a model once into closures, one per field, that write the JSON
+of an ORM object, a row or a dict straight into bytes. The bytes are the same as
+marshal() followed by the json module, including the key order, the
+formatting of dates and numbers, and the nulls.
+
+Routes return what a ModelEncoder encodes, and output_json, the
+application/json representation of the Api, sends it as it is
+"""
+import json
+import math
+from datetime import date, datetime
+from flask import current_app, make_response, request
+from flask_restx import fields, marshal, representations
+from flask_restx.fields import is_indexable_but_not_string
+from flask_restx.mask import Mask
+
+# Masked encoders kept by each ModelEncoder, clients choose the masks
+MAX_MASKS = 256
+
+_quote = json.encoder.encode_basestring_ascii
+_DATE = fields.Date()
+_DATETIME = fields.DateTime()
+
+
+class Encoded(bytes):
+    """JSON encoded by a ModelEncoder, sent as it is"""
+
+
+######################################################################
+#  F O R M A T T E R S
+######################################################################
+def _string(value) -> str:
+    if value is None:
+        return "null"
+    return _quote(value if type(value) is str else str(value))  # pylint: disable=unidiomatic-typecheck
+
+
+def _integer(value) -> str:
+    return "null" if value is None else int.__repr__(int(value))
+
+
+def _float(value) -> str:
+    if value is None:
+        return "null"
+    value = float(value)  # Decimals too
+    return float.__repr__(value) if math.isfinite(value) else json.dumps(value)
+
+
+def _date(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, datetime):
+        value = value.date()
+    elif not isinstance(value, date):
+        return _quote(_DATE.format(value))
+    return '"' + value.isoformat() + '"'
+
+
+def _datetime(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, datetime):
+        return _quote(value.isoformat())
+    if isinstance(value, date):
+        return '"' + value.isoformat() + 'T00:00:00"'
+    return _quote(_DATETIME.format(value))
+
+
+def _list(value, encode, null) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, dict) or not is_indexable_but_not_string(value):
+        return "[" + encode(value) + "]"
+    return "[" + ", ".join([null if item is None else encode(item) for item in value]) + "]"
+
+
+def _nested(value, encode, null) -> str:
+    return null if value is None else encode(value)
+
+
+FORMATTERS = {
+    fields.String: _string,
+    fields.Integer: _integer,
+    fields.Float: _float,
+    fields.Date: _date,
+}
+
+
+######################################################################
+#  C O M P I L E R
+######################################################################
+def _plain(field) -> bool:
+    """True when a field reads its own key and has no default, like the ones of the models"""
+    return field.attribute is None and field.default is None
+
+
+def _plain_nested(field) -> bool:
+    return isinstance(field, fields.Nested) and _plain(field) and not field.allow_null and not field.skip_none
+
+
+def _nested_encoder(field_map):
+    """Returns the encoder of a nested model and the JSON of its null"""
+    return _compile(field_map), json.dumps(marshal(None, field_map))
+
+
+def _value_formatter(field):
+    """Returns the function that encodes the value of a field, None when it must be marshalled"""
+    kind = type(field)
+    if kind in FORMATTERS and _plain(field):
+        return FORMATTERS[kind]
+    if kind is fields.DateTime and field.dt_format == "iso8601" and _plain(field):
+        return _datetime
+    if kind is fields.List and _plain(field) and _plain_nested(field.container):
+        encode, null = _nested_encoder(field.container.nested)
+        return lambda value: _list(value, encode, null)
+    if _plain_nested(field):
+        encode, null = _nested_encoder(field.nested)
+        return lambda value: _nested(value, encode, null)
+    return None
+
+
+def _field_encoders(name, field):
+    """Returns the functions that encode one field of a dict and of any other object"""
+    if isinstance(field, type):
+        field = field()  # as marshal() does
+    formatter = _value_formatter(field)
+    if formatter is None:
+        # Any other field is marshalled as it always was
+        def marshalled(obj):
+            return json.dumps(field.output(name, obj))
+
+        return marshalled, marshalled
+    return (lambda obj: formatter(obj.get(name))), (lambda obj: formatter(getattr(obj, name, None)))
+
+
+def _compile(field_map):
+    """Returns a function that encodes a dict, or any object, with the fields into a str"""
+    dict_fields = []
+    object_fields = []
+    for name, field in field_map.items():
+        key = json.dumps(name) + ": "
+        encode_dict, encode_object = _field_encoders(name, field)
+        dict_fields.append((key, encode_dict))
+        object_fields.append((key, encode_object))
+
+    def encode(obj):
+        encoders = dict_fields if isinstance(obj, dict) else object_fields
+        return "{" + ", ".join([key + encode_field(obj) for key, encode_field in encoders]) + "}"
+
+    return encode
+
+
+######################################################################
+#  M O D E L   E N C O D E R
+######################################################################
+class ModelEncoder:
+    """Encodes objects to the JSON that marshal() with a model and the json module give
+
+    Args:
+        model: the Model, or dict of fields, to encode with
+        mask (str): only encode these fields, with the syntax of the X-Fields header
+    """
+
+    def __init__(self, model, mask=None):
+        self.model = model
+        self.fields = getattr(model, "resolved", model)
+        if mask:
+            self.fields = Mask(mask, skip=True).apply(self.fields)
+        self._encode = _compile(self.fields)
+        self._masked = {}
+
+    def masked(self, mask):
+        """Returns the encoder of the fields of this one restricted to a mask, compiled once"""
+        if not mask:
+            return self
+        encoder = self._masked.get(mask)
+        if encoder is None:
+            if len(self._masked) >= MAX_MASKS:
+                self._masked.clear()
+            encoder = self._masked[mask] = ModelEncoder(self.fields, mask)
+        return encoder
+
+    def for_request(self):
+        """Returns the encoder restricted to the X-Fields header of the request, like marshal_with"""
+        return self.masked(request.headers.get(current_app.config["RESTX_MASK_HEADER"]))
+
+    def encode(self, obj) -> Encoded:
+        """Encodes one object"""
+        return Encoded(self._encode(obj).encode())
+
+    def encode_list(self, objs) -> Encoded:
+        """Encodes a list of objects"""
+        return Encoded(("[" + ", ".join([self._encode(obj) for obj in objs]) + "]").encode())
+
+
+def output_json(data, code, headers=None):
+    """The application/json representation of the Api
+
+    Encoded data is sent as it is, anything else the way flask-restx does
+    """
+    if not isinstance(data, Encoded):
+        return representations.output_json(data, code, headers)
+    if current_app.config.get("RESTX_JSON") or current_app.debug:
+        # Indented, or otherwise customized, JSON needs the json module
+        return representations.output_json(json.loads(data), code, headers)
+    response = make_response(data + b"\n", code)
+    response.headers.extend(headers or {})
+    return response
@@ -0,0 +1,342 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Invalidation Bus
+
+This module tells every cache of every worker process which Wishlists
+changed. When a transaction commits, the Wishlists it changed are handed
+to the subscribers of this process and published on a transport that
+the other processes listen to:
+
+    memory://                 the processes of a test, in one interpreter
+    postgresql+psycopg://...  Postgres LISTEN/NOTIFY
+    redis://host:6379/0       Redis pub/sub, needs the redis package
+
+A listener that loses its connection may miss messages, so every time it
+(re)connects the subscribers are told to forget everything
+"""
+import json
+import logging
+from abc import ABC, abstractmethod
+import os
+import threading
+import uuid
+import psycopg
+from psycopg import sql
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from service.models import changed_wishlists
+from service.models.persistent_base import RoutingSession
+
+logger = logging.getLogger("flask.app")
+
+# Postgres refuses NOTIFY payloads over 8000 bytes, so publish the ids in chunks
+MAX_IDS_PER_MESSAGE = 100
+
+
+######################################################################
+#  T R A N S P O R T S
+######################################################################
+class Transport(ABC):
+    """Carries the messages of the bus between the processes
+
+    start() is called once in every process, after gunicorn forked it, with
+    the function that receives each message, or None when messages may
+    have been lost
+    """
+
+    name = "none"
+
+    def __init__(self, channel: str):
+        self.channel = channel
+
+    @abstractmethod
+    def publish(self, message: str):
+        """Sends a message to every process"""
+
+    def start(self, deliver):
+        """Starts receiving the messages of the other processes"""
+
+    def stop(self):
+        """Stops receiving messages"""
+
+
+class MemoryTransport(Transport):
+    """Delivers the messages to the transports of the same channel in this interpreter"""
+
+    name = "memory"
+    listeners = {}  # channel -> deliver functions
+
+    def __init__(self, channel: str):
+        super().__init__(channel)
+        self._deliver = None
+
+    def publish(self, message: str):
+        for deliver in list(self.listeners.get(self.channel, [])):
+            deliver(message)
+
+    def start(self, deliver):
+        self.stop()
+        self._deliver = deliver
+        self.listeners.setdefault(self.channel, []).append(deliver)
+
+    def stop(self):
+        if self._deliver in self.listeners.get(self.channel, []):
+            self.listeners[self.channel].remove(self._deliver)
+        self._deliver = None
+
+
+class ListeningTransport(Transport):
+    """A Transport that listens on a connection of its own in a daemon thread
+
+    The thread reconnects after RETRY_SECONDS when the connection fails
+    """
+
+    POLL_SECONDS = 1.0
+    RETRY_SECONDS = 5.0
+
+    def __init__(self, channel: str):
+        super().__init__(channel)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @abstractmethod
+    def listen(self, deliver, stopped: threading.Event):
+        """Connects, subscribes, calls deliver(None), then delivers messages until stopped"""
+
+    def start(self, deliver):
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(deliver, self._stopped), name=f"{self.name}-invalidations", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(self.POLL_SECONDS * 2)
+        self._thread = None
+
+    def _run(self, deliver, stopped):
+        """Listens until stopped, reconnecting after failures"""
+        while not stopped.is_set():
+            try:
+                self.listen(deliver, stopped)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.warning("Invalidation listener on %s failed: %s", self.name, error)
+                stopped.wait(self.RETRY_SECONDS)
+
+
+class PostgresTransport(ListeningTransport):
+    """Postgres LISTEN/NOTIFY, the notifications are sent through a small engine"""
+
+    name = "postgres"
+
+    def __init__(self, url: str, channel: str):
+        super().__init__(channel)
+        self.url = make_url(url)
+        self.engine = create_engine(self.url, pool_size=1, max_overflow=4, pool_pre_ping=True)
+
+    def publish(self, message: str):
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT pg_notify(:channel, :message)"), {"channel": self.channel, "message": message})
+            connection.commit()
+
+    def start(self, deliver):
+        # A forked process must not share the connections of its parent
+        self.engine.dispose(close=False)
+        super().start(deliver)
+
+    def listen(self, deliver, stopped):
+        conninfo = self.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        with psycopg.connect(conninfo, autocommit=True) as connection:
+            connection.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+            deliver(None)
+            while not stopped.is_set():
+                for notify in connection.notifies(timeout=self.POLL_SECONDS):
+                    deliver(notify.payload)
+
+
+class RedisTransport(ListeningTransport):
+    """Redis, or Redis compatible, pub/sub"""
+
+    name = "redis"
+
+    def __init__(self, url: str, channel: str):
+        super().__init__(channel)
+        try:
+            import redis  # pylint: disable=import-outside-toplevel, import-error
+        except ImportError as error:
+            raise RuntimeError("A redis:// CACHE_INVALIDATION_URL needs the redis package") from error
+        self.url = url
+        self._redis = redis
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, message: str):
+        self._client.publish(self.channel, message)
+
+    def start(self, deliver):
+        # A forked process must not share the connections of its parent
+        self._client = self._redis.Redis.from_url(self.url)
+        super().start(deliver)
+
+    def listen(self, deliver, stopped):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(self.channel)
+            deliver(None)
+            while not stopped.is_set():
+                message = pubsub.get_message(timeout=self.POLL_SECONDS)
+                if message is not None:
+                    deliver(message["data"].decode())
+        finally:
+            pubsub.close()
+
+
+def create_transport(url: str, channel: str):
+    """Returns the Transport for a CACHE_INVALIDATION_URL, None when it is empty"""
+    if not url:
+        return None
+    scheme = url.split(":", 1)[0].split("+", 1)[0]
+    if scheme == "memory":
+        return MemoryTransport(channel)
+    if scheme in ("postgres", "postgresql"):
+        return PostgresTransport(url, channel)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisTransport(url, channel)
+    raise ValueError(f"Unknown cache invalidation transport: {scheme}")
+
+
+######################################################################
+#  I N V A L I D A T I O N   B U S
+######################################################################
+class InvalidationBus:
+    """Hands the changed Wishlists to the subscribers of every process
+
+    Subscribers are called with the ids of the Wishlists that changed, or
+    None when every Wishlist may have changed
+    """
+
+    def __init__(self, transport=None):
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._pid = None
+        self.origin = None
+        self.transport = transport
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    def configure(self, transport):
+        """Replaces the transport, it starts with the next message"""
+        self.stop()
+        self.transport = transport
+        self.published = self.received = self.errors = 0
+
+    def subscribe(self, callback):
+        """Calls callback(wishlist_ids) for every change, in this process or another"""
+        self._subscribers.append(callback)
+
+    def ensure_started(self):
+        """Starts the transport once in each process, including forked ones"""
+        if self.transport is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self.origin = uuid.uuid4().hex
+                self.transport.start(self.receive)
+
+    def stop(self):
+        """Stops the transport of this process"""
+        with self._lock:
+            if self.transport is not None and self._pid is not None:
+                self.transport.stop()
+            self._pid = None
+
+    def publish(self, wishlist_ids):
+        """Tells the subscribers of every process that the Wishlists changed"""
+        wishlist_ids = sorted(wishlist_ids)
+        self._notify(wishlist_ids)
+        if self.transport is None:
+            return
+        self.ensure_started()
+        for start in range(0, len(wishlist_ids), MAX_IDS_PER_MESSAGE):
+            message = json.dumps({"origin": self.origin, "ids": wishlist_ids[start:start + MAX_IDS_PER_MESSAGE]})
+            try:
+                self.transport.publish(message)
+                self.published += 1
+            except Exception as error:  # pylint: disable=broad-except
+                # The change is committed, so the other processes rely on their TTL
+                self.errors += 1
+                logger.error("Unable to publish the invalidation of %d Wishlists: %s", len(wishlist_ids), error)
+
+    def receive(self, message):
+        """Hands a message of the transport to the subscribers of this process"""
+        if message is None:
+            self._notify(None)
+            return
+        try:
+            data = json.loads(message)
+            origin, wishlist_ids = data["origin"], data["ids"]
+        except (ValueError, TypeError, KeyError):
+            self.errors += 1
+            logger.warning("Ignoring the invalidation message %r", message)
+            return
+        if origin != self.origin:
+            self.received += 1
+            self._notify(wishlist_ids)
+
+    def snapshot(self) -> dict:
+        """Returns the transport and the counters of the bus"""
+        return {
+            "transport": self.transport.name if self.transport else "none",
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors,
+        }
+
+    def _notify(self, wishlist_ids):
+        for callback in self._subscribers:
+            callback(wishlist_ids)
+
+
+# Bus of this worker process
+bus = InvalidationBus()
+
+
+def init_invalidation_bus(app):
+    """Creates the transport of CACHE_INVALIDATION_URL and starts it with the first request"""
+    bus.configure(create_transport(app.config["CACHE_INVALIDATION_URL"], app.config["CACHE_INVALIDATION_CHANNEL"]))
+    app.before_request(bus.ensure_started)
+
+
+######################################################################
+# Session Hooks
+######################################################################
+@event.listens_for(RoutingSession, "after_commit")
+def publish_changed_wishlists(session):
+    """Publishes the Wishlists that a committed transaction changed"""
+    wishlist_ids = changed_wishlists(session)
+    if wishlist_ids:
+        bus.publish(wishlist_ids)
+
+
+@event.listens_for(RoutingSession, "after_soft_rollback")
+def keep_rolled_back_wishlists(session, previous_transaction):  # pylint: disable=unused-argument
+    """The Wishlists of a transaction that was rolled back did not change"""
+    changed_wishlists(session)
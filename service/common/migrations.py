@@ -0,0 +1,293 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Schema Migrations
+
+Versioned changes to the schema of a live database. The versions that
+have been applied are recorded in the schema_version table, and every
+migration checks the schema first so that it is safe to run again on a
+database that db.create_all() already brought up to date.
+
+Migrations marked concurrent run outside of a transaction, which lets
+Postgres build their indexes without locking writes to the table
+"""
+import logging
+from datetime import datetime, timezone
+import uuid
+from sqlalchemy import BigInteger, Column, DateTime, Integer, MetaData, String, Table, Uuid, inspect, select, text
+
+logger = logging.getLogger("flask.app")
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String(256), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+class Migration:
+    """A numbered change to the schema"""
+
+    def __init__(self, version: int, description: str, upgrade, concurrent: bool = False):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+        self.concurrent = concurrent
+
+    def __repr__(self):
+        return f"<Migration {self.version}: {self.description}>"
+
+
+# Every migration in the order it must be applied
+MIGRATIONS = []
+
+
+def migration(version: int, description: str, concurrent: bool = False):
+    """Registers the decorated function as the upgrade of a migration"""
+
+    def register(upgrade):
+        if MIGRATIONS and MIGRATIONS[-1].version >= version:
+            raise ValueError(f"Migration {version} is out of order")
+        MIGRATIONS.append(Migration(version, description, upgrade, concurrent))
+        return upgrade
+
+    return register
+
+
+######################################################################
+#  H E L P E R S
+######################################################################
+def is_postgres(connection) -> bool:
+    """Returns True when the connection is to Postgres"""
+    return connection.dialect.name == "postgresql"
+
+
+def create_index(connection, name: str, table: str, *columns: str):
+    """Creates an index unless it exists, concurrently on Postgres
+
+    A concurrent build that failed leaves an invalid index behind, which
+    is dropped and built again
+    """
+    concurrently = ""
+    if is_postgres(connection):
+        concurrently = "CONCURRENTLY "
+        invalid = connection.execute(
+            text(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+            ),
+            {"name": name},
+        ).first()
+        if invalid:
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    connection.execute(
+        text(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+    )
+
+
+def has_column(connection, table: str, column: str) -> bool:
+    """Returns True when the table has the column"""
+    return column in {info["name"] for info in inspect(connection).get_columns(table)}
+
+
+def column_type(connection, table: str, column: str):
+    """Returns the type of a column as reflected from the database"""
+    for info in inspect(connection).get_columns(table):
+        if info["name"] == column:
+            return info["type"]
+    return None
+
+
+######################################################################
+#  M I G R A T I O N S
+######################################################################
+@migration(1, "Index the lookups of wishlists and their items", concurrent=True)
+def index_lookups(connection):
+    """Indexes the columns that the finders filter and sort on"""
+    create_index(connection, "ix_wishlist_customer_id", "wishlist", "customer_id")
+    create_index(connection, "ix_wishlist_name", "wishlist", "name")
+    # Once migration 3 has run, the price is stored in price_cents
+    price = "price_cents" if has_column(connection, "wishlist_item", "price_cents") else "price"
+    create_index(connection, "ix_wishlist_item_wishlist_id_price", "wishlist_item", "wishlist_id", price)
+    create_index(
+        connection, "ix_wishlist_item_wishlist_id_added_date", "wishlist_item", "wishlist_id", "added_date"
+    )
+
+
+# The key columns that hold UUIDs, parents first
+UUID_KEYS = (("wishlist", "id"), ("wishlist_item", "id"), ("wishlist_item", "wishlist_id"))
+
+
+@migration(2, "Store the keys as native UUIDs")
+def uuid_keys(connection):
+    """Converts the String(36) keys into 16 byte UUIDs
+
+    Postgres rewrites both tables under an exclusive lock, so run it when
+    the traffic is low. On SQLite the text keys are replaced by 16 byte
+    blobs in place
+    """
+    if is_postgres(connection):
+        if isinstance(column_type(connection, "wishlist", "id"), Uuid):
+            return
+        connection.execute(text("ALTER TABLE wishlist_item DROP CONSTRAINT IF EXISTS wishlist_item_wishlist_id_fkey"))
+        connection.execute(text("ALTER TABLE wishlist ALTER COLUMN id TYPE uuid USING id::uuid"))
+        connection.execute(
+            text(
+                "ALTER TABLE wishlist_item ALTER COLUMN id TYPE uuid USING id::uuid, "
+                "ALTER COLUMN wishlist_id TYPE uuid USING wishlist_id::uuid"
+            )
+        )
+        connection.execute(
+            text(
+                "ALTER TABLE wishlist_item ADD CONSTRAINT wishlist_item_wishlist_id_fkey "
+                "FOREIGN KEY (wishlist_id) REFERENCES wishlist (id) ON DELETE CASCADE"
+            )
+        )
+        return
+    # The parent keys change before the child keys that reference them, so
+    # check the foreign keys at commit. The pragma only lasts for the open
+    # transaction, which pysqlite begins at the first data change
+    connection.execute(text("DELETE FROM wishlist WHERE 0 = 1"))
+    connection.execute(text("PRAGMA defer_foreign_keys = ON"))
+    for table, column in UUID_KEYS:
+        keys = connection.execute(text(f"SELECT {column} FROM {table} WHERE typeof({column}) = 'text'")).scalars()
+        converted = [{"old": key, "new": uuid.UUID(key).bytes} for key in set(keys)]
+        if converted:
+            connection.execute(text(f"UPDATE {table} SET {column} = :new WHERE {column} = :old"), converted)
+
+
+@migration(3, "Store the item prices as whole cents")
+def price_cents(connection):
+    """Replaces the Numeric(10, 2) price with a BIGINT price_cents
+
+    The UPDATE touches every item, so run it when the traffic is low. The
+    index on the price goes with the column, migration 6 builds it again
+    on price_cents without holding the lock of this transaction
+    """
+    if has_column(connection, "wishlist_item", "price_cents"):
+        return
+    connection.execute(text("ALTER TABLE wishlist_item ADD COLUMN price_cents BIGINT NOT NULL DEFAULT 0"))
+    connection.execute(text("UPDATE wishlist_item SET price_cents = CAST(ROUND(price * 100) AS BIGINT)"))
+    if is_postgres(connection):
+        connection.execute(text("ALTER TABLE wishlist_item ALTER COLUMN price_cents DROP DEFAULT"))
+    connection.execute(text("DROP INDEX IF EXISTS ix_wishlist_item_wishlist_id_price"))
+    connection.execute(text("ALTER TABLE wishlist_item DROP COLUMN price"))
+
+
+@migration(4, "Keep the item totals on the wishlists")
+def wishlist_totals(connection):
+    """Adds item_count, total_value_cents and last_item_added to wishlist and fills them"""
+    if has_column(connection, "wishlist", "item_count"):
+        return
+    connection.execute(text("ALTER TABLE wishlist ADD COLUMN item_count INTEGER NOT NULL DEFAULT 0"))
+    connection.execute(text("ALTER TABLE wishlist ADD COLUMN total_value_cents BIGINT NOT NULL DEFAULT 0"))
+    connection.execute(text("ALTER TABLE wishlist ADD COLUMN last_item_added DATE"))
+    connection.execute(
+        text(
+            "UPDATE wishlist SET "
+            "item_count = (SELECT COUNT(*) FROM wishlist_item WHERE wishlist_id = wishlist.id), "
+            "total_value_cents = (SELECT COALESCE(SUM(price_cents), 0) FROM wishlist_item "
+            "WHERE wishlist_id = wishlist.id), "
+            "last_item_added = (SELECT MAX(added_date) FROM wishlist_item WHERE wishlist_id = wishlist.id)"
+        )
+    )
+
+
+@migration(5, "Version the wishlists for ETags")
+def wishlist_version(connection):
+    """Adds the version that every change to a wishlist or to its items increments"""
+    if has_column(connection, "wishlist", "version"):
+        return
+    connection.execute(text("ALTER TABLE wishlist ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+
+@migration(6, "Index the item prices in cents", concurrent=True)
+def index_price_cents(connection):
+    """Builds the index on the price of the items that migration 3 dropped with the price column"""
+    create_index(connection, "ix_wishlist_item_wishlist_id_price", "wishlist_item", "wishlist_id", "price_cents")
+
+
+@migration(7, "Index the pages of wishlists", concurrent=True)
+def index_pages(connection):
+    """Indexes the (created_date, id) order of the keyset pages, of all and of one customer"""
+    create_index(connection, "ix_wishlist_created_date_id", "wishlist", "created_date", "id")
+    create_index(
+        connection, "ix_wishlist_customer_id_created_date_id", "wishlist", "customer_id", "created_date", "id"
+    )
+
+
+@migration(8, "Widen the item prices in cents to BIGINT")
+def price_cents_bigint(connection):
+    """Widens the INTEGER price_cents that migration 3 used to create
+
+    Postgres rewrites wishlist_item under an exclusive lock, so run it when
+    the traffic is low. SQLite integers already hold 64 bits
+    """
+    if not is_postgres(connection) or isinstance(column_type(connection, "wishlist_item", "price_cents"), BigInteger):
+        return
+    connection.execute(text("ALTER TABLE wishlist_item ALTER COLUMN price_cents TYPE BIGINT"))
+
+
+######################################################################
+#  R U N N E R
+######################################################################
+def applied_versions(engine) -> set:
+    """Returns the versions that have been applied to the database"""
+    with engine.begin() as connection:
+        schema_version.create(connection, checkfirst=True)
+        return set(connection.execute(select(schema_version.c.version)).scalars())
+
+
+def pending_migrations(engine, target: int = None) -> list:
+    """Returns the migrations that still have to be applied, up to target"""
+    applied = applied_versions(engine)
+    return [
+        pending
+        for pending in MIGRATIONS
+        if pending.version not in applied and (target is None or pending.version <= target)
+    ]
+
+
+def migrate(engine, target: int = None) -> list:
+    """Applies the pending migrations in order and returns them"""
+    applied = []
+    for pending in pending_migrations(engine, target):
+        logger.info("Applying %s", pending)
+        if pending.concurrent:
+            with engine.connect() as connection:
+                pending.upgrade(connection.execution_options(isolation_level="AUTOCOMMIT"))
+            with engine.begin() as connection:
+                record(connection, pending)
+        else:
+            with engine.begin() as connection:
+                pending.upgrade(connection)
+                record(connection, pending)
+        applied.append(pending)
+    return applied
+
+
+def record(connection, applied: Migration):
+    """Records that a migration has been applied"""
+    connection.execute(
+        schema_version.insert().values(
+            version=applied.version,
+            description=applied.description,
+            applied_at=datetime.now(timezone.utc),
+        )
+    )
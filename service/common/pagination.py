@@ -0,0 +1,64 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Pagination Helpers
+
+This module contains utility functions to build and read the opaque
+cursor tokens used for keyset pagination
+"""
+import json
+import base64
+import binascii
+
+
+def encode_cursor(*values) -> str:
+    """Packs the sort key of the last row of a page into an opaque token"""
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> list:
+    """Unpacks a token made by encode_cursor
+
+    Args:
+        token (string): the cursor sent back by the client
+        size (int): the number of values the cursor must hold
+
+    Raises:
+        ValueError: if the token was not made by encode_cursor
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError) as error:
+        raise ValueError(f"Invalid cursor: {token}") from error
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"Invalid cursor: {token}")
+    return values
+
+
+def page_size(requested, default: int, maximum: int) -> int:
+    """Returns the number of rows to serve, capped at maximum
+
+    Raises:
+        ValueError: if the requested size is not a positive number
+    """
+    if requested is None:
+        return min(default, maximum)
+    if requested < 1:
+        raise ValueError(f"Invalid limit: {requested}, it must be at least 1")
+    return min(requested, maximum)
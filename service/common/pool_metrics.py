@@ -0,0 +1,147 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Pool Metrics
+
+This module counts the activity of the SQLAlchemy connection pools of
+each worker process: checkouts, new connections, overflow and the time
+spent waiting for a connection. The primary engine and each read replica
+keep counters of their own, reported under the name of the engine
+"""
+import os
+import time
+import threading
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """Thread-safe counters for the connection pool of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Sets every counter back to zero"""
+        with self._lock:
+            self.checkouts = 0
+            self.checkins = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.timeouts = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        """Records the time a caller waited for a connection"""
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def increment(self, counter: str):
+        """Adds one to a counter"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self, pool=None) -> dict:
+        """Returns the counters, plus the live state of the pool when given"""
+        with self._lock:
+            stats = {
+                "pid": os.getpid(),
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6)
+                if self.checkouts
+                else 0.0,
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(
+                pool_size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=pool.overflow(),
+            )
+        return stats
+
+
+# Name of the engine of SQLALCHEMY_DATABASE_URI
+PRIMARY = "primary"
+
+# Counters of the primary engine of this worker process
+metrics = PoolMetrics()
+# Instrumented engines of this worker process and their counters, by name
+engines = {}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    # Set by instrument_engine() for the pools of the other engines
+    counters = metrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.counters.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.counters.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool that keeps counting on the same counters
+        pool = super().recreate()
+        pool.counters = self.counters
+        return pool
+
+
+def init_pool_metrics(app):
+    """Makes the engine of the app use the instrumented pool
+
+    Must be called before the SQLAlchemy extension creates its engine
+    """
+    options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    if "pool_size" in options:
+        options.setdefault("poolclass", InstrumentedQueuePool)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def instrument_engine(engine, name=PRIMARY) -> PoolMetrics:
+    """Counts the pool events of an engine under its name and returns its counters"""
+    counters = metrics if name == PRIMARY else PoolMetrics()
+    engines[name] = (engine, counters)
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.counters = counters
+    event.listen(engine, "connect", lambda *args: counters.increment("connects"))
+    event.listen(engine, "checkout", lambda *args: counters.increment("checkouts"))
+    event.listen(engine, "checkin", lambda *args: counters.increment("checkins"))
+    event.listen(engine, "invalidate", lambda *args: counters.increment("invalidations"))
+    return counters
+
+
+def snapshots() -> dict:
+    """Returns the snapshot of every instrumented engine by name"""
+    return {name: counters.snapshot(engine.pool) for name, (engine, counters) in engines.items()}
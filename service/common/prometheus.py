@@ -0,0 +1,196 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+"""
+Prometheus Metrics
+
+Exposes the activity of the service on /metrics in the Prometheus text
+format: the requests by method, route template and status with their
+latency, the requests in flight, the SQL statements, the connection pool
+and the response cache.
+
+Under gunicorn each worker is a process with its own counters. When the
+PROMETHEUS_MULTIPROC_DIR environment variable names a directory before the
+workers start, every process writes its values there and /metrics adds up
+those of all the workers, whichever one answers the scrape
+"""
+import os
+import threading
+import time
+from flask import g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from service.common import pool_metrics, response_cache
+
+# Scrapes are not counted as requests
+SKIPPED_PATHS = ("/metrics",)
+# Route of the requests that no rule matched, and of the statements run outside a request
+UNMATCHED = "<unmatched>"
+NO_REQUEST = "<none>"
+
+REQUESTS = Counter("http_requests", "HTTP requests answered", ["method", "route", "status"])
+LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time to answer HTTP requests, to the first byte of streamed bodies",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being answered", ["method", "route"], multiprocess_mode="livesum"
+)
+QUERIES = Histogram(
+    "db_query_duration_seconds",
+    "Time of the SQL statements, by the route that ran them",
+    ["route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+POOL_EVENTS = Counter(
+    "db_pool_events", "Connection pool checkouts, connects, invalidations and timeouts", ["engine", "event"]
+)
+POOL_WAIT = Counter("db_pool_wait_seconds", "Time spent waiting for a pooled connection", ["engine"])
+POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Connections of the pools by engine and state", ["engine", "state"], multiprocess_mode="livesum"
+)
+CACHE_EVENTS = Counter(
+    "response_cache_events", "Response cache hits, misses, evictions, expirations and invalidations", ["event"]
+)
+CACHE_SIZE = Gauge("response_cache_size", "Entries and bytes of the response caches", ["unit"], multiprocess_mode="livesum")
+
+POOL_COUNTERS = ("checkouts", "connects", "invalidations", "timeouts")
+POOL_STATES = ("checked_out", "checked_in", "overflow")
+CACHE_COUNTERS = ("hits", "misses", "evictions", "expirations", "invalidations")
+
+
+class Increases:
+    """Turns the running totals of the process into increases of Counters
+
+    pool_metrics and response_cache keep totals that can be reset; a total
+    that went down counts again from zero
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = {}
+
+    def add(self, counter, key, total):
+        """Adds to a Counter what a total gained since it was last seen"""
+        with self._lock:
+            last = self._seen.get(key, 0)
+            self._seen[key] = total
+        increase = total - last if total >= last else total
+        if increase > 0:
+            counter.inc(increase)
+
+
+increases = Increases()
+
+
+def route_label() -> str:
+    """Returns the route template of the current request"""
+    if not has_request_context():
+        return NO_REQUEST
+    return request.url_rule.rule if request.url_rule else UNMATCHED
+
+
+def sync_process_stats():
+    """Copies the pool and cache statistics of this process into the metrics"""
+    for engine, stats in pool_metrics.snapshots().items():
+        for name in POOL_COUNTERS:
+            increases.add(POOL_EVENTS.labels(engine, name), f"pool.{engine}.{name}", stats[name])
+        increases.add(POOL_WAIT.labels(engine), f"pool.{engine}.wait_seconds_total", stats["wait_seconds_total"])
+        for state in POOL_STATES:
+            if state in stats:
+                POOL_CONNECTIONS.labels(engine, state).set(stats[state])
+    stats = response_cache.cache.snapshot()
+    for name in CACHE_COUNTERS:
+        increases.add(CACHE_EVENTS.labels(name), f"cache.{name}", stats[name])
+    CACHE_SIZE.labels("entries").set(stats["entries"])
+    CACHE_SIZE.labels("bytes").set(stats["bytes"])
+
+
+def exposition() -> tuple:
+    """Returns the body and the content type of a scrape"""
+    sync_process_stats()
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+######################################################################
+#  R E Q U E S T   A N D   S T A T E M E N T   H O O K S
+######################################################################
+def start_request():
+    """Counts the request in flight"""
+    if request.path in SKIPPED_PATHS:
+        return
+    g.metrics_labels = (request.method, route_label())
+    g.metrics_start = time.perf_counter()
+    IN_FLIGHT.labels(*g.metrics_labels).inc()
+
+
+def count_request(response):
+    """Counts the request and its latency by status, then the statistics of the process"""
+    labels = g.get("metrics_labels")
+    if labels:
+        status = str(response.status_code)
+        REQUESTS.labels(*labels, status).inc()
+        LATENCY.labels(*labels, status).observe(time.perf_counter() - g.metrics_start)
+        sync_process_stats()
+    return response
+
+
+def end_request(exc):  # pylint: disable=unused-argument
+    """Takes the request out of the requests in flight, whatever happened to it"""
+    labels = g.pop("metrics_labels", None)
+    if labels:
+        IN_FLIGHT.labels(*labels).dec()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement(
+    conn, cursor, statement, parameters, context, executemany
+):  # pylint: disable=unused-argument, too-many-arguments
+    """Notes when a statement started"""
+    if context is not None:
+        context.metrics_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def time_statement(
+    conn, cursor, statement, parameters, context, executemany
+):  # pylint: disable=unused-argument, too-many-arguments
+    """Records how long a statement took"""
+    started = getattr(context, "metrics_start", None)
+    if started is not None:
+        QUERIES.labels(route_label()).observe(time.perf_counter() - started)
+
+
+def init_prometheus(app):
+    """Measures every request of the app"""
+    app.before_request(start_request)
+    app.after_request(count_request)
+    app.teardown_request(end_request)
@@ -0,0 +1,89 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+"""
+Module: read_replicas
+
+Sends the reads of GET requests to one of the DATABASE_REPLICA_URIS.
+A client that has just written is kept on the primary for
+DATABASE_STICKY_SECONDS so that it always reads its own writes
+"""
+import math
+import random
+import time
+from flask import g, request
+from flask import current_app as app  # Import Flask application
+from sqlalchemy import create_engine
+from service.common import status, pool_metrics
+
+READ_ONLY_METHODS = ("GET", "HEAD", "OPTIONS")
+STICKY_COOKIE = "wishlists_primary_until"
+
+
+def create_replica_engines(uris, options) -> list:
+    """Creates one engine per replica with the options of the primary
+
+    The pool of each one is counted apart, as replica-1, replica-2...
+    """
+    engines = []
+    for number, uri in enumerate(uris, 1):
+        engine = create_engine(uri, **options)
+        pool_metrics.instrument_engine(engine, f"replica-{number}")
+        engines.append(engine)
+    return engines
+
+
+app.extensions["read_replicas"] = create_replica_engines(
+    app.config["DATABASE_REPLICA_URIS"], app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+)
+
+
+######################################################################
+# Request Hooks
+######################################################################
+@app.before_request
+def route_to_replica():
+    """Picks a replica for a read-only request of a client that has not just written"""
+    replicas = app.extensions["read_replicas"]
+    if not replicas or request.method not in READ_ONLY_METHODS:
+        return
+    primary_until = request.cookies.get(STICKY_COOKIE, 0.0, type=float)
+    if primary_until > time.time():
+        return
+    g.read_replica = random.choice(replicas)
+
+
+@app.after_request
+def stick_to_primary(response):
+    """Keeps a client that has just written on the primary for a while"""
+    if (
+        app.extensions["read_replicas"]
+        and request.method not in READ_ONLY_METHODS
+        and response.status_code < status.HTTP_400_BAD_REQUEST
+    ):
+        sticky_seconds = app.config["DATABASE_STICKY_SECONDS"]
+        response.set_cookie(
+            STICKY_COOKIE,
+            str(time.time() + sticky_seconds),
+            max_age=math.ceil(sticky_seconds),
+            httponly=True,
+        )
+    return response
+
+
+@app.teardown_request
+def forget_replica(exc):  # pylint: disable=unused-argument
+    """Requests share the app context in tests, so never leak the choice"""
+    g.pop("read_replica", None)
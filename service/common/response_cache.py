@@ -0,0 +1,192 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Response Cache
+
+This module keeps the encoded GET responses of each Wishlist in the
+worker process, so that reading the same Wishlist again runs no query.
+Entries expire after RESPONSE_CACHE_TTL seconds, the least recently used
+ones are evicted to stay under RESPONSE_CACHE_MAX_BYTES, and all the
+entries of a Wishlist are dropped when the invalidation bus tells that a
+transaction changed it, in this process or in another one
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from service.common import invalidation_bus
+
+CachedResponse = namedtuple("CachedResponse", ["body", "headers"])
+Entry = namedtuple("Entry", ["expires", "size", "response"])
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of encoded responses, keyed by Wishlist id and variant
+
+    The variant tells apart the responses of one Wishlist, like the URLs
+    of its resource and of its items
+    """
+
+    def __init__(self, ttl: float = 30.0, max_bytes: int = 32 * 1024 * 1024):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clear()
+
+    @property
+    def enabled(self) -> bool:
+        """True when responses are cached at all"""
+        return self.ttl > 0 and self.max_bytes > 0
+
+    def configure(self, ttl: float, max_bytes: int):
+        """Changes the TTL and the size cap, evicting what no longer fits"""
+        with self._lock:
+            self.ttl = ttl
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """Drops every entry and sets the counters back to zero"""
+        with self._lock:
+            self._entries = OrderedDict()  # (wishlist_id, variant) -> Entry, least recently used first
+            self._variants = {}  # wishlist_id -> its variants in _entries
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+            self.invalidations = 0
+
+    def generation(self) -> int:
+        """Returns the token to give put() for a response built from the database from now on"""
+        with self._lock:
+            return self._generation
+
+    def get(self, wishlist_id, variant):
+        """Returns the CachedResponse of a Wishlist, None when missing or expired"""
+        if not self.enabled:
+            return None
+        key = (wishlist_id, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.response
+
+    def put(self, wishlist_id, variant, body: bytes, headers: list, generation: int) -> bool:
+        """Caches the encoded response of a Wishlist
+
+        The response is refused when a Wishlist changed since generation()
+        returned the token, because it may have been built from old rows
+
+        Returns:
+            bool: True when the response was cached
+        """
+        size = len(body) + sum(len(name) + len(value) for name, value in headers)
+        if not self.enabled or size > self.max_bytes:
+            return False
+        key = (wishlist_id, variant)
+        with self._lock:
+            if generation != self._generation:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = Entry(time.monotonic() + self.ttl, size, CachedResponse(body, headers))
+            self._variants.setdefault(wishlist_id, set()).add(variant)
+            self._bytes += size
+            self._evict()
+        return True
+
+    def invalidate(self, wishlist_ids=None) -> int:
+        """Drops every response of the Wishlists, of all of them when None
+
+        Returns:
+            int: the number of responses dropped
+        """
+        dropped = 0
+        with self._lock:
+            self._generation += 1
+            if wishlist_ids is None:
+                wishlist_ids = list(self._variants)
+            for wishlist_id in wishlist_ids:
+                for variant in list(self._variants.get(wishlist_id, ())):
+                    self._remove((wishlist_id, variant))
+                    dropped += 1
+            self.invalidations += dropped
+        return dropped
+
+    def snapshot(self) -> dict:
+        """Returns the counters and the size of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "pid": os.getpid(),
+                "enabled": self.enabled,
+                "ttl": self.ttl,
+                "max_bytes": self.max_bytes,
+                "bytes": self._bytes,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 6) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "bus": invalidation_bus.bus.snapshot(),
+            }
+
+    def _remove(self, key):
+        """Drops one entry, the lock must be held"""
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        variants = self._variants[key[0]]
+        variants.discard(key[1])
+        if not variants:
+            del self._variants[key[0]]
+
+    def _evict(self):
+        """Drops the least recently used entries until the cache fits, the lock must be held"""
+        while self._entries and self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+
+# Cache of this worker process
+cache = ResponseCache()
+
+
+def init_response_cache(app):
+    """Sizes the cache from the configuration of the app"""
+    cache.configure(app.config["RESPONSE_CACHE_TTL"], app.config["RESPONSE_CACHE_MAX_BYTES"])
+    if cache.enabled and not app.config["CACHE_INVALIDATION_URL"]:
+        app.logger.warning(
+            "Response cache on without CACHE_INVALIDATION_URL: other workers serve stale responses "
+            "for up to %s seconds after a change",
+            cache.ttl,
+        )
+
+
+# Every change, in this process or another, drops the responses of the Wishlist
+invalidation_bus.bus.subscribe(cache.invalidate)
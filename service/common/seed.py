@@ -0,0 +1,134 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Module: seed
+
+Generates synthetic customers, Wishlists and items that look like the ones
+of production, for benchmarks and capacity tests:
+
+- the wishlists of each customer follow a Zipf-like law: most customers
+  have one, a few have many
+- the items of each wishlist follow a Pareto law: most wishlists have a
+  handful, a heavy tail has hundreds
+- products are picked with a Zipf-like popularity, so that a few of them
+  are in many wishlists
+
+Everything comes from one random.Random(seed), so the same seed always
+gives the same rows, ids included. They are written by Wishlist.load_rows(),
+the bulk path of flask wishlists-import
+"""
+import random
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from itertools import accumulate, islice
+from service.models import Wishlist
+
+# The shape of a dataset, see the flask db-seed options
+Shape = namedtuple(
+    "Shape",
+    ["max_wishlists", "wishlist_skew", "max_items", "item_tail", "products"],
+    defaults=(20, 1.2, 200, 1.2, 10000),
+)
+# The generated dates end on this day whatever the day they are generated
+LAST_DAY = date(2024, 12, 31)
+HISTORY_DAYS = 730
+# Clears the version and variant bits of 128 random bits, then sets them to a version 4 UUID
+VERSION_MASK = ~((0xF000 << 64) | (0xC000 << 48))
+VERSION_4 = (0x4000 << 64) | (0x8000 << 48)
+NAMES = ("Birthday", "Christmas", "Wedding", "Books", "Games", "Kitchen", "Garden", "Travel", "Someday")
+
+
+def zipf_weights(size, skew) -> list:
+    """Returns the cumulative weights of 1..size under a Zipf law of exponent skew"""
+    return list(accumulate(1 / rank**skew for rank in range(1, size + 1)))
+
+
+def new_id(rng) -> str:
+    """Returns a random version 4 UUID drawn from rng, as str(uuid.UUID()) writes it"""
+    text = f"{rng.getrandbits(128) & VERSION_MASK | VERSION_4:032x}"
+    return f"{text[:8]}-{text[8:12]}-{text[12:16]}-{text[16:20]}-{text[20:]}"
+
+
+def generate(customers, shape=Shape(), seed=42):
+    """Yields the row of each Wishlist and the rows of its items
+
+    Args:
+        customers (int): customers to generate the Wishlists of
+        shape (Shape): how the Wishlists, items and products are spread
+        seed (int): the seed of the random generator
+    """
+    rng = random.Random(seed)
+    wishlist_counts = range(1, shape.max_wishlists + 1)
+    wishlist_weights = zipf_weights(shape.max_wishlists, shape.wishlist_skew)
+    products = range(shape.products)
+    product_weights = zipf_weights(shape.products, 1.0)
+    for customer in range(customers):
+        customer_id = f"customer-{customer:08d}"
+        for number in range(rng.choices(wishlist_counts, cum_weights=wishlist_weights)[0]):
+            wishlist_id = new_id(rng)
+            created = LAST_DAY - timedelta(days=rng.randrange(HISTORY_DAYS))
+            count = min(shape.max_items, int(rng.paretovariate(shape.item_tail)))
+            items = [
+                item_row(rng, wishlist_id, product, created)
+                for product in rng.choices(products, cum_weights=product_weights, k=count)
+            ]
+            yield {
+                "id": wishlist_id,
+                "customer_id": customer_id,
+                "name": f"{rng.choice(NAMES)} {number + 1}",
+                "created_date": created,
+                "modified_date": max([created] + [item["modified_date"] for item in items]),
+                "item_count": len(items),
+                "total_value_cents": sum(item["price_cents"] for item in items),
+                "last_item_added": max((item["added_date"] for item in items), default=None),
+                "version": 1,
+            }, items
+
+
+def item_row(rng, wishlist_id, product, created) -> dict:
+    """Returns the row of an item added to a Wishlist after it was created"""
+    added = created + timedelta(days=rng.randrange((LAST_DAY - created).days + 1))
+    return {
+        "id": new_id(rng),
+        "wishlist_id": wishlist_id,
+        "product_id": f"product-{product:06d}",
+        "description": f"Product {product}",
+        # Each product keeps its price, between $1 and $500
+        "price_cents": 100 + product * 7919 % 49900,
+        "added_date": added,
+        "modified_date": added + timedelta(days=rng.randrange((LAST_DAY - added).days + 1)),
+    }
+
+
+def seed_database(customers, shape=Shape(), seed=42, chunk_size=1000) -> dict:
+    """Writes a generated dataset, committing chunk_size Wishlists at a time
+
+    Returns:
+        dict: the Wishlists and items written, the seconds it took and the
+            rows per second
+    """
+    wishlists = generate(customers, shape, seed)
+    done = {"wishlists": 0, "items": 0}
+    start = time.perf_counter()
+    for chunk in iter(lambda: list(islice(wishlists, chunk_size)), []):
+        item_rows = [item for _, items in chunk for item in items]
+        Wishlist.load_rows([wishlist for wishlist, _ in chunk], item_rows)
+        done["wishlists"] += len(chunk)
+        done["items"] += len(item_rows)
+    seconds = time.perf_counter() - start
+    return dict(done, seconds=seconds, rows_per_second=(done["wishlists"] + done["items"]) / max(seconds, 1e-9))
@@ -0,0 +1,66 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+"""
+Module: unit_of_work
+
+Opens a unit of work for every request so that the model methods only
+stage their changes, then commits them once when the request succeeds
+and rolls them back when it fails
+"""
+from flask import g, jsonify
+from flask import current_app as app  # Import Flask application
+from service.models import db
+from service.common import status
+
+
+######################################################################
+# Request Hooks
+######################################################################
+@app.before_request
+def begin_unit_of_work():
+    """Opens the unit of work of the request"""
+    if app.config["UNIT_OF_WORK"]:
+        g.unit_of_work = True
+
+
+@app.after_request
+def end_unit_of_work(response):
+    """Commits the staged changes of a successful request, else discards them"""
+    if not g.pop("unit_of_work", False):
+        return response
+    if response.status_code >= status.HTTP_400_BAD_REQUEST:
+        db.session.rollback()
+        return response
+    try:
+        db.session.commit()
+    except Exception as error:  # pylint: disable=broad-except
+        db.session.rollback()
+        message = f"Unable to commit the request: {error}"
+        app.logger.error(message)
+        response = jsonify(
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            error="Internal Server Error",
+            message=message,
+        )
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    return response
+
+
+@app.teardown_request
+def discard_unit_of_work(exc):  # pylint: disable=unused-argument
+    """Rolls back a unit of work left open by an unhandled exception"""
+    if g.pop("unit_of_work", False):
+        db.session.rollback()
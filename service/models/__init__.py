@@ -4,6 +4,16 @@ Models for Wishlist
 All of the models are stored in this package
 """
 
-from .persistent_base import db, DataValidationError
+from .persistent_base import (
+    db,
+    DataValidationError,
+    VersionConflictError,
+    UUIDKey,
+    canonical_key,
+    unit_of_work_active,
+    save_changes,
+    stage_changed,
+    changed_wishlists,
+)
 from .wishlist_item import WishlistItem
 from .wishlist import Wishlist
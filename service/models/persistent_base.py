@@ -18,18 +18,164 @@ Persistent Base class for database CRUD functions
 """
 
 import logging
+import sqlite3
+import uuid
 from abc import abstractmethod
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import LargeBinary, Uuid, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.types import TypeDecorator
 
 logger = logging.getLogger("flask.app")
 
-db = SQLAlchemy()
+
+class RoutingSession(Session):  # pylint: disable=too-few-public-methods
+    """Session that reads from the replica chosen for a read-only request
+
+    Flushes, and so every write, always go to the primary
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            replica = g.get("read_replica")
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):  # pylint: disable=unused-argument
+    """SQLite only enforces foreign keys, and ON DELETE CASCADE, when asked to"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+class UUIDKey(TypeDecorator):  # pylint: disable=too-many-ancestors
+    """A UUID key that the models see as its canonical string
+
+    It is stored as a native 16 byte uuid on Postgres and as a 16 byte
+    blob elsewhere. A string that is not a UUID binds as NULL, so looking
+    it up finds nothing instead of raising an error
+    """
+
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(Uuid(as_uuid=True))
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, uuid.UUID):
+            try:
+                value = uuid.UUID(str(value))
+            except ValueError:
+                return None
+        return value if dialect.name == "postgresql" else value.bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        if isinstance(value, str):  # a key stored before the column became a UUID
+            return value
+        return str(uuid.UUID(bytes=bytes(value)))
+
+    def process_literal_param(self, value, dialect):
+        return self.process_bind_param(value, dialect)
+
+    @property
+    def python_type(self):
+        return str
 
 
 class DataValidationError(Exception):
     """Used for any data validation errors when deserializing"""
 
 
+class VersionConflictError(DataValidationError):
+    """Used when a record changed after it was read and before it was written"""
+
+
+def unit_of_work_active() -> bool:
+    """Returns True while a request-scoped unit of work is open"""
+    return has_app_context() and g.get("unit_of_work", False)
+
+
+def save_changes(commit=None) -> None:
+    """Makes the pending changes of the session durable
+
+    Inside a request-scoped unit of work the changes are only flushed and
+    the request commits them once when it ends. Elsewhere they are committed
+
+    Args:
+        commit (bool): True to commit even inside a unit of work, False to
+            only flush, None to let the unit of work decide
+    """
+    if commit is None:
+        commit = not unit_of_work_active()
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+
+
+def copy_rows(table, rows) -> None:
+    """Writes rows into a Postgres table with COPY, in the transaction of the session
+
+    Args:
+        table (Table): the table the rows go to
+        rows (list): dicts of column values, all with the same keys
+    """
+    if not rows:
+        return
+    columns = list(rows[0])
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    with cursor.copy(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row([row[column] for column in columns])
+
+
+CHANGED_KEY = "changed_wishlists"
+
+
+def canonical_key(value) -> str:
+    """Returns a key the way UUIDKey loads it, or as it is when it is not a UUID"""
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return value
+
+
+def stage_changed(session, *wishlist_ids) -> None:
+    """Records the Wishlists that the transaction of a session changes
+
+    Whatever keeps copies of the Wishlists, like the response cache, pops
+    them with changed_wishlists() when the transaction ends. The ids are
+    canonical, whatever their spelling in the request
+    """
+    session.info.setdefault(CHANGED_KEY, set()).update(
+        canonical_key(wishlist_id) for wishlist_id in wishlist_ids if wishlist_id is not None
+    )
+
+
+def changed_wishlists(session) -> set:
+    """Returns and forgets the Wishlists staged by stage_changed()"""
+    return session.info.pop(CHANGED_KEY, set())
+
+
 ######################################################################
 #  P E R S I S T E N T   B A S E   M O D E L
 ######################################################################
@@ -47,39 +193,62 @@ class PersistentBase:
     def deserialize(self, data: dict) -> None:
         """Convert a dictionary into an object"""
 
-    def create(self) -> None:
+    def create(self, commit=None) -> None:
         """
         Creates a Wishlist/Wishlist Item in the database
+
+        Args:
+            commit (bool): see save_changes()
         """
         logger.info("Creating %s", self)
         try:
             db.session.add(self)
-            db.session.commit()
+            save_changes(commit)
         except Exception as e:
             db.session.rollback()
             logger.error("Error creating record: %s", self)
             raise DataValidationError(e) from e
 
-    def update(self) -> None:
+    def update(self, commit=None) -> None:
         """
         Updates a Wishlist/Wishlist Item in the database
+
+        Args:
+            commit (bool): see save_changes()
         """
         logger.info("Updating %s", self)
-        if not self.id:
+        record_id = self.id
+        if not record_id:
             raise DataValidationError("Update called with empty ID field")
         try:
-            db.session.commit()
+            save_changes(commit)
+        except StaleDataError as e:
+            db.session.rollback()
+            logger.warning("Record changed meanwhile: %s", record_id)
+            raise VersionConflictError(e) from e
         except Exception as e:
             db.session.rollback()
             logger.error("Error updating record: %s", self)
             raise DataValidationError(e) from e
 
-    def delete(self) -> None:
-        """Removes a Wishlist/Wishlist Item from the data store"""
+    def delete(self, commit=None) -> None:
+        """Removes a Wishlist/Wishlist Item from the data store
+
+        Args:
+            commit (bool): see save_changes()
+        """
         logger.info("Deleting %s", self)
+        record_id = self.id
         try:
             db.session.delete(self)
-            db.session.commit()
+            save_changes(commit)
+        except StaleDataError as e:
+            db.session.rollback()
+            # pylint: disable=no-member
+            if db.session.query(type(self).id).filter_by(id=record_id).first() is None:
+                return  # it was deleted already
+            logger.warning("Record changed meanwhile: %s", record_id)
+            raise VersionConflictError(e) from e
         except Exception as e:
             db.session.rollback()
             logger.error("Error deleting record: %s", self)
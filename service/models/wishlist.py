@@ -22,7 +22,9 @@ The models for Wishlists are stored in this module
 import uuid
 import logging
 from datetime import date
-from .persistent_base import db, PersistentBase, DataValidationError
+from sqlalchemy import and_, or_, delete, event, func, insert, select, update
+from sqlalchemy.orm import aliased, load_only, object_session, selectinload
+from .persistent_base import db, PersistentBase, DataValidationError, UUIDKey, copy_rows, save_changes, stage_changed
 from .wishlist_item import WishlistItem
 
 logger = logging.getLogger("flask.app")
@@ -37,33 +39,66 @@ class Wishlist(db.Model, PersistentBase):
     Class that represents a Wishlist
     """
 
+    # Fields a response may be restricted to, and the column each one is read from
+    FIELDS = {
+        "id": "id",
+        "customer_id": "customer_id",
+        "name": "name",
+        "created_date": "created_date",
+        "modified_date": "modified_date",
+        "item_count": "item_count",
+        "total_value": "total_value_cents",
+        "last_item_added": "last_item_added",
+    }
+    DEFAULT_FIELDS = ("id", "customer_id", "name", "created_date", "modified_date")
+    SUMMARY_FIELDS = tuple(FIELDS)
+
     ##################################################
     # Table Schema
     ##################################################
     id = db.Column(
-        db.String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+        UUIDKey, primary_key=True, default=lambda: str(uuid.uuid4())
     )  # pylint: disable=invalid-name
-    customer_id = db.Column(db.String(36), nullable=False)
-    name = db.Column(db.String(64), nullable=False)
+    customer_id = db.Column(db.String(36), nullable=False, index=True)
+    name = db.Column(db.String(64), nullable=False, index=True)
     created_date = db.Column(db.Date(), nullable=False, default=date.today())
     modified_date = db.Column(
         db.Date(), nullable=False, default=date.today(), onupdate=date.today()
     )
+    # Totals of the items, kept up to date by every change to them
+    item_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    total_value_cents = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    last_item_added = db.Column(db.Date())
+    # Incremented by every change to the Wishlist or to its items, it is the ETag
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
     items = db.relationship("WishlistItem", backref="wishlist", passive_deletes=True)
+    # An UPDATE or DELETE only matches the version that was read
+    __mapper_args__ = {"version_id_col": version}
+    # Serve the pages of find_page() in (created_date, id) order without sorting the table
+    __table_args__ = (
+        db.Index("ix_wishlist_created_date_id", "created_date", "id"),
+        db.Index("ix_wishlist_customer_id_created_date_id", "customer_id", "created_date", "id"),
+    )
 
     def __repr__(self):
         return f"<Wishlist id=[{self.id}]>"
 
-    def serialize(self) -> dict:
-        """Converts a Wishlist into a dictionary"""
-        wishlist = {
-            "id": self.id,
-            "customer_id": self.customer_id,
-            "name": self.name,
-            "created_date": self.created_date,
-            "modified_date": self.modified_date,
-            "items": [item.serialize() for item in self.items],
-        }
+    @property
+    def total_value(self) -> float:
+        """The value of all the items in dollars"""
+        return (self.total_value_cents or 0) / 100
+
+    def serialize(self, fields=None, with_items=True, compact=False) -> dict:
+        """Converts a Wishlist into a dictionary
+
+        Args:
+            fields (list): the FIELDS to include, DEFAULT_FIELDS when None
+            with_items (bool): include the items
+            compact (bool): leave the wishlist_id out of the items
+        """
+        wishlist = {field: getattr(self, field) for field in fields or self.DEFAULT_FIELDS}
+        if with_items:
+            wishlist["items"] = [item.serialize(compact) for item in self.items]
         return wishlist
 
     def deserialize(self, data):
@@ -119,7 +154,7 @@ class Wishlist(db.Model, PersistentBase):
             name (string): the name of the Wishlists you want to match
         """
         logger.info("Processing name query for %s ...", name)
-        return cls.query.filter(cls.name == name).all()
+        return cls.query.options(selectinload(cls.items)).filter(cls.name == name).all()
 
     @classmethod
     def find_by_customer_id(cls, customer_id):
@@ -129,9 +164,328 @@ class Wishlist(db.Model, PersistentBase):
             customer_id (string): the customer_id of the Wishlists you want to match
         """
         logger.info("Processing customer_id query for %s ...", customer_id)
-        return cls.query.filter(cls.customer_id == customer_id).all()
+        return (
+            cls.query.options(selectinload(cls.items))
+            .filter(cls.customer_id == customer_id)
+            .all()
+        )
+
+    @classmethod
+    def all(cls):
+        """Returns all of the Wishlists with their items"""
+        logger.info("Processing all records")
+        return cls.query.options(selectinload(cls.items)).all()
+
+    @classmethod
+    def create_many(cls, wishlists) -> None:
+        """Inserts deserialized Wishlists and their items in one transaction
+
+        The rows are written with one multi-row INSERT per table instead of
+        one INSERT and one COMMIT per object
+
+        Args:
+            wishlists (list): Wishlists populated by deserialize()
+        """
+        logger.info("Creating %d Wishlists", len(wishlists))
+        wishlist_rows = []
+        item_rows = []
+        for wishlist in wishlists:
+            wishlist.id = wishlist.id or str(uuid.uuid4())
+            item_rows.extend(WishlistItem.bulk_rows(wishlist.items, wishlist.id))
+            wishlist_rows.append(
+                {
+                    "id": wishlist.id,
+                    "customer_id": wishlist.customer_id,
+                    "name": wishlist.name,
+                    "item_count": len(wishlist.items),
+                    "total_value_cents": sum(item.price_cents for item in wishlist.items),
+                    "last_item_added": max((item.added_date for item in wishlist.items), default=None),
+                }
+            )
+        try:
+            if wishlist_rows:
+                db.session.execute(insert(cls), wishlist_rows)
+            if item_rows:
+                db.session.execute(insert(WishlistItem), item_rows)
+            save_changes()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error creating %d Wishlists", len(wishlists))
+            raise DataValidationError(e) from e
+
+    @classmethod
+    def load_rows(cls, wishlist_rows, item_rows) -> None:
+        """Writes the rows of new Wishlists and of their items and commits them
+
+        Postgres receives them with COPY, the other databases with multi-row
+        INSERTs. The rows are written as they are: validate them first, as
+        bulk_import does, and give each Wishlist its totals and version
+
+        Args:
+            wishlist_rows (list): column values of the Wishlists
+            item_rows (list): column values of their items
+        """
+        logger.info("Loading %d Wishlists and %d items", len(wishlist_rows), len(item_rows))
+        try:
+            if db.session.connection().dialect.name == "postgresql":
+                copy_rows(cls.__table__, wishlist_rows)
+                copy_rows(WishlistItem.__table__, item_rows)
+            else:
+                # Straight to the tables, there is nothing for the ORM to do with the rows
+                if wishlist_rows:
+                    db.session.execute(insert(cls.__table__), wishlist_rows)
+                if item_rows:
+                    db.session.execute(insert(WishlistItem.__table__), item_rows)
+            save_changes(commit=True)
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error loading %d Wishlists", len(wishlist_rows))
+            raise DataValidationError(e) from e
+
+    @classmethod
+    def delete_by_customer_id(cls, customer_id) -> int:
+        """Deletes all Wishlists of a customer with a single statement
+
+        Their items are removed by the ON DELETE CASCADE of wishlist_item.wishlist_id
+
+        Args:
+            customer_id (string): the customer_id of the Wishlists you want to delete
+
+        Returns:
+            int: the number of Wishlists deleted
+        """
+        logger.info("Deleting all Wishlists of customer %s ...", customer_id)
+        try:
+            deleted = (
+                db.session.execute(delete(cls).where(cls.customer_id == customer_id).returning(cls.id))
+                .scalars()
+                .all()
+            )
+            stage_changed(db.session, *deleted)
+            save_changes()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error deleting Wishlists of customer: %s", customer_id)
+            raise DataValidationError(e) from e
+        return len(deleted)
+
+    @classmethod
+    def find_page(  # pylint: disable=too-many-arguments
+        cls, limit, after=None, customer_id=None, name=None, fields=None, with_items=True
+    ):
+        """Returns one page of Wishlists ordered by (created_date, id)
+
+        Args:
+            limit (int): the maximum number of Wishlists to return
+            after (tuple): the (created_date, id) of the last Wishlist of the previous page
+            customer_id (string): only return Wishlists of this customer
+            name (string): only return Wishlists with this name
+            fields (list): only load the columns of these FIELDS
+            with_items (bool): also load the items of the Wishlists
+        """
+        logger.info("Processing page query after %s ...", after)
+        query = cls.query.options(*cls.load_options(fields, with_items))
+        if customer_id:
+            query = query.filter(cls.customer_id == customer_id)
+        if name:
+            query = query.filter(cls.name == name)
+        if after:
+            created_date, last_id = after
+            query = query.filter(
+                or_(
+                    cls.created_date > created_date,
+                    and_(cls.created_date == created_date, cls.id > last_id),
+                )
+            )
+        return query.order_by(cls.created_date, cls.id).limit(limit).all()
 
     @classmethod
-    def find(cls, by_id):
-        """Find a wishlist by its ID."""
-        return cls.query.filter_by(id=by_id).first()
+    def export(cls, customer_id=None, modified_since=None, batch_size=1000):
+        """Yields every Wishlist as a dict with its items, in id order
+
+        A single query joins the Wishlists with their items and is read from
+        a server-side cursor batch_size rows at a time, so only the rows of
+        one Wishlist are held at once whatever the size of the tables
+
+        Args:
+            customer_id (string): only export the Wishlists of this customer
+            modified_since (date): only export the Wishlists that were modified,
+                or whose items were, on or after this date
+        """
+        logger.info("Processing export query for customer %s since %s ...", customer_id, modified_since)
+        item = WishlistItem
+        query = (
+            select(
+                cls.id, cls.customer_id, cls.name, cls.created_date, cls.modified_date,
+                item.id.label("item_id"), item.product_id, item.description, item.price_cents,
+                item.added_date, item.modified_date.label("item_modified_date"),
+            )
+            .outerjoin(item, item.wishlist_id == cls.id)
+            .order_by(cls.id, item.added_date, item.id)
+            .execution_options(yield_per=batch_size)
+        )
+        if customer_id:
+            query = query.where(cls.customer_id == customer_id)
+        if modified_since:
+            changed = aliased(WishlistItem)
+            changed_items = select(changed.id).where(
+                changed.wishlist_id == cls.id, changed.modified_date >= modified_since
+            )
+            query = query.where(or_(cls.modified_date >= modified_since, changed_items.exists()))
+        wishlist = {}
+        for row in db.session.execute(query):
+            if wishlist.get("id") != row.id:
+                if wishlist:
+                    yield wishlist
+                wishlist = {
+                    "id": row.id,
+                    "customer_id": row.customer_id,
+                    "name": row.name,
+                    "created_date": row.created_date,
+                    "modified_date": row.modified_date,
+                    "items": [],
+                }
+            if row.item_id is not None:
+                wishlist["items"].append(
+                    {
+                        "id": row.item_id,
+                        "product_id": row.product_id,
+                        "description": row.description,
+                        "price": row.price_cents / 100,
+                        "added_date": row.added_date,
+                        "modified_date": row.item_modified_date,
+                    }
+                )
+        if wishlist:
+            yield wishlist
+
+    @classmethod
+    def find_owners(cls, wishlist_ids, lock=False) -> dict:
+        """Returns the customer_id of each Wishlist that exists, in one query
+
+        Args:
+            wishlist_ids (list): the ids of the Wishlists to look up
+            lock (bool): hold a FOR NO KEY UPDATE lock on the rows until the
+                transaction ends, so that they cannot change owner or disappear
+                meanwhile. The caller goes on to update their totals, and two
+                FOR SHARE locks would let two callers wait on each other
+        """
+        query = (
+            db.session.query(cls.id, cls.customer_id)
+            .filter(cls.id.in_(wishlist_ids))
+            .order_by(cls.id)  # lock in a consistent order to avoid deadlocks
+        )
+        if lock:
+            query = query.with_for_update(key_share=True)
+        return dict(query.all())
+
+    @classmethod
+    def exists(cls, by_id):
+        """Returns True if a Wishlist with the ID exists, without loading it"""
+        return db.session.query(cls.id).filter(cls.id == by_id).first() is not None
+
+    @classmethod
+    def find_version(cls, by_id):
+        """Returns the version of a Wishlist without loading it, None if it does not exist"""
+        return db.session.query(cls.version).filter(cls.id == by_id).scalar()
+
+    @classmethod
+    def find(cls, by_id, fields=None, with_items=False):
+        """Find a wishlist by its ID.
+
+        Args:
+            by_id (string): the id of the Wishlist
+            fields (list): only load the columns of these FIELDS
+            with_items (bool): load the items in the same round trip
+        """
+        return cls.query.options(*cls.load_options(fields, with_items)).filter_by(id=by_id).first()
+
+    @classmethod
+    def parse_fields(cls, text) -> list:
+        """Returns the FIELDS listed in a comma separated string
+
+        Raises:
+            DataValidationError: when a field is unknown
+        """
+        fields = [field.strip() for field in text.split(",") if field.strip()]
+        unknown = [field for field in fields if field not in cls.FIELDS]
+        if unknown or not fields:
+            raise DataValidationError(
+                f"Invalid fields: {', '.join(unknown)}. Choose from: {', '.join(cls.FIELDS)}"
+            )
+        return fields
+
+    @classmethod
+    def load_options(cls, fields=None, with_items=True) -> list:
+        """Returns the loader options that read only what a response needs
+
+        Args:
+            fields (list): only load the columns of these FIELDS, besides the
+                id and created_date that pages are ordered by and the version
+            with_items (bool): load the items with one extra query
+        """
+        options = []
+        if fields:
+            columns = {cls.FIELDS[field] for field in fields} | {"id", "created_date", "version"}
+            options.append(load_only(*(getattr(cls, column) for column in sorted(columns))))
+        if with_items:
+            # Load the items of all the Wishlists in one extra query instead of one each
+            options.append(selectinload(cls.items))
+        return options
+
+    @classmethod
+    def recount_totals(cls) -> int:
+        """Recomputes the totals of every Wishlist from its items in one statement
+
+        Returns:
+            int: the number of Wishlists whose totals were wrong
+        """
+        logger.info("Recounting the totals of all Wishlists")
+        item_count = (
+            select(func.count(WishlistItem.id))  # pylint: disable=not-callable
+            .where(WishlistItem.wishlist_id == cls.id)
+            .scalar_subquery()
+        )
+        total_value_cents = (
+            select(func.coalesce(func.sum(WishlistItem.price_cents), 0))
+            .where(WishlistItem.wishlist_id == cls.id)
+            .scalar_subquery()
+        )
+        last_item_added = (
+            select(func.max(WishlistItem.added_date))
+            .where(WishlistItem.wishlist_id == cls.id)
+            .scalar_subquery()
+        )
+        try:
+            recounted = db.session.execute(
+                update(cls)
+                .where(
+                    or_(
+                        cls.item_count != item_count,
+                        cls.total_value_cents != total_value_cents,
+                        cls.last_item_added.is_distinct_from(last_item_added),
+                    )
+                )
+                .values(
+                    item_count=item_count,
+                    total_value_cents=total_value_cents,
+                    last_item_added=last_item_added,
+                    version=cls.version + 1,
+                )
+                .returning(cls.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            stage_changed(db.session, *recounted)
+            save_changes()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error recounting the totals of the Wishlists")
+            raise DataValidationError(e) from e
+        return len(recounted)
+
+
+@event.listens_for(Wishlist, "after_update")
+@event.listens_for(Wishlist, "after_delete")
+def stage_changed_wishlist(mapper, connection, target):  # pylint: disable=unused-argument
+    """Records a Wishlist that was updated or deleted"""
+    stage_changed(object_session(target), target.id)
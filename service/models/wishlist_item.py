@@ -22,12 +22,42 @@ The models for WishlistItems are stored in this module
 import uuid
 import logging
 from datetime import date
-from sqlalchemy import func
-from .persistent_base import db, PersistentBase, DataValidationError
+from decimal import Decimal
+from sqlalchemy import case, delete, event, func, insert, inspect, or_, select, update
+from sqlalchemy.ext.hybrid import Comparator, hybrid_property
+from sqlalchemy.orm import mapped_column, object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from .persistent_base import (
+    db,
+    PersistentBase,
+    DataValidationError,
+    RoutingSession,
+    UUIDKey,
+    save_changes,
+    stage_changed,
+)
 
 
 logger = logging.getLogger("flask.app")
 
+
+def to_cents(price) -> int:
+    """Converts a price in dollars into whole cents"""
+    return round(float(price) * 100)
+
+
+class CentsComparator(Comparator):  # pylint: disable=abstract-method, too-many-ancestors
+    """Compares the price_cents column with prices given in dollars"""
+
+    def operate(self, op, *other, **kwargs):
+        other = [
+            to_cents(value) if isinstance(value, (int, float, Decimal, str)) else value
+            for value in other
+        ]
+        return op(self.__clause_element__(), *other, **kwargs)
+
+
 ######################################################################
 #  W I S H L I S T   I T E M   M O D E L
 ######################################################################
@@ -38,20 +68,30 @@ class WishlistItem(db.Model, PersistentBase):
     Class that represents a WishlistItem
     """
 
+    # Columns that the items of a Wishlist may be sorted on
+    SORTABLE_COLUMNS = ("added_date", "modified_date", "price", "product_id", "description")
+
     ##################################################
     # Table Schema
     ##################################################
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    wishlist_id = db.Column(
-        db.String(36), db.ForeignKey("wishlist.id", ondelete="CASCADE"), nullable=False
+    id = db.Column(UUIDKey, primary_key=True, default=lambda: str(uuid.uuid4()))
+    # active_history keeps the old values around for the totals of the Wishlist
+    wishlist_id = mapped_column(
+        UUIDKey, db.ForeignKey("wishlist.id", ondelete="CASCADE"), nullable=False, active_history=True
     )
     product_id = db.Column(db.String(36), nullable=False)
     description = db.Column(db.String(256))
-    price = db.Column(db.Numeric(10, 2), nullable=False)
+    # Stored as whole cents, so comparisons are plain integer ones on the index.
+    # 64 bits hold every price of the old Numeric(10, 2) column, 32 bits stop at $21,474,836.47
+    price_cents = mapped_column(db.BigInteger, nullable=False, active_history=True)
     added_date = db.Column(db.Date(), nullable=False, default=date.today())
     modified_date = db.Column(
         db.Date(), nullable=False, default=date.today(), onupdate=date.today()
     )
+    __table_args__ = (
+        db.Index("ix_wishlist_item_wishlist_id_price", "wishlist_id", "price_cents"),
+        db.Index("ix_wishlist_item_wishlist_id_added_date", "wishlist_id", "added_date"),
+    )
 
     def __repr__(self):
         return (
@@ -67,17 +107,38 @@ class WishlistItem(db.Model, PersistentBase):
             + f"added_date: {self.added_date}, modified_date: {self.modified_date}>"
         )
 
-    def serialize(self) -> dict:
-        """Converts a WishlistItem into a dictionary"""
-        return {
+    @hybrid_property
+    def price(self):
+        """The price in dollars"""
+        return None if self.price_cents is None else self.price_cents / 100
+
+    @price.inplace.setter
+    def _price_setter(self, value):
+        self.price_cents = None if value is None else to_cents(value)
+
+    @price.inplace.comparator
+    @classmethod
+    def _price_comparator(cls):
+        return CentsComparator(cls.price_cents)
+
+    def serialize(self, compact=False) -> dict:
+        """Converts a WishlistItem into a dictionary
+
+        Args:
+            compact (bool): leave out the wishlist_id, for items nested in their Wishlist
+        """
+        item = {
             "id": self.id,
             "wishlist_id": self.wishlist_id,
             "product_id": self.product_id,
             "description": self.description,
-            "price": round(float(self.price), 2),
+            "price": self.price_cents / 100,
             "added_date": self.added_date,
             "modified_date": self.modified_date,
         }
+        if compact:
+            del item["wishlist_id"]
+        return item
 
     def deserialize(self, data):
         """
@@ -105,7 +166,7 @@ class WishlistItem(db.Model, PersistentBase):
             self.description = data.get("description", "")
 
             if isinstance(data["price"], (int, float)):
-                self.price = round(float(data["price"]), 2)
+                self.price = data["price"]
             else:
                 raise TypeError(
                     "Invalid type for int/float [price]: " + str(type(data["price"]))
@@ -124,7 +185,95 @@ class WishlistItem(db.Model, PersistentBase):
 
         return self
 
+    @staticmethod
+    def bulk_rows(items, wishlist_id=None) -> list:
+        """Returns the column values of deserialized items for a multi-row INSERT
+
+        Args:
+            items (list): WishlistItems populated by deserialize()
+            wishlist_id (string): the Wishlist the items are added to
+        """
+        rows = []
+        for item in items:
+            item.id = item.id or str(uuid.uuid4())
+            item.wishlist_id = wishlist_id or item.wishlist_id
+            item.added_date = item.added_date or date.today()
+            rows.append(
+                {
+                    "id": item.id,
+                    "wishlist_id": item.wishlist_id,
+                    "product_id": item.product_id,
+                    "description": item.description,
+                    "price_cents": item.price_cents,
+                    "added_date": item.added_date,
+                }
+            )
+        return rows
+
     @classmethod
+    def create_many(cls, wishlist_id, items) -> None:
+        """Adds deserialized items to a Wishlist with one multi-row INSERT
+
+        The existing items of the Wishlist are never loaded
+
+        Args:
+            wishlist_id (string): the Wishlist the items are added to
+            items (list): WishlistItems populated by deserialize()
+        """
+        logger.info("Creating %d items in wishlist %s", len(items), wishlist_id)
+        try:
+            db.session.execute(insert(cls), cls.bulk_rows(items, wishlist_id))
+            stage_totals(
+                db.session,
+                wishlist_id,
+                count=len(items),
+                cents=sum(item.price_cents for item in items),
+                added=max((item.added_date for item in items), default=None),
+            )
+            apply_totals(db.session)
+            save_changes()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error creating items in wishlist: %s", wishlist_id)
+            raise DataValidationError(e) from e
+
+    @classmethod
+    def move(cls, item_id, source_wishlist_id, target_wishlist_id):
+        """Moves an item to another Wishlist with a single UPDATE
+
+        The row is only changed while it still belongs to the source Wishlist,
+        so when two moves of the same item race the row lock makes the second
+        one match nothing
+
+        Returns:
+            WishlistItem: the moved item, or None if it is not in the source Wishlist
+        """
+        logger.info(
+            "Moving item %s from wishlist %s to %s",
+            item_id,
+            source_wishlist_id,
+            target_wishlist_id,
+        )
+        try:
+            item = db.session.execute(
+                update(cls)
+                .where(cls.id == item_id, cls.wishlist_id == source_wishlist_id)
+                .values(wishlist_id=target_wishlist_id)
+                .returning(cls)
+            ).scalar_one_or_none()
+            if item is None:
+                db.session.rollback()
+                return None
+            stage_totals(db.session, source_wishlist_id, count=-1, cents=-item.price_cents, removed=True)
+            stage_totals(db.session, target_wishlist_id, count=1, cents=item.price_cents, added=item.added_date)
+            apply_totals(db.session)
+            save_changes()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error moving item: %s", item_id)
+            raise DataValidationError(e) from e
+        return item
+
     @classmethod
     def find_by_price(cls, wishlist_id, price):
         """Returns all WishlistItems with the given wishlist_id and price
@@ -134,10 +283,83 @@ class WishlistItem(db.Model, PersistentBase):
             price(string): the price of the WishlistItem you want to match
         """
 
-        return cls.query.filter(
-            cls.wishlist_id == wishlist_id,
-            func.round(cls.price, 2) <= round(float(price), 2),
-        ).all()
+        return cls.query.filter(cls.wishlist_id == wishlist_id, cls.price <= price).all()
+
+    @classmethod
+    def find_for_wishlist(  # pylint: disable=too-many-arguments
+        cls,
+        wishlist_id,
+        sort_by="added_date",
+        order="asc",
+        min_price=None,
+        max_price=None,
+        added_from=None,
+        added_to=None,
+        limit=None,
+        offset=0,
+    ):
+        """Returns the filtered and sorted items of a Wishlist in a single query
+
+        Args:
+            wishlist_id (string): the wishlist_id of the WishlistItems you want to match
+            sort_by (string): one of SORTABLE_COLUMNS
+            order (string): "asc" or "desc"
+            min_price (float): the lowest price to return
+            max_price (float): the highest price to return
+            added_from (date): the earliest added_date to return
+            added_to (date): the latest added_date to return
+            limit (int): the maximum number of items to return
+            offset (int): the number of matching items to skip
+        """
+        if sort_by not in cls.SORTABLE_COLUMNS:
+            raise DataValidationError(f"Invalid sort_by: {sort_by}")
+        if order not in ("asc", "desc"):
+            raise DataValidationError(f"Invalid order: {order}")
+        logger.info("Processing item query for wishlist %s ...", wishlist_id)
+
+        query = cls.query.filter(cls.wishlist_id == wishlist_id)
+        if min_price is not None:
+            query = query.filter(cls.price >= min_price)
+        if max_price is not None:
+            query = query.filter(cls.price <= max_price)
+        if added_from is not None:
+            query = query.filter(cls.added_date >= added_from)
+        if added_to is not None:
+            query = query.filter(cls.added_date <= added_to)
+
+        # id breaks ties so that pages are stable
+        column = getattr(cls, sort_by)
+        if order == "desc":
+            query = query.order_by(column.desc(), cls.id.desc())
+        else:
+            query = query.order_by(column.asc(), cls.id.asc())
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    @classmethod
+    def delete_by_wishlist_id(cls, wishlist_id) -> int:
+        """Deletes all items of a Wishlist with a single statement
+
+        Args:
+            wishlist_id (string): the wishlist_id of the WishlistItems you want to delete
+
+        Returns:
+            int: the number of WishlistItems deleted
+        """
+        logger.info("Deleting all items of wishlist %s ...", wishlist_id)
+        try:
+            result = db.session.execute(delete(cls).where(cls.wishlist_id == wishlist_id))
+            stage_totals(db.session, wishlist_id, reset=True)
+            apply_totals(db.session)
+            save_changes()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error deleting items of wishlist: %s", wishlist_id)
+            raise DataValidationError(e) from e
+        return result.rowcount
 
     @classmethod
     def find_by_wishlist_id(cls, wishlist_id):
@@ -193,3 +415,140 @@ class WishlistItem(db.Model, PersistentBase):
     #     """
     #     logger.info("Processing description query for %s ...", description)
     #     return cls.query.filter(cls.description == description).all()
+
+
+######################################################################
+#  T O T A L S   O F   T H E   W I S H L I S T S
+######################################################################
+TOTALS_KEY = "wishlist_totals"
+
+
+def stage_totals(  # pylint: disable=too-many-arguments
+    session, wishlist_id, count=0, cents=0, added=None, removed=False, reset=False
+):
+    """Stages a change to the item_count, total_value and last_item_added of a Wishlist
+
+    Args:
+        session (Session): the session the change belongs to
+        wishlist_id (string): the Wishlist whose items changed
+        count (int): the number of items added, negative when removed
+        cents (int): the value added in cents, negative when removed
+        added (date): the latest added_date of the items added
+        removed (bool): items left the Wishlist, so last_item_added is looked up again
+        reset (bool): every item left the Wishlist
+    """
+    staged = session.info.setdefault(TOTALS_KEY, {})
+    delta = staged.setdefault(
+        wishlist_id, {"count": 0, "cents": 0, "added": None, "removed": False, "reset": False}
+    )
+    delta["count"] += count
+    delta["cents"] += cents
+    if added is not None and (delta["added"] is None or added > delta["added"]):
+        delta["added"] = added
+    delta["removed"] = delta["removed"] or removed
+    delta["reset"] = delta["reset"] or reset
+
+
+def pending_wishlist(session, wishlist_class, wishlist_id):
+    """Returns the Wishlist inserted by the flush, which joins the identity map only after it"""
+    for instance in session.new:
+        if isinstance(instance, wishlist_class) and instance.id == wishlist_id:
+            return instance
+    return None
+
+
+def apply_totals(session) -> None:
+    """Writes the staged totals with one UPDATE per Wishlist, which also increments its version
+
+    The Wishlists that are in the session get the new values too, and
+    every Wishlist whose items changed is staged with stage_changed()
+    """
+    staged = session.info.pop(TOTALS_KEY, None)
+    if not staged:
+        return
+    stage_changed(session, *staged)
+    wishlist_class = inspect(WishlistItem).relationships["wishlist"].mapper.class_
+    table = wishlist_class.__table__
+    connection = session.connection()
+    # Lock the Wishlists in a consistent order to avoid deadlocks
+    for wishlist_id, delta in sorted(staged.items()):
+        if delta["reset"]:
+            values = {"item_count": 0, "total_value_cents": 0, "last_item_added": None}
+        else:
+            values = {
+                "item_count": table.c.item_count + delta["count"],
+                "total_value_cents": table.c.total_value_cents + delta["cents"],
+            }
+            if delta["removed"]:
+                values["last_item_added"] = (
+                    select(func.max(WishlistItem.added_date))
+                    .where(WishlistItem.wishlist_id == table.c.id)
+                    .scalar_subquery()
+                )
+            elif delta["added"] is not None:
+                values["last_item_added"] = case(
+                    (
+                        or_(table.c.last_item_added.is_(None), table.c.last_item_added < delta["added"]),
+                        delta["added"],
+                    ),
+                    else_=table.c.last_item_added,
+                )
+        values["version"] = table.c.version + 1
+        row = connection.execute(
+            update(table)
+            .where(table.c.id == wishlist_id)
+            .values(values)
+            .returning(table.c.item_count, table.c.total_value_cents, table.c.last_item_added, table.c.version)
+        ).first()
+        wishlist = session.identity_map.get(identity_key(wishlist_class, wishlist_id)) or pending_wishlist(
+            session, wishlist_class, wishlist_id
+        )
+        if row is not None and wishlist is not None:
+            for name, value in row._mapping.items():
+                set_committed_value(wishlist, name, value)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def apply_flushed_totals(session, flush_context):  # pylint: disable=unused-argument
+    """Writes the totals staged by the items of a flush"""
+    apply_totals(session)
+
+
+@event.listens_for(RoutingSession, "after_soft_rollback")
+def discard_staged_totals(session, previous_transaction):  # pylint: disable=unused-argument
+    """Forgets the totals staged by a transaction that was rolled back"""
+    session.info.pop(TOTALS_KEY, None)
+
+
+@event.listens_for(WishlistItem, "after_insert")
+def count_inserted_item(mapper, connection, target):  # pylint: disable=unused-argument
+    """Adds a new item to the totals of its Wishlist"""
+    stage_totals(
+        object_session(target), target.wishlist_id, count=1, cents=target.price_cents, added=target.added_date
+    )
+
+
+@event.listens_for(WishlistItem, "after_update")
+def count_updated_item(mapper, connection, target):  # pylint: disable=unused-argument
+    """Moves a repriced or moved item between the totals of its Wishlists"""
+    state = inspect(target)
+    wishlist_history = state.attrs.wishlist_id.history
+    price_history = state.attrs.price_cents.history
+    old_wishlist_id = wishlist_history.deleted[0] if wishlist_history.deleted else target.wishlist_id
+    old_cents = price_history.deleted[0] if price_history.deleted else target.price_cents
+    session = object_session(target)
+    stage_changed(session, old_wishlist_id, target.wishlist_id)
+    stage_totals(session, target.wishlist_id)  # any change increments the version
+    if old_wishlist_id != target.wishlist_id:
+        stage_totals(session, old_wishlist_id, count=-1, cents=-old_cents, removed=True)
+        stage_totals(session, target.wishlist_id, count=1, cents=target.price_cents, added=target.added_date)
+    elif old_cents != target.price_cents:
+        stage_totals(session, target.wishlist_id, cents=target.price_cents - old_cents)
+    if state.attrs.added_date.history.has_changes():
+        stage_totals(session, target.wishlist_id, removed=True)
+
+
+@event.listens_for(WishlistItem, "before_delete")
+def count_deleted_item(mapper, connection, target):  # pylint: disable=unused-argument
+    """Removes a deleted item from the totals of its Wishlist"""
+    stage_totals(object_session(target), target.wishlist_id, count=-1, cents=-target.price_cents, removed=True)
@@ -20,11 +20,17 @@ Wishlist Service
 This service implements a REST API that allows you to Create, Read, Update
 and Delete Wishlists and Wishlist Items
 """
-
-from flask_restx import Resource, fields, reqparse
-from flask import request, current_app as app
-from service.models import Wishlist, WishlistItem
+# pylint: disable=too-many-lines
+
+import zlib
+from datetime import date
+from flask_restx import Resource, fields, reqparse, inputs
+from flask import g, request, stream_with_context, current_app as app
+from werkzeug.http import quote_etag
+from service.models import Wishlist, WishlistItem, DataValidationError, canonical_key
 from service.common import status  # HTTP Status Codes
+from service.common import export, fast_json, pool_metrics, prometheus, response_cache
+from service.common.pagination import encode_cursor, decode_cursor, page_size
 from . import api
 
 
@@ -46,6 +52,26 @@ def health():
     return {"status": "OK"}, status.HTTP_200_OK
 
 
+@app.route("/health/pool")
+def pool_health():
+    """Connection pool statistics of this worker process, with those of each read replica"""
+    stats = pool_metrics.snapshots()
+    return dict(stats.pop(pool_metrics.PRIMARY), replicas=stats), status.HTTP_200_OK
+
+
+@app.route("/health/cache")
+def cache_health():
+    """Response cache statistics of this worker process"""
+    return response_cache.cache.snapshot(), status.HTTP_200_OK
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics of every worker process"""
+    body, content_type = prometheus.exposition()
+    return app.response_class(body, content_type=content_type)
+
+
 # Define the models so that the docs reflect what can be sent
 create_wishlist_model = api.model(
     "Wishlist",
@@ -98,8 +124,48 @@ wishlist_model = api.inherit(
     },
 )
 
+summary_model = api.model(
+    "WishlistSummary",
+    {
+        "id": fields.String(readOnly=True, description="The unique id assigned internally by service"),
+        "customer_id": fields.String(description="The ID of the customer"),
+        "name": fields.String(description="The name of the wishlist"),
+        "created_date": fields.Date(description="The date the wishlist was created"),
+        "modified_date": fields.Date(description="The date the wishlist was last modified"),
+        "item_count": fields.Integer(description="The number of items in the wishlist"),
+        "total_value": fields.Float(description="The total price of the items"),
+        "last_item_added": fields.Date(description="The latest date an item still in the wishlist was added"),
+    },
+)
+
+# Query string arguments that choose the parts of the Wishlists to return
+sparse_args = reqparse.RequestParser()
+sparse_args.add_argument(
+    "fields",
+    type=str,
+    location="args",
+    required=False,
+    help="Comma separated fields to return, from: " + ", ".join(Wishlist.FIELDS),
+)
+sparse_args.add_argument(
+    "include",
+    type=str,
+    location="args",
+    required=False,
+    choices=("items",),
+    help="Return the items too, they are left out when fields is given",
+)
+sparse_args.add_argument(
+    "compact",
+    type=inputs.boolean,
+    location="args",
+    required=False,
+    default=False,
+    help="Leave the redundant wishlist_id out of the items",
+)
+
 # Query string arguments
-wishlist_args = reqparse.RequestParser()
+wishlist_args = sparse_args.copy()
 wishlist_args.add_argument(
     "customer_id",
     type=str,
@@ -110,6 +176,29 @@ wishlist_args.add_argument(
 wishlist_args.add_argument(
     "name", type=str, location="args", required=False, help="List Wishlists by name"
 )
+wishlist_args.add_argument(
+    "limit",
+    type=int,
+    location="args",
+    required=False,
+    help="Maximum number of Wishlists to return",
+)
+wishlist_args.add_argument(
+    "next",
+    type=str,
+    location="args",
+    required=False,
+    help="Cursor from the X-Next-Cursor header of the previous page",
+)
+wishlist_args.add_argument(
+    "view",
+    type=str,
+    location="args",
+    required=False,
+    default="full",
+    choices=("full", "summary"),
+    help="full returns the items, summary only their totals",
+)
 
 item_model = api.model(
     "WishlistItem",
@@ -132,6 +221,117 @@ item_model = api.model(
     },
 )
 
+# Any of the FIELDS of a Wishlist, marshalled with a mask of the requested ones
+wishlist_fields_model = api.inherit(
+    "WishlistFields",
+    summary_model,
+    {"items": fields.List(fields.Nested(item_model), description="The items of the wishlist")},
+)
+
+# Encoders compiled once from the models, they give the JSON of marshal() faster
+wishlist_json = fast_json.ModelEncoder(wishlist_model)
+wishlist_fields_json = fast_json.ModelEncoder(wishlist_fields_model)
+item_json = fast_json.ModelEncoder(item_model)
+
+
+# Query string arguments for the items of a Wishlist
+item_args = reqparse.RequestParser()
+item_args.add_argument(
+    "sort_by",
+    type=str,
+    location="args",
+    required=False,
+    default="added_date",
+    choices=WishlistItem.SORTABLE_COLUMNS,
+    help="Sort items by one of: " + ", ".join(WishlistItem.SORTABLE_COLUMNS),
+)
+item_args.add_argument(
+    "order",
+    type=str,
+    location="args",
+    required=False,
+    choices=("asc", "desc"),
+    help="Sort order, descending by default for added_date and ascending otherwise",
+)
+item_args.add_argument(
+    "price", type=float, location="args", required=False, help="Highest item price"
+)
+item_args.add_argument(
+    "min_price", type=float, location="args", required=False, help="Lowest item price"
+)
+item_args.add_argument(
+    "added_from",
+    type=inputs.date_from_iso8601,
+    location="args",
+    required=False,
+    help="Earliest added_date (YYYY-MM-DD)",
+)
+item_args.add_argument(
+    "added_to",
+    type=inputs.date_from_iso8601,
+    location="args",
+    required=False,
+    help="Latest added_date (YYYY-MM-DD)",
+)
+item_args.add_argument(
+    "limit", type=int, location="args", required=False, help="Maximum number of items"
+)
+item_args.add_argument(
+    "offset",
+    type=inputs.natural,
+    location="args",
+    required=False,
+    default=0,
+    help="Number of items to skip",
+)
+
+# Query string arguments of the export
+export_args = reqparse.RequestParser()
+export_args.add_argument(
+    "format",
+    type=str,
+    location="args",
+    required=False,
+    default="ndjson",
+    choices=("ndjson", "csv"),
+    help="ndjson writes one Wishlist per line, csv one item per row",
+)
+export_args.add_argument(
+    "customer_id", type=str, location="args", required=False, help="Only export the Wishlists of this customer"
+)
+export_args.add_argument(
+    "modified_since",
+    type=inputs.date_from_iso8601,
+    location="args",
+    required=False,
+    help="Only export the Wishlists modified, or with items modified, since this date (YYYY-MM-DD)",
+)
+
+batch_result_model = api.model(
+    "BatchResult",
+    {
+        "index": fields.Integer(description="Position of the entry in the request"),
+        "status": fields.Integer(description="HTTP status of the entry"),
+        "id": fields.String(description="The id of the created resource"),
+        "message": fields.String(description="Why the entry was rejected"),
+    },
+)
+
+batch_response_model = api.model(
+    "BatchResponse",
+    {"results": fields.List(fields.Nested(batch_result_model))},
+)
+
+batch_args = reqparse.RequestParser()
+batch_args.add_argument(
+    "atomic",
+    type=inputs.boolean,
+    location="args",
+    required=False,
+    default=True,
+    help="Write nothing if any entry is invalid (default) or write the valid ones",
+)
+
 
 ######################################################################
 #  PATH: /wishlists/{id}
@@ -149,32 +349,51 @@ class WishlistResource(Resource):
     """
 
     @api.doc("get_wishlists")
+    @api.expect(sparse_args, validate=True)
+    @api.response(400, "The fields were not valid")
     @api.response(404, "Wishlist not found")
-    @api.marshal_with(wishlist_model)
+    @api.response(304, "The Wishlist did not change since the If-None-Match ETag")
+    @api.response(200, "Success", wishlist_model)
     def get(self, wishlist_id):
         """
         Retrieve a single Wishlist
 
-        This endpoint will return a Wishlist based on its id
+        This endpoint will return a Wishlist based on its id. Only the
+        columns of the requested fields are read, and the items only when
+        they are returned. Responses are served from the response cache
+        until the Wishlist changes. A request whose If-None-Match holds the
+        current ETag gets a 304 after reading nothing but the version
         """
-        wishlist = Wishlist.find(wishlist_id)
+        response = cached_response(wishlist_id)
+        if response is not None:
+            return response
+        generation = response_cache.cache.generation()
+        field_names, with_items, compact = wishlist_view(sparse_args.parse_args())
+        response = not_modified(wishlist_id)
+        if response is not None:
+            return response
+        wishlist = Wishlist.find(wishlist_id, field_names, with_items)
         if not wishlist:
             error(
                 status.HTTP_404_NOT_FOUND,
                 f"Wishlist with id '{wishlist_id}' was not found.",
             )
-        return wishlist.serialize(), status.HTTP_200_OK
+        data = wishlist_encoder(field_names, with_items, compact).for_request().encode(wishlist)
+        return cache_response(wishlist_id, generation, data, wishlist.version)
 
     @api.doc("update_wishlists")
     @api.response(404, "Wishlist not found")
     @api.response(400, "The posted Wishlist data was not valid")
+    @api.response(409, "The Wishlist changed while it was being updated")
+    @api.response(412, "The Wishlist changed since the If-Match ETag")
     @api.expect(create_wishlist_model)
-    @api.marshal_with(wishlist_model)
+    @api.response(200, "Success", wishlist_model)
     def put(self, wishlist_id):
         """
         Update a Wishlist
 
-        This endpoint will update a Wishlist based on the body that is posted
+        This endpoint will update a Wishlist based on the body that is posted.
+        With If-Match it only does so while the Wishlist is at that ETag
         """
         wishlist = Wishlist.find(wishlist_id)
         if not wishlist:
@@ -182,20 +401,25 @@ class WishlistResource(Resource):
                 status.HTTP_404_NOT_FOUND,
                 f"Wishlist with id '{wishlist_id}' was not found.",
             )
+        check_if_match(wishlist.version)
         wishlist.deserialize(api.payload)
-        wishlist.id = wishlist_id
         wishlist.update()
-        return wishlist.serialize(), status.HTTP_200_OK
+        data = wishlist_json.for_request().encode(wishlist)
+        return data, status.HTTP_200_OK, validators(str(wishlist.version))
 
     @api.doc("delete_wishlists")
     @api.response(204, "Wishlist deleted")
+    @api.response(409, "The Wishlist changed while it was being deleted")
+    @api.response(412, "The Wishlist changed since the If-Match ETag")
     def delete(self, wishlist_id):
         """
         Delete a Wishlist
 
-        This endpoint will delete a Wishlist based on its id
+        This endpoint will delete a Wishlist based on its id. With If-Match
+        it only does so while the Wishlist is at that ETag
         """
         wishlist = Wishlist.find(wishlist_id)
+        check_if_match(wishlist.version if wishlist else None)
         if wishlist:
             wishlist.delete()
         return "", status.HTTP_204_NO_CONTENT
@@ -210,23 +434,72 @@ class WishlistCollection(Resource):
 
     @api.doc("list_wishlists")
     @api.expect(wishlist_args, validate=True)
-    @api.marshal_list_with(wishlist_model)
+    @api.response(400, "The limit or cursor was not valid")
+    @api.response(200, "Success", [wishlist_model])
     def get(self):
-        """Returns all of the Wishlists"""
+        """
+        Returns one page of Wishlists
+
+        Pages are ordered by creation date. When more Wishlists remain, the
+        X-Next-Cursor and Link headers point at the next page. With
+        view=summary the Wishlists come with the totals of their items
+        instead of the items themselves. fields, include and compact choose
+        the parts of the Wishlists to return, as on GET /wishlists/{id}
+        """
         args = wishlist_args.parse_args()
-        if args["customer_id"]:
-            wishlists = Wishlist.find_by_customer_id(args["customer_id"])
-        elif args["name"]:
-            wishlists = Wishlist.find_by_name(args["name"])
-        else:
-            wishlists = Wishlist.all()
+        field_names, with_items, compact = wishlist_view(args)
+        if args["view"] == "summary":
+            field_names = field_names or list(Wishlist.SUMMARY_FIELDS)
+            with_items = args["include"] == "items"
+        try:
+            limit = page_size(
+                args["limit"],
+                app.config["PAGE_SIZE_DEFAULT"],
+                app.config["PAGE_SIZE_MAX"],
+            )
+            after = None
+            if args["next"]:
+                created_date, last_id = decode_cursor(args["next"], 2)
+                after = (date.fromisoformat(created_date), last_id)
+        except (TypeError, ValueError) as err:
+            error(status.HTTP_400_BAD_REQUEST, str(err))
+
+        # Fetch one extra row to learn whether there is a next page
+        wishlists = Wishlist.find_page(
+            limit + 1,
+            after=after,
+            customer_id=args["customer_id"],
+            name=args["name"],
+            fields=field_names,
+            with_items=with_items,
+        )
+
+        headers = {}
+        if len(wishlists) > limit:
+            wishlists = wishlists[:limit]
+            cursor = encode_cursor(wishlists[-1].created_date.isoformat(), wishlists[-1].id)
+            next_url = api.url_for(
+                WishlistCollection,
+                customer_id=args["customer_id"],
+                name=args["name"],
+                limit=limit,
+                view=args["view"],
+                fields=args["fields"],
+                include=args["include"],
+                compact=args["compact"] or None,
+                next=cursor,
+                _external=True,
+            )
+            headers["X-Next-Cursor"] = cursor
+            headers["Link"] = f'<{next_url}>; rel="next"'
 
-        return [wishlist.serialize() for wishlist in wishlists], status.HTTP_200_OK
+        data = wishlist_encoder(field_names, with_items, compact).for_request().encode_list(wishlists)
+        return data, status.HTTP_200_OK, headers
 
     @api.doc("create_wishlists")
     @api.response(400, "The posted Wishlist data was not valid")
     @api.expect(create_wishlist_model)
-    @api.marshal_with(wishlist_model, code=201)
+    @api.response(201, "Created", wishlist_model)
     def post(self):
         """
         Creates a Wishlist
@@ -239,7 +512,72 @@ class WishlistCollection(Resource):
         location_url = api.url_for(
             WishlistResource, wishlist_id=wishlist.id, _external=True
         )
-        return wishlist.serialize(), status.HTTP_201_CREATED, {"Location": location_url}
+        headers = {"Location": location_url, **validators(str(wishlist.version))}
+        return wishlist_json.for_request().encode(wishlist), status.HTTP_201_CREATED, headers
+
+
+######################################################################
+#  PATH: /wishlists/export
+######################################################################
+@api.route("/wishlists/export")
+class WishlistExport(Resource):
+    """Streams every Wishlist with its items"""
+
+    @api.doc("export_wishlists")
+    @api.expect(export_args, validate=True)
+    @api.produces(["application/x-ndjson", "text/csv"])
+    @api.response(200, "One Wishlist per line, or one item per CSV row")
+    def get(self):
+        """
+        Export the Wishlists
+
+        This endpoint streams the Wishlists and their items while they are read
+        from a server-side cursor, so neither the database rows nor the response
+        are ever held whole, whatever the number of Wishlists
+        """
+        args = export_args.parse_args()
+        wishlists = Wishlist.export(args["customer_id"], args["modified_since"], app.config["EXPORT_BATCH_SIZE"])
+        if args["format"] == "csv":
+            lines, mimetype = export.csv_lines(wishlists), "text/csv"
+        else:
+            encoder = wishlist_encoder(list(Wishlist.DEFAULT_FIELDS), True, True)
+            lines, mimetype = export.ndjson_lines(wishlists, encoder), "application/x-ndjson"
+        response = app.response_class(
+            stream_with_context(export.chunked(lines, app.config["EXPORT_CHUNK_BYTES"])), mimetype=mimetype
+        )
+        response.headers["Content-Disposition"] = f"attachment; filename=wishlists.{args['format']}"
+        return response
+
+
+######################################################################
+#  PATH: /wishlists:batch
+######################################################################
+@api.route("/wishlists:batch")
+class WishlistBatchCollection(Resource):
+    """Handles the creation of many Wishlists in one request"""
+
+    @api.doc("create_wishlists_batch")
+    @api.expect(batch_args, [create_wishlist_model])
+    @api.response(400, "An entry was not valid and nothing was written")
+    @api.response(207, "Some entries were not valid, the others were written")
+    @api.marshal_with(batch_response_model, code=201)
+    def post(self):
+        """
+        Creates many Wishlists
+
+        Every entry is validated before anything is written, then all valid
+        Wishlists and their items are inserted in one transaction. With
+        atomic=true (default) one invalid entry rejects the whole batch
+        """
+        args = batch_args.parse_args()
+        entries = batch_payload(api.payload)
+        wishlists, results = deserialize_batch(Wishlist, entries)
+        failures = [result for result in results if "status" in result]
+        if failures and args["atomic"]:
+            return {"results": failures}, status.HTTP_400_BAD_REQUEST
+
+        Wishlist.create_many(wishlists)
+        return batch_results(results, wishlists)
 
 
 ######################################################################
@@ -251,54 +589,90 @@ class WishlistItemCollection(Resource):
     """Handles all interactions with collections of WishlistItems"""
 
     @api.doc("list_wishlist_items")
-    @api.marshal_list_with(item_model)
+    @api.expect(item_args, validate=True)
+    @api.response(400, "The query arguments were not valid")
+    @api.response(404, "Wishlist not found")
+    @api.response(304, "The Wishlist did not change since the If-None-Match ETag")
+    @api.response(200, "Success", [item_model])
     def get(self, wishlist_id):
-        """Returns all of the items for a Wishlist"""
-        wishlist = Wishlist.find(wishlist_id)
-        if not wishlist:
+        """
+        Returns the items for a Wishlist, one page at a time when paged
+
+        Filtering, sorting and paging all happen in the database. Without a
+        limit or offset every item is returned, as before paging was added.
+        When more items remain, the Link header points at the next page. Pages are
+        served from the response cache until the Wishlist changes, and carry
+        the ETag of the Wishlist version
+        """
+        response = cached_response(wishlist_id)
+        if response is not None:
+            return response
+        generation = response_cache.cache.generation()
+        version = Wishlist.find_version(wishlist_id)
+        if version is None:
             api.abort(
                 status.HTTP_404_NOT_FOUND,
                 f"Wishlist with id '{wishlist_id}' was not found.",
             )
+        response = not_modified(wishlist_id, version)
+        if response is not None:
+            return response
+
+        args = item_args.parse_args()
+        limit = None
+        if args["limit"] is not None or "offset" in request.args:
+            try:
+                limit = page_size(
+                    args["limit"],
+                    app.config["PAGE_SIZE_DEFAULT"],
+                    app.config["PAGE_SIZE_MAX"],
+                )
+            except ValueError as err:
+                error(status.HTTP_400_BAD_REQUEST, str(err))
 
-        max_price = (
-            float(request.args.get("price"))
-            if request.args.get("price")
-            else 9999999.99
-        )
-
-        sort_by = request.args.get("sort_by", "added_date")
+        sort_by = args["sort_by"]
         # Default to ascending order unless explicitly stated otherwise
-        order = request.args.get("order") or (
-            "desc" if sort_by == "added_date" else "asc"
-        )
-
-        sorted_items = sorted(
-            wishlist.items,
-            key=lambda x: getattr(x, sort_by),
-            reverse=(order == "desc"),
+        order = args["order"] or ("desc" if sort_by == "added_date" else "asc")
+
+        # Fetch one extra row to learn whether there is a next page
+        items = WishlistItem.find_for_wishlist(
+            wishlist_id,
+            sort_by=sort_by,
+            order=order,
+            min_price=args["min_price"],
+            max_price=args["price"],
+            added_from=args["added_from"],
+            added_to=args["added_to"],
+            limit=None if limit is None else limit + 1,
+            offset=args["offset"],
         )
 
-        print("### in route get ###", [item.serialize() for item in sorted_items])
+        headers = {}
+        if limit is not None and len(items) > limit:
+            items = items[:limit]
+            next_url = api.url_for(
+                WishlistItemCollection,
+                wishlist_id=wishlist_id,
+                _external=True,
+                **{key: value for key, value in request.args.items() if key != "offset"},
+                offset=args["offset"] + limit,
+            )
+            headers["Link"] = f'<{next_url}>; rel="next"'
 
-        return [
-            item.serialize()
-            for item in sorted_items
-            if item.price <= max_price and item.added_date
-        ], status.HTTP_200_OK
+        data = item_json.for_request().encode_list(items)
+        return cache_response(wishlist_id, generation, data, version, headers)
 
     @api.doc("create_wishlist_item")
     @api.response(400, "The posted Wishlist Item data was not valid")
     @api.expect(item_model)
-    @api.marshal_with(item_model, code=201)
+    @api.response(201, "Created", item_model)
     def post(self, wishlist_id):
         """
         Creates an Item in a Wishlist
 
         This endpoint will add an item to a wishlist based on the data in the body that is posted
         """
-        wishlist = Wishlist.find(wishlist_id)
-        if not wishlist:
+        if not Wishlist.exists(wishlist_id):
             error(
                 status.HTTP_404_NOT_FOUND,
                 f"Wishlist with id '{wishlist_id}' was not found.",
@@ -306,19 +680,61 @@ class WishlistItemCollection(Resource):
 
         item = WishlistItem()
         item.deserialize(api.payload)
+        # The id as it is stored, however the URL spells it
+        wishlist_id = canonical_key(wishlist_id)
         item.wishlist_id = wishlist_id  # Ensure wishlist_id is set
 
-        wishlist.items.append(item)
-        wishlist.update()  # Ensure this correctly commits the transaction
+        # Insert the row directly so the existing items are never loaded
+        item.create()
 
         location_url = api.url_for(
             WishlistItemResource,
-            wishlist_id=wishlist.id,
+            wishlist_id=wishlist_id,
             item_id=item.id,
             _external=True,
         )
 
-        return item.serialize(), status.HTTP_201_CREATED, {"Location": location_url}
+        return item_json.for_request().encode(item), status.HTTP_201_CREATED, {"Location": location_url}
+
+
+######################################################################
+#  PATH: /wishlists/{wishlist_id}/items:batch
+######################################################################
+@api.route("/wishlists/<wishlist_id>/items:batch")
+@api.param("wishlist_id", "The Wishlist identifier")
+class WishlistItemBatchCollection(Resource):
+    """Handles adding many WishlistItems to a Wishlist in one request"""
+
+    @api.doc("create_wishlist_items_batch")
+    @api.expect(batch_args, [item_model])
+    @api.response(400, "An entry was not valid and nothing was written")
+    @api.response(404, "Wishlist not found")
+    @api.response(207, "Some entries were not valid, the others were written")
+    @api.marshal_with(batch_response_model, code=201)
+    def post(self, wishlist_id):
+        """
+        Creates many Items in a Wishlist
+
+        Every entry is validated before anything is written, then the valid
+        items are inserted with one multi-row INSERT. The existing items of
+        the Wishlist are never loaded
+        """
+        if not Wishlist.exists(wishlist_id):
+            error(
+                status.HTTP_404_NOT_FOUND,
+                f"Wishlist with id '{wishlist_id}' was not found.",
+            )
+        args = batch_args.parse_args()
+        entries = batch_payload(api.payload)
+
+        items, results = deserialize_batch(WishlistItem, entries)
+        failures = [result for result in results if "status" in result]
+        if failures and args["atomic"]:
+            return {"results": failures}, status.HTTP_400_BAD_REQUEST
+
+        if items:
+            WishlistItem.create_many(canonical_key(wishlist_id), items)
+        return batch_results(results, items)
 
 
 ######################################################################
@@ -339,7 +755,7 @@ class WishlistItemResource(Resource):
 
     @api.doc("get_wishlist_item")
     @api.response(404, "Not Found")
-    @api.marshal_with(item_model)
+    @api.response(200, "Success", item_model)
     def get(self, wishlist_id, item_id):
         """
         Retrieve a single WishlistItem
@@ -358,13 +774,13 @@ class WishlistItemResource(Resource):
                 status.HTTP_404_NOT_FOUND,
                 "404 Not Found",
             )
-        return item.serialize(), status.HTTP_200_OK
+        return item_json.for_request().encode(item), status.HTTP_200_OK
 
     @api.doc("update_wishlist_item")
     @api.response(404, "WishlistItem not found")
     @api.response(400, "The posted WishlistItem data was not valid")
     @api.expect(item_model)
-    @api.marshal_with(item_model)
+    @api.response(200, "Success", item_model)
     def put(self, wishlist_id, item_id):
         """
         Update a WishlistItem
@@ -385,7 +801,7 @@ class WishlistItemResource(Resource):
             )
         item.deserialize(api.payload)
         item.update()
-        return item.serialize(), status.HTTP_200_OK
+        return item_json.for_request().encode(item), status.HTTP_200_OK
 
     @api.doc("delete_wishlist_item")
     @api.response(204, "WishlistItem deleted")
@@ -429,42 +845,36 @@ class WishlistItemMoveResource(Resource):
     @api.doc("move_wishlist_item")
     @api.response(404, "WishlistItem or Wishlist not found")
     @api.response(403, "Cannot move item to a wishlist of a different customer")
-    @api.marshal_with(item_model)
+    @api.response(200, "Success", item_model)
     def put(self, wishlist_id, item_id, target_wishlist_id):
         """
         Move an Item from One Wishlist to Another
 
         This endpoint will move an item from a source wishlist to a target wishlist
         """
-        source_wishlist = Wishlist.find(wishlist_id)
-        if not source_wishlist:
+        # Lock both wishlists so neither can change owner before the move commits
+        owners = Wishlist.find_owners([wishlist_id, target_wishlist_id], lock=True)
+        if wishlist_id not in owners:
             error(
                 status.HTTP_404_NOT_FOUND,
                 f"Source wishlist with id '{wishlist_id}' was not found.",
             )
-        target_wishlist = Wishlist.find(target_wishlist_id)
-        if not target_wishlist:
+        if target_wishlist_id not in owners:
             error(
                 status.HTTP_404_NOT_FOUND,
                 f"Target wishlist with id '{target_wishlist_id}' was not found.",
             )
-        item = WishlistItem.find(item_id)
-        if not item or item.wishlist_id != wishlist_id:
+        if owners[target_wishlist_id] != owners[wishlist_id]:
+            error(status.HTTP_403_FORBIDDEN, "Wishlists belong to different customers.")
+
+        item = WishlistItem.move(item_id, wishlist_id, target_wishlist_id)
+        if not item:
             error(
                 status.HTTP_404_NOT_FOUND,
                 f"Item with id '{item_id}' was not found in wishlist '{wishlist_id}'.",
             )
-        if target_wishlist.customer_id != source_wishlist.customer_id:
-            error(status.HTTP_403_FORBIDDEN, "Wishlists belong to different customers.")
-
-        item.wishlist_id = target_wishlist_id
-        item.update()
-        source_wishlist.items = [i for i in source_wishlist.items if i.id != item_id]
-        source_wishlist.update()
-        target_wishlist.items.append(item)
-        target_wishlist.update()
 
-        return item.serialize(), status.HTTP_200_OK
+        return item_json.for_request().encode(item), status.HTTP_200_OK
 
 
 ######################################################################
@@ -487,12 +897,8 @@ class WishlistCustomerResource(Resource):
 
         This endpoint will delete all wishlists for a specific customer based on the customer id specified in the path
         """
-        all_wishlists = Wishlist.find_by_customer_id(customer_id)
-        if not all_wishlists:
-            return "", status.HTTP_204_NO_CONTENT
-
-        for wishlist in all_wishlists:
-            wishlist.delete()
+        count = Wishlist.delete_by_customer_id(customer_id)
+        app.logger.info("Deleted %d Wishlists of customer %s", count, customer_id)
         return "", status.HTTP_204_NO_CONTENT
 
 
@@ -516,12 +922,8 @@ class WishlistItemsDeleteAllResource(Resource):
 
         This endpoint will delete all items in a specific wishlist based on the wishlist id specified in the path
         """
-        all_items = WishlistItem.find_by_wishlist_id(wishlist_id)
-        if not all_items:
-            return "", status.HTTP_204_NO_CONTENT
-
-        for item in all_items:
-            item.delete()
+        count = WishlistItem.delete_by_wishlist_id(wishlist_id)
+        app.logger.info("Deleted %d items of Wishlist %s", count, wishlist_id)
         return "", status.HTTP_204_NO_CONTENT
 
 
@@ -532,3 +934,162 @@ def error(status_code, reason):
     """Logs the error and then aborts"""
     api.logger.error(reason)
     api.abort(status_code, reason)
+
+
+def batch_payload(entries):
+    """Checks that the body of a batch request is a list of acceptable size"""
+    if not isinstance(entries, list):
+        error(status.HTTP_400_BAD_REQUEST, "The body must be a list")
+    if len(entries) > app.config["BATCH_SIZE_MAX"]:
+        error(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"A batch may hold at most {app.config['BATCH_SIZE_MAX']} entries",
+        )
+    return entries
+
+
+def deserialize_batch(model, entries):
+    """Deserializes every entry of a batch without writing anything
+
+    Returns:
+        the valid objects and one result per entry, where invalid entries
+        already carry a 400 status and the reason
+    """
+    valid = []
+    results = []
+    for position, data in enumerate(entries):
+        try:
+            valid.append(model().deserialize(data))
+            results.append({"index": position})
+        except DataValidationError as err:
+            results.append(
+                {"index": position, "status": status.HTTP_400_BAD_REQUEST, "message": str(err)}
+            )
+    return valid, results
+
+
+def batch_results(results, created):
+    """Completes the results of a written batch with the ids of the created objects"""
+    created = iter(created)
+    failed = False
+    for result in results:
+        if "status" in result:
+            failed = True
+        else:
+            result.update(status=status.HTTP_201_CREATED, id=next(created).id)
+    code = status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED
+    return {"results": results}, code
+
+
+def wishlist_view(args) -> tuple:
+    """Returns the (field_names, with_items, compact) asked for by the sparse_args of a request
+
+    Without fields or include a Wishlist comes whole, with its items
+    """
+    field_names = None
+    if args["fields"]:
+        try:
+            field_names = Wishlist.parse_fields(args["fields"])
+        except DataValidationError as err:
+            error(status.HTTP_400_BAD_REQUEST, str(err))
+    with_items = args["include"] == "items" or (field_names is None and args["include"] is None)
+    return field_names, with_items, args["compact"]
+
+
+def wishlist_encoder(field_names, with_items, compact):
+    """Returns the encoder of Wishlists with only the parts that were asked for"""
+    if field_names is None and with_items and not compact:
+        return wishlist_json
+    mask = list(field_names or Wishlist.DEFAULT_FIELDS)
+    if with_items:
+        item_fields = [name for name in item_model if not (compact and name == "wishlist_id")]
+        mask.append("items{" + ",".join(item_fields) + "}")
+    return wishlist_fields_json.masked("{" + ",".join(mask) + "}")
+
+
+def cached_response(wishlist_id):
+    """Returns the cached response of a Wishlist to the URL of this request, None on a miss
+
+    The response is a 304 when it still has the ETag of If-None-Match
+    """
+    cached = response_cache.cache.get(canonical_key(wishlist_id), representation())
+    if cached is None:
+        return None
+    response = app.response_class(cached.body, status=status.HTTP_200_OK, headers=cached.headers)
+    return response.make_conditional(request)
+
+
+def cache_response(wishlist_id, generation, data, version, headers=None):
+    """Encodes a response the way flask-restx does and caches it for the Wishlist
+
+    Args:
+        generation (int): what the cache generation() was before the database was read
+        version (int): the version of the Wishlist the response was built from
+    """
+    response = api.make_response(data, status.HTTP_200_OK, headers or {})
+    response.headers.update(validators(entity_tag(version)))
+    # A replica can be behind the change that last invalidated the Wishlist
+    if not g.get("read_replica"):
+        response_cache.cache.put(
+            canonical_key(wishlist_id), representation(), response.get_data(), list(response.headers.items()), generation
+        )
+    return response.make_conditional(request)
+
+
+def mask_header() -> str:
+    """Returns the X-Fields mask of the request, empty without one"""
+    return request.headers.get(app.config["RESTX_MASK_HEADER"], "")
+
+
+def representation() -> str:
+    """Returns the URL of the request, followed by its X-Fields mask when it has one"""
+    mask = mask_header()
+    return f"{request.url} {mask}" if mask else request.url
+
+
+def entity_tag(version) -> str:
+    """Returns the ETag of the representation of a Wishlist version asked for by this request
+
+    Each query string, like a sparse fieldset or a page of items, and each
+    X-Fields mask is its own representation with its own tag, and every tag
+    starts with the version
+    """
+    variant = request.query_string + mask_header().encode()
+    if not variant:
+        return str(version)
+    return f"{version}-{zlib.crc32(variant):08x}"
+
+
+def validators(tag) -> dict:
+    """Returns the ETag and Cache-Control headers of a response"""
+    return {"ETag": quote_etag(tag), "Cache-Control": app.config["CACHE_CONTROL"]}
+
+
+def not_modified(wishlist_id, version=None):
+    """Returns a 304 response when If-None-Match holds the current ETag of a Wishlist, else None
+
+    Only the version of the Wishlist is read, when it is not given
+    """
+    if not request.if_none_match:
+        return None
+    if version is None:
+        version = Wishlist.find_version(wishlist_id)
+    if version is None or not request.if_none_match.contains_weak(entity_tag(version)):
+        return None
+    return app.response_class(status=status.HTTP_304_NOT_MODIFIED, headers=validators(entity_tag(version)))
+
+
+def check_if_match(version):
+    """Aborts with 412 unless If-Match is absent or holds a tag of the current version
+
+    Args:
+        version (int): the version of the Wishlist, None when it does not exist
+    """
+    if_match = request.if_match
+    if not if_match:
+        return
+    if version is not None and (
+        if_match.star_tag or any(tag.split("-", 1)[0] == str(version) for tag in if_match)
+    ):
+        return
+    error(status.HTTP_412_PRECONDITION_FAILED, "The Wishlist does not match the If-Match ETag.")
@@ -17,6 +17,7 @@
 """
 Test Factory to make fake objects for testing
 """
+import uuid
 from datetime import date
 from factory import Factory, SubFactory, Sequence, Faker, post_generation
 from factory.fuzzy import FuzzyFloat, FuzzyDate
@@ -32,7 +33,7 @@ class WishlistFactory(Factory):
 
         model = Wishlist
 
-    id = Sequence(lambda n: f"{n:04d}")
+    id = Sequence(lambda n: str(uuid.UUID(int=n)))
     customer_id = Sequence(lambda n: f"Customer{n:04d}")
     name = Faker("word")
     created_date = FuzzyDate(start_date=date(2000, 1, 1))
@@ -59,7 +60,7 @@ class WishlistItemFactory(Factory):
 
         model = WishlistItem
 
-    id = Sequence(lambda n: f"{n:04d}")
+    id = Sequence(lambda n: str(uuid.UUID(int=n)))
     wishlist_id = None
     product_id = Sequence(lambda n: f"{n:04d}")
     description = Faker("sentence")
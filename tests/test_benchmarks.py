@@ -0,0 +1,63 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Route Benchmark
+"""
+
+from wsgi import app
+from benchmarks import routes
+from service.common import response_cache
+from .test_base import TestBase
+
+
+def results(**routes_by_size) -> dict:
+    """Returns benchmark results with the given p50 of each route, by size"""
+    return {
+        "results": {
+            size.lstrip("_"): {name: {"p50": p50, "p95": p50 * 2} for name, p50 in latencies.items()}
+            for size, latencies in routes_by_size.items()
+        }
+    }
+
+
+######################################################################
+#  R O U T E   B E N C H M A R K   T E S T   C A S E S
+######################################################################
+class TestRouteBenchmark(TestBase):
+    """Route Benchmark Test Cases"""
+
+    def test_regressions(self):
+        """It should only report the routes that grew past both the threshold and the noise"""
+        baseline = results(_100={"GET /": 1.0, "GET /health": 0.1, "GET /api/wishlists": 4.0})
+        current = results(
+            _100={"GET /": 1.5, "GET /health": 0.25, "GET /api/wishlists": 4.5, "GET /new": 9.0},
+            _1000={"GET /": 50.0},
+        )
+        found = routes.regressions(baseline, current)
+        self.assertEqual(found, ["GET / at 100 customers: p50 1.00 -> 1.50 ms (+50%)"])
+        self.assertEqual(routes.regressions(baseline, current, threshold=0.6), [])
+        self.assertEqual(len(routes.regressions(baseline, current, threshold=0.1, noise_ms=0.1)), 3)
+        self.assertEqual(routes.regressions(baseline, current, metric="p95", noise_ms=2.0), [])
+        self.assertEqual(routes.regressions(baseline, baseline), [])
+
+    def test_run_without_response_cache(self):
+        """It should time the routes with the response cache turned off"""
+        self.cache_responses()
+        self.addCleanup(app.logger.setLevel, app.logger.level)
+        self.assertTrue(response_cache.cache.enabled)
+        self.assertEqual(routes.run([], 1, 0)["results"], {})
+        self.assertFalse(response_cache.cache.enabled)
@@ -0,0 +1,191 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Bulk Import
+"""
+
+import json
+import os
+import tempfile
+from datetime import date
+from unittest.mock import patch
+from service.common import bulk_import
+from service.models import DataValidationError, Wishlist, WishlistItem, db
+from .factories import WishlistFactory, WishlistItemFactory
+from .test_base import TestBase
+
+WISHLIST_ID = "6f1c6a7e-3a4c-4b0e-9d2e-1f2a3b4c5d6e"
+
+
+######################################################################
+#  B U L K   I M P O R T   T E S T   C A S E S
+######################################################################
+class TestBulkImport(TestBase):
+    """Bulk Import Test Cases"""
+
+    def setUp(self):
+        """Runs before each test"""
+        super().setUp()
+        self.folder = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.folder.cleanup)
+
+    def write(self, name, text):
+        """Writes a file of the test and returns its path"""
+        path = os.path.join(self.folder.name, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+        return path
+
+    def write_ndjson(self, records):
+        """Writes an NDJSON file with one record per line"""
+        return self.write("wishlists.ndjson", "".join(f"{json.dumps(record)}\n" for record in records))
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_import_ndjson(self):
+        """It should load Wishlists with their items and totals from NDJSON"""
+        path = self.write_ndjson(
+            [
+                {
+                    "id": WISHLIST_ID,
+                    "customer_id": "alice",
+                    "name": "books",
+                    "created_date": "2023-05-01",
+                    "items": [
+                        {"product_id": "p1", "price": 1.25, "added_date": "2023-05-02T00:00:00"},
+                        {"product_id": "p2", "price": 2, "description": "two"},
+                    ],
+                },
+                {"customer_id": "bob", "name": "empty"},
+            ]
+        )
+        progress = list(bulk_import.import_file(path, chunk_size=1))
+        self.assertEqual([(step["wishlists"], step["items"]) for step in progress], [(1, 2), (2, 2)])
+        self.assertEqual(bulk_import.read_checkpoint(path), {"wishlists": 0, "items": 0})
+        wishlist = Wishlist.find(WISHLIST_ID)
+        self.assertEqual((wishlist.customer_id, wishlist.created_date), ("alice", date(2023, 5, 1)))
+        self.assertEqual((wishlist.item_count, wishlist.total_value_cents, wishlist.version), (2, 325, 1))
+        self.assertEqual(wishlist.last_item_added, date.today())
+        self.assertEqual(sorted(item.price for item in wishlist.items), [1.25, 2.0])
+        self.assertEqual(Wishlist.find_by_customer_id("bob")[0].item_count, 0)
+
+    def test_import_exported_csv(self):
+        """It should load again the Wishlists of a CSV export"""
+        wishlist = WishlistFactory()
+        wishlist.items = WishlistItemFactory.create_batch(3, description='say "hi", twice')
+        wishlist.create()
+        WishlistFactory().create()
+        path = self.write("export.csv", self.client.get("/api/wishlists/export?format=csv").get_data(as_text=True))
+        expected = list(Wishlist.export())
+        db.session.query(Wishlist).delete()
+        db.session.commit()
+
+        progress = list(bulk_import.import_file(path, workers=2))
+        self.assertEqual((progress[-1]["wishlists"], progress[-1]["items"]), (2, 3))
+        self.assertEqual(list(Wishlist.export()), expected)
+        self.assertEqual(Wishlist.find(wishlist.id).total_value_cents, sum(item.price_cents for item in wishlist.items))
+
+    def test_import_csv_without_ids(self):
+        """It should make a Wishlist of the CSV rows of each customer_id and name that have no wishlist_id"""
+        rows = [
+            "wishlist_id,customer_id,name,product_id,price",
+            ",alice,books,p1,1",
+            ",alice,books,p2,2",
+            ",alice,games,p3,3",
+            ",bob,books,p4,4",
+            f"{WISHLIST_ID},bob,books,p5,5",
+        ]
+        path = self.write("new.csv", "\n".join(rows) + "\n")
+        progress = list(bulk_import.import_file(path))
+        self.assertEqual((progress[-1]["wishlists"], progress[-1]["items"]), (4, 5))
+        totals = sorted((w.customer_id, w.name, w.item_count, w.total_value_cents) for w in Wishlist.all())
+        self.assertEqual(
+            totals,
+            [("alice", "books", 2, 300), ("alice", "games", 1, 300), ("bob", "books", 1, 400), ("bob", "books", 1, 500)],
+        )
+        self.assertEqual(Wishlist.find(WISHLIST_ID).item_count, 1)
+
+    def test_resume_after_errors(self):
+        """It should stop before a chunk with invalid records and resume after the last commit"""
+        records = [{"customer_id": "alice", "name": f"list {index}"} for index in range(5)]
+        records[3] = {"customer_id": "alice", "items": [{"product_id": "p1", "price": "free"}]}
+        path = self.write_ndjson(records)
+        with self.assertRaises(DataValidationError) as context:
+            list(bulk_import.import_file(path, chunk_size=2))
+        self.assertIn("line 4: Invalid Wishlist: missing name", str(context.exception))
+        self.assertEqual(len(Wishlist.all()), 2)
+        self.assertEqual(bulk_import.read_checkpoint(path), {"wishlists": 2, "items": 0})
+
+        records[3] = {"customer_id": "alice", "name": "fixed"}
+        self.write_ndjson(records)
+        progress = list(bulk_import.import_file(path, chunk_size=2))
+        self.assertEqual(progress[-1]["wishlists"], 5)
+        self.assertEqual(sorted(w.name for w in Wishlist.all()), ["fixed", "list 0", "list 1", "list 2", "list 4"])
+
+        db.session.query(Wishlist).delete()
+        db.session.commit()
+        bulk_import.write_checkpoint(path, {"wishlists": 4, "items": 0})
+        db.session.commit()
+        self.assertEqual(list(bulk_import.import_file(path, restart=True))[-1]["wishlists"], 5)
+
+    def test_resume_after_crash(self):
+        """It should not load a chunk again when the import died right after committing it"""
+        path = self.write_ndjson([{"customer_id": "alice", "name": f"list {index}"} for index in range(5)])
+        load_rows = Wishlist.load_rows
+
+        def crash_after_second_chunk(wishlist_rows, item_rows):
+            load_rows(wishlist_rows, item_rows)
+            if wishlist_rows[0]["name"] == "list 2":
+                raise KeyboardInterrupt
+
+        with patch.object(Wishlist, "load_rows", side_effect=crash_after_second_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                list(bulk_import.import_file(path, chunk_size=2))
+        db.session.rollback()
+        self.assertEqual(bulk_import.read_checkpoint(path), {"wishlists": 4, "items": 0})
+
+        self.assertEqual(list(bulk_import.import_file(path, chunk_size=2))[-1]["wishlists"], 5)
+        self.assertEqual(sorted(w.name for w in Wishlist.all()), [f"list {index}" for index in range(5)])
+
+    def test_invalid_records(self):
+        """It should report each invalid record with its line"""
+        lines = [
+            "not json",
+            "[1]",
+            json.dumps({"id": "nope", "customer_id": "a", "name": "n"}),
+            json.dumps({"customer_id": "a", "name": "n", "created_date": "May"}),
+            json.dumps({"customer_id": "a", "name": "n", "items": ["x"]}),
+            json.dumps({"customer_id": "a", "name": "n", "items": [{"product_id": "p", "price": "1"}]}),
+        ]
+        path = self.write("bad.ndjson", "\n".join(lines * 2))
+        with self.assertRaises(DataValidationError) as context:
+            list(bulk_import.import_file(path))
+        message = str(context.exception)
+        for line, text in enumerate(["line 1:", "not an object", "Invalid id", "Invalid date", "Invalid WishlistItem"], 1):
+            self.assertIn(text, message, line)
+        self.assertIn("and 2 more", message)
+        self.assertEqual(Wishlist.all(), [])
+
+    def test_load_rows_failure(self):
+        """It should roll back and raise when the rows cannot be written"""
+        data = {"customer_id": "a", "name": "n", "items": [{"product_id": "p", "price": 1}]}
+        row, items = bulk_import.wishlist_rows_of(data)
+        Wishlist.load_rows([row], items)
+        self.assertRaises(DataValidationError, Wishlist.load_rows, [row], [])
+        self.assertEqual(len(WishlistItem.all()), 1)
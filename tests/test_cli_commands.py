@@ -7,7 +7,8 @@ from unittest.mock import patch, MagicMock
 from click.testing import CliRunner
 # pylint: disable=unused-import
 from wsgi import app  # noqa: F401
-from service.common.cli_commands import db_create  # noqa: E402
+from service.models import DataValidationError  # noqa: E402
+from service.common.cli_commands import db_create, db_migrate, db_seed, wishlists_import, wishlists_recount  # noqa: E402
 
 
 class TestFlaskCLI(TestCase):
@@ -23,3 +24,68 @@ class TestFlaskCLI(TestCase):
         with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
             result = self.runner.invoke(db_create)
             self.assertEqual(result.exit_code, 0)
+
+    @patch('service.common.cli_commands.seed')
+    def test_db_seed(self, seed_mock):
+        """It should call the db-seed command"""
+        seed_mock.seed_database.return_value = {"wishlists": 12, "items": 40, "seconds": 0.5, "rows_per_second": 104}
+        with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
+            result = self.runner.invoke(db_seed, ["--customers", "5", "--seed", "3", "--max-items", "9"])
+            self.assertEqual(result.exit_code, 0)
+            self.assertIn("Seeded 5 customers, 12 wishlists and 40 items", result.output)
+            self.assertEqual(seed_mock.seed_database.call_args[0][0], 5)
+            self.assertEqual(seed_mock.seed_database.call_args[0][2], 3)
+            self.assertEqual(seed_mock.Shape.call_args[1]["max_items"], 9)
+
+            seed_mock.seed_database.side_effect = DataValidationError("UNIQUE constraint failed")
+            result = self.runner.invoke(db_seed)
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn("same seed", result.output)
+
+    @patch('service.common.cli_commands.migrations')
+    def test_db_migrate(self, migrations_mock):
+        """It should call the db-migrate command"""
+        migration = MagicMock(version=1, description="Index lookups")
+        migrations_mock.migrate.return_value = [migration]
+        with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
+            result = self.runner.invoke(db_migrate, ["--target", "1"])
+            self.assertEqual(result.exit_code, 0)
+            self.assertIn("Applied 1: Index lookups", result.output)
+            self.assertEqual(migrations_mock.migrate.call_args[0][1], 1)
+
+        migrations_mock.migrate.return_value = []
+        with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
+            result = self.runner.invoke(db_migrate)
+            self.assertEqual(result.exit_code, 0)
+            self.assertIn("up to date", result.output)
+
+    @patch('service.common.cli_commands.Wishlist')
+    def test_wishlists_recount(self, wishlist_mock):
+        """It should call the wishlists-recount command"""
+        wishlist_mock.recount_totals.return_value = 3
+        with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
+            result = self.runner.invoke(wishlists_recount)
+            self.assertEqual(result.exit_code, 0)
+            self.assertIn("Repaired the totals of 3 wishlists", result.output)
+
+    @patch('service.common.cli_commands.bulk_import')
+    def test_wishlists_import(self, import_mock):
+        """It should call the wishlists-import command"""
+        import_mock.FORMATS = ("ndjson", "csv")
+        import_mock.read_checkpoint.return_value = {"wishlists": 2, "items": 5}
+        import_mock.import_file.return_value = iter([{"wishlists": 4, "items": 9, "rows_per_second": 1234.5}])
+        with self.runner.isolated_filesystem():
+            with open("wishlists.ndjson", "w", encoding="utf-8") as file:
+                file.write("{}\n")
+            with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
+                result = self.runner.invoke(wishlists_import, ["wishlists.ndjson", "--chunk-size", "10"])
+                self.assertEqual(result.exit_code, 0)
+                self.assertIn("Resuming after 2 wishlists", result.output)
+                self.assertIn("Imported 4 wishlists and 9 items at 1234 rows/s", result.output)
+                self.assertEqual(import_mock.import_file.call_args[0][1:], (None, 10, 1, False))
+
+                import_mock.import_file.side_effect = DataValidationError("line 3: Invalid Wishlist: missing name")
+                result = self.runner.invoke(wishlists_import, ["wishlists.ndjson", "--restart", "--workers", "2"])
+                self.assertEqual(result.exit_code, 1)
+                self.assertIn("line 3: Invalid Wishlist", result.output)
+                self.assertEqual(import_mock.import_file.call_args[0][3:], (2, True))
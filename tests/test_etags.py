@@ -0,0 +1,164 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the ETags and conditional requests of the Wishlists
+"""
+
+from unittest.mock import patch
+from sqlalchemy import update
+from service.common import status
+from service.common.response_cache import cache
+from service.models import Wishlist, VersionConflictError, db
+from .factories import WishlistFactory, WishlistItemFactory
+from .test_base import TestBase
+
+BASE_URL = "/api/wishlists"
+
+
+######################################################################
+#  E T A G   T E S T   C A S E S
+######################################################################
+class TestETags(TestBase):
+    """ETag and Conditional Request Test Cases"""
+
+    def setUp(self):
+        """Creates a Wishlist with an item"""
+        super().setUp()
+        self.wishlist = WishlistFactory()
+        self.wishlist.items = [WishlistItemFactory()]
+        self.wishlist.create()
+        self.version = Wishlist.find_version(self.wishlist.id)
+        self.url = f"{BASE_URL}/{self.wishlist.id}"
+        self.body = {"name": "renamed", "customer_id": self.wishlist.customer_id}
+
+    def etag(self, url=None):
+        """Returns the ETag of a GET"""
+        return self.client.get(url or self.url).headers["ETag"]
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_etags(self):
+        """It should tag each representation of a Wishlist with its version"""
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.headers["ETag"], f'"{self.version}"')
+        self.assertEqual(resp.headers["Cache-Control"], "private, no-cache")
+        self.assertEqual(self.etag(f"{self.url}/items"), f'"{self.version}"')
+        sparse = self.etag(f"{self.url}?fields=name")
+        self.assertTrue(sparse.startswith(f'"{self.version}-'))
+        self.assertNotEqual(sparse, self.etag(f"{self.url}?fields=id"))
+
+        resp = self.client.post(BASE_URL, json=WishlistFactory().serialize())
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.headers["ETag"], self.etag(resp.headers["Location"]))
+
+    def test_create_with_items_etag(self):
+        """It should send the ETag of the stored version when a Wishlist is created with items"""
+        data = WishlistFactory().serialize()
+        data["items"] = [item.serialize() for item in WishlistItemFactory.create_batch(2)]
+        resp = self.client.post(BASE_URL, json=data)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.headers["ETag"], self.etag(resp.headers["Location"]))
+        body = {"name": "renamed", "customer_id": data["customer_id"]}
+        resp = self.client.put(resp.headers["Location"], json=body, headers={"If-Match": resp.headers["ETag"]})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_not_modified_from_cache(self):
+        """It should answer 304 from the response cache without a query"""
+        self.cache_responses()
+        for url in (self.url, f"{self.url}/items"):
+            etag = self.etag(url)
+            with self.count_queries() as statements:
+                resp = self.client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(resp.get_data(), b"")
+            self.assertEqual(resp.headers["ETag"], etag)
+            self.assertEqual(statements, [])
+
+    def test_not_modified_from_database(self):
+        """It should answer 304 after reading only the version"""
+        for url in (self.url, f"{self.url}/items", f"{self.url}?fields=name"):
+            etag = self.etag(url)
+            cache.clear()
+            with self.count_queries() as statements:
+                resp = self.client.get(url, headers={"If-None-Match": f'"0", {etag}'})
+            self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(resp.headers["ETag"], etag)
+            self.assertEqual(len(statements), 1)
+            self.assertNotIn("wishlist_item", statements[0])
+        resp = self.client.get(f"{BASE_URL}/{WishlistFactory().id}", headers={"If-None-Match": "*"})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_item_changes_bump_the_version(self):
+        """It should change the ETag of a Wishlist when its items change"""
+        item_url = f"{self.url}/items/{self.wishlist.items[0].id}"
+        changes = [
+            lambda: self.client.post(f"{self.url}/items", json=WishlistItemFactory().serialize()),
+            lambda: self.client.put(item_url, json=dict(self.wishlist.items[0].serialize(), description="new")),
+            lambda: self.client.delete(item_url),
+        ]
+        for version, change in enumerate(changes, start=self.version + 1):
+            etag = self.etag()
+            change()
+            resp = self.client.get(self.url, headers={"If-None-Match": etag})
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertEqual(resp.headers["ETag"], f'"{version}"')
+
+    def test_update_if_match(self):
+        """It should only update a Wishlist that still has the If-Match ETag"""
+        version = self.version
+        resp = self.client.put(self.url, json=self.body, headers={"If-Match": f'"{version}"'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.headers["ETag"], f'"{version + 1}"')
+        resp = self.client.put(self.url, json=dict(self.body, name="lost"), headers={"If-Match": f'"{version}"'})
+        self.assertEqual(resp.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        resp = self.client.put(
+            self.url, json=dict(self.body, name="sparse"), headers={"If-Match": f'"{version + 1}-0badc0de"'}
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        resp = self.client.put(self.url, json=dict(self.body, name="any"), headers={"If-Match": "*"})
+        self.assertEqual(resp.headers["ETag"], f'"{version + 3}"')
+        self.assertEqual(self.client.get(self.url).get_json()["name"], "any")
+
+    def test_delete_if_match(self):
+        """It should only delete a Wishlist that still has the If-Match ETag"""
+        resp = self.client.delete(self.url, headers={"If-Match": f'"{self.version + 1}"'})
+        self.assertEqual(resp.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        resp = self.client.delete(self.url, headers={"If-Match": f'"{self.version}"'})
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        resp = self.client.delete(self.url, headers={"If-Match": "*"})
+        self.assertEqual(resp.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(self.client.delete(self.url).status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_version_conflict(self):
+        """It should not overwrite a Wishlist that changed after it was read"""
+        wishlist = Wishlist.find(self.wishlist.id)
+        db.session.expunge(wishlist)
+        db.session.execute(update(Wishlist).where(Wishlist.id == wishlist.id).values(version=Wishlist.version + 1))
+        db.session.commit()
+        db.session.add(wishlist)
+        wishlist.name = "lost update"
+        self.assertRaises(VersionConflictError, wishlist.update)
+        wishlist = Wishlist.find(self.wishlist.id)
+        self.assertEqual((wishlist.name, wishlist.version), (self.wishlist.name, self.version + 1))
+
+        with patch.object(Wishlist, "update", side_effect=VersionConflictError("changed meanwhile")):
+            resp = self.client.put(self.url, json=self.body)
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(resp.get_json()["error"], "Conflict")
@@ -0,0 +1,122 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Wishlist export
+"""
+
+import csv
+import io
+import json
+from datetime import date, timedelta
+from wsgi import app
+from service.common import status
+from service.common.export import CSV_COLUMNS, chunked
+from service.models import Wishlist, db
+from .factories import WishlistFactory, WishlistItemFactory
+from .test_base import TestBase
+
+EXPORT_URL = "/api/wishlists/export"
+
+
+######################################################################
+#  E X P O R T   T E S T   C A S E S
+######################################################################
+class TestExport(TestBase):
+    """Wishlist Export Test Cases"""
+
+    def setUp(self):
+        """Creates a Wishlist with three items and one without any"""
+        super().setUp()
+        self.full = WishlistFactory(customer_id="alice")
+        self.full.items = [
+            WishlistItemFactory(added_date=date(2024, 1, day), modified_date=date(2024, 1, day)) for day in (3, 1, 2)
+        ]
+        self.full.create()
+        self.empty = WishlistFactory(customer_id="bob")
+        self.empty.create()
+
+    def export(self, query=""):
+        """Returns the body of an export"""
+        resp = self.client.get(f"{EXPORT_URL}{query}")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.is_streamed)
+        return resp.get_data(as_text=True)
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_export_ndjson(self):
+        """It should export one Wishlist with its items per line"""
+        resp = self.client.get(EXPORT_URL)
+        self.assertEqual(resp.headers["Content-Type"], "application/x-ndjson")
+        self.assertIn("wishlists.ndjson", resp.headers["Content-Disposition"])
+        lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+        self.assertEqual([line["id"] for line in lines], sorted([self.full.id, self.empty.id]))
+        exported = next(line for line in lines if line["id"] == self.full.id)
+        self.assertEqual([item["added_date"][:10] for item in exported["items"]], ["2024-01-01", "2024-01-02", "2024-01-03"])
+        expected = self.client.get(
+            f"/api/wishlists/{self.full.id}?fields={','.join(Wishlist.DEFAULT_FIELDS)}&include=items&compact=1"
+        ).get_json()
+        expected["items"].sort(key=lambda item: item["added_date"])
+        self.assertEqual(exported, expected)
+
+    def test_export_csv(self):
+        """It should export one row per item, and one per Wishlist without items"""
+        rows = list(csv.DictReader(io.StringIO(self.export("?format=csv"))))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(tuple(rows[0]), CSV_COLUMNS)
+        empty = [row for row in rows if row["wishlist_id"] == self.empty.id]
+        self.assertEqual(len(empty), 1)
+        self.assertEqual((empty[0]["item_id"], empty[0]["price"]), ("", ""))
+        item = self.full.items[0]
+        row = next(row for row in rows if row["item_id"] == item.id)
+        self.assertEqual((row["customer_id"], row["product_id"]), ("alice", item.product_id))
+        self.assertEqual((float(row["price"]), row["added_date"]), (item.price, item.added_date.isoformat()))
+
+    def test_export_filters(self):
+        """It should only export the Wishlists of a customer, or modified since a date"""
+        lines = self.export("?customer_id=bob").splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], [self.empty.id])
+        tomorrow = date.today() + timedelta(days=1)
+        self.assertEqual(self.export(f"?modified_since={tomorrow}"), "")
+
+        self.full.items[0].modified_date = tomorrow
+        self.full.items[0].update()
+        lines = self.export(f"?modified_since={tomorrow}").splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], [self.full.id])
+        resp = self.client.get(f"{EXPORT_URL}?format=xml")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_in_batches(self):
+        """It should keep the items of a Wishlist together across the batches of the cursor"""
+        exported = list(Wishlist.export(batch_size=2))
+        self.assertEqual(len(exported), 2)
+        self.assertEqual(sum(len(wishlist["items"]) for wishlist in exported), 3)
+        db.session.query(Wishlist).delete()
+        self.assertEqual(list(Wishlist.export()), [])
+
+    def test_export_in_chunks(self):
+        """It should stream the export in chunks of about EXPORT_CHUNK_BYTES"""
+        app.config["EXPORT_CHUNK_BYTES"] = 1
+        try:
+            resp = self.client.get(EXPORT_URL, buffered=False)
+            chunks = list(resp.response)
+        finally:
+            app.config["EXPORT_CHUNK_BYTES"] = 64 * 1024
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(list(chunked([b"a", b"b", b"c"], 2)), [b"ab", b"c"])
@@ -0,0 +1,147 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Fast JSON Encoding
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask_restx import fields, marshal
+from wsgi import app
+from service.common import fast_json, status
+from service.common.fast_json import Encoded, ModelEncoder
+from service.models import Wishlist, db
+from service.routes import item_model, wishlist_fields_model, wishlist_model
+from .factories import WishlistFactory, WishlistItemFactory
+from .test_base import TestBase
+
+BASE_URL = "/api/wishlists"
+
+CHILD = {"name": fields.String, "born": fields.Date}
+EVERY_FIELD = {
+    "text": fields.String,
+    "count": fields.Integer,
+    "ratio": fields.Float,
+    "day": fields.Date,
+    "moment": fields.DateTime,
+    "rfc": fields.DateTime(dt_format="rfc822"),
+    "flag": fields.Boolean,
+    "fallback": fields.Integer(default=7),
+    "child": fields.Nested(CHILD),
+    "maybe": fields.Nested(CHILD, allow_null=True),
+    "children": fields.List(fields.Nested(CHILD)),
+    "tags": fields.List(fields.String),
+    "renamed": fields.String(attribute="text"),
+}
+
+
+######################################################################
+#  F A S T   J S O N   T E S T   C A S E S
+######################################################################
+class TestFastJson(TestBase):
+    """Fast JSON Encoding Test Cases"""
+
+    def assert_same_json(self, model, data, mask=None):
+        """Checks that a ModelEncoder gives the bytes of marshal() and the json module"""
+        encoder = ModelEncoder(model).masked(mask)
+        expected = json.dumps(marshal(data, model, mask=mask))
+        if isinstance(data, list):
+            self.assertEqual(encoder.encode_list(data).decode(), expected)
+        else:
+            self.assertEqual(encoder.encode(data).decode(), expected)
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_every_field(self):
+        """It should encode every kind of field like marshal()"""
+        full = {
+            "text": "café \"quoted\"\n",
+            "count": Decimal("3"),
+            "ratio": Decimal("12.34"),
+            "day": datetime(2024, 1, 2, 3, 4, 5),
+            "moment": date(2024, 1, 2),
+            "rfc": datetime(2024, 1, 2, 3, 4, 5),
+            "flag": 1,
+            "child": {"name": 5, "born": "2020-02-29"},
+            "maybe": None,
+            "children": [{"name": "a", "born": date(2020, 1, 1)}, None],
+            "tags": ["x", 1],
+        }
+        self.assert_same_json(EVERY_FIELD, full)
+        self.assert_same_json(EVERY_FIELD, {})
+        self.assert_same_json(EVERY_FIELD, dict(full, ratio=float("inf"), moment="2024-01-02T03:04:05", children=[]))
+        self.assert_same_json(EVERY_FIELD, dict(full, children={"name": "only"}, day="2024-01-02"))
+        self.assert_same_json(EVERY_FIELD, [full, {}], mask="{text,children{born}}")
+        self.assert_same_json(EVERY_FIELD, [])
+
+    def test_orm_objects(self):
+        """It should encode ORM objects and rows like their serialized dicts"""
+        wishlist = WishlistFactory()
+        wishlist.items = WishlistItemFactory.create_batch(3)
+        wishlist.create()
+        self.assert_same_json(wishlist_model, wishlist)
+        self.assertEqual(
+            ModelEncoder(wishlist_model).encode(wishlist).decode(),
+            json.dumps(marshal(wishlist.serialize(), wishlist_model)),
+        )
+        self.assert_same_json(item_model, wishlist.items)
+        mask = "{name,total_value,items{id,price}}"
+        self.assert_same_json(wishlist_fields_model, [wishlist], mask)
+        row = db.session.query(Wishlist.id, Wishlist.name, Wishlist.created_date).one()
+        self.assert_same_json(wishlist_fields_model, row, "{id,name,created_date}")
+
+    def test_masks_are_kept(self):
+        """It should compile each mask once and forget them past MAX_MASKS"""
+        encoder = ModelEncoder(item_model)
+        self.assertIs(encoder.masked(None), encoder)
+        self.assertIs(encoder.masked("{id}"), encoder.masked("{id}"))
+        for index in range(1, fast_json.MAX_MASKS + 1):
+            encoder.masked("{id" + ",id" * index + "}")
+        self.assertEqual(len(encoder._masked), 1)  # pylint: disable=protected-access
+
+    def test_responses_are_unchanged(self):
+        """It should send the bytes flask-restx sent before"""
+        wishlist = WishlistFactory()
+        wishlist.items = WishlistItemFactory.create_batch(2)
+        wishlist.create()
+        expected = json.dumps(marshal(wishlist.serialize(), wishlist_model)) + "\n"
+        resp = self.client.get(f"{BASE_URL}/{wishlist.id}")
+        self.assertEqual(resp.get_data(as_text=True), expected)
+        self.assertEqual(resp.headers["Content-Type"], "application/json")
+
+        item = wishlist.items[0]
+        resp = self.client.get(f"{BASE_URL}/{wishlist.id}/items/{item.id}", headers={"X-Fields": "id,price"})
+        self.assertEqual(resp.get_json(), {"id": item.id, "price": item.price})
+
+    def test_customized_json(self):
+        """It should indent the encoded responses when RESTX_JSON asks for it"""
+        wishlist = WishlistFactory()
+        wishlist.create()
+        app.config["RESTX_JSON"] = {"indent": 2}
+        try:
+            resp = self.client.get(f"{BASE_URL}/{wishlist.id}")
+        finally:
+            app.config.pop("RESTX_JSON")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        expected = json.dumps(marshal(wishlist.serialize(), wishlist_model), indent=2) + "\n"
+        self.assertEqual(resp.get_data(as_text=True), expected)
+        with app.test_request_context():
+            response = fast_json.output_json(Encoded(b"[]"), status.HTTP_200_OK, {"X-Test": "1"})
+        self.assertEqual((response.get_data(), response.headers["X-Test"]), (b"[]\n", "1"))
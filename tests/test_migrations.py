@@ -0,0 +1,201 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Schema Migrations
+"""
+
+from unittest.mock import patch
+from sqlalchemy import BigInteger, inspect, text
+from service.common import migrations
+from service.models import Wishlist, WishlistItem, db
+from .factories import WishlistFactory, WishlistItemFactory
+from .test_base import TestBase
+
+INDEXES = {
+    "wishlist": {
+        "ix_wishlist_customer_id",
+        "ix_wishlist_name",
+        "ix_wishlist_created_date_id",
+        "ix_wishlist_customer_id_created_date_id",
+    },
+    "wishlist_item": {"ix_wishlist_item_wishlist_id_price", "ix_wishlist_item_wishlist_id_added_date"},
+}
+
+
+######################################################################
+#  M I G R A T I O N   T E S T   C A S E S
+######################################################################
+class TestMigrations(TestBase):
+    """Schema Migration Test Cases"""
+
+    def setUp(self):
+        """Forgets the applied migrations"""
+        super().setUp()
+        db.session.remove()
+        with db.engine.begin() as connection:
+            migrations.schema_version.drop(connection, checkfirst=True)
+
+    def index_names(self, table) -> set:
+        """Returns the names of the indexes of a table"""
+        return {index["name"] for index in inspect(db.engine).get_indexes(table)}
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_models_declare_indexes(self):
+        """It should declare the lookup indexes on the models"""
+        for table, names in INDEXES.items():
+            declared = {index.name for index in db.metadata.tables[table].indexes}
+            self.assertTrue(names <= declared)
+
+    def test_migrate_builds_missing_indexes(self):
+        """It should build the indexes of a database created before they existed"""
+        with db.engine.begin() as connection:
+            for names in INDEXES.values():
+                for name in names:
+                    connection.execute(text(f"DROP INDEX {name}"))
+        applied = migrations.migrate(db.engine)
+        self.assertIn(1, [migration.version for migration in applied])
+        for table, names in INDEXES.items():
+            self.assertTrue(names <= self.index_names(table))
+
+    def test_migrate_page_indexes(self):
+        """It should index the order of the pages of wishlists concurrently"""
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_wishlist_created_date_id"))
+            connection.execute(text("DROP INDEX ix_wishlist_customer_id_created_date_id"))
+        applied = {migration.version: migration for migration in migrations.migrate(db.engine)}
+        self.assertTrue(applied[7].concurrent)
+        columns = {index["name"]: index["column_names"] for index in inspect(db.engine).get_indexes("wishlist")}
+        self.assertEqual(columns["ix_wishlist_created_date_id"], ["created_date", "id"])
+        self.assertEqual(columns["ix_wishlist_customer_id_created_date_id"], ["customer_id", "created_date", "id"])
+
+    def test_migrate_is_idempotent(self):
+        """It should apply each migration once and be safe to run again"""
+        applied = migrations.migrate(db.engine)
+        self.assertEqual(
+            [migration.version for migration in applied],
+            [migration.version for migration in migrations.MIGRATIONS],
+        )
+        self.assertEqual(migrations.migrate(db.engine), [])
+        self.assertEqual(migrations.pending_migrations(db.engine), [])
+        self.assertEqual(
+            migrations.applied_versions(db.engine),
+            {migration.version for migration in migrations.MIGRATIONS},
+        )
+
+    def test_migrate_to_target(self):
+        """It should stop at the target version"""
+        self.assertEqual(migrations.migrate(db.engine, target=0), [])
+        self.assertEqual(migrations.applied_versions(db.engine), set())
+
+    def test_failed_migration_is_not_recorded(self):
+        """It should not record a migration that failed"""
+        failing = migrations.Migration(1000, "Fails", lambda connection: connection.execute(text("BOGUS")))
+        with patch.object(migrations, "MIGRATIONS", [failing]):
+            self.assertRaises(Exception, migrations.migrate, db.engine)
+        self.assertNotIn(1000, migrations.applied_versions(db.engine))
+
+    def test_migrations_are_ordered(self):
+        """It should refuse to register a migration out of order"""
+        with patch.object(migrations, "MIGRATIONS", list(migrations.MIGRATIONS)):
+            register = migrations.migration(1, "Duplicate")
+            self.assertRaises(ValueError, register, lambda connection: None)
+
+    def test_migrate_text_keys_to_uuids(self):
+        """It should convert the text keys of existing rows into UUIDs"""
+        if db.engine.dialect.name != "sqlite":
+            self.skipTest("Postgres converts the column types instead")
+        wishlist_id = "8f6b2d4e-0c1a-4f7b-9a3e-5d2c1b0a9f8e"
+        item_id = "1a2b3c4d-5e6f-4a7b-8c9d-0e1f2a3b4c5d"
+        with db.engine.begin() as connection:
+            connection.execute(
+                text(
+                    "INSERT INTO wishlist (id, customer_id, name, created_date, modified_date) "
+                    "VALUES (:id, 'customer', 'legacy', '2024-01-01', '2024-01-01')"
+                ),
+                {"id": wishlist_id},
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO wishlist_item (id, wishlist_id, product_id, price_cents, added_date, modified_date) "
+                    "VALUES (:id, :wishlist_id, 'product', 150, '2024-01-01', '2024-01-01')"
+                ),
+                {"id": item_id, "wishlist_id": wishlist_id},
+            )
+        applied = migrations.migrate(db.engine, target=2)
+        self.assertEqual([migration.version for migration in applied], [1, 2])
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("SELECT typeof(id) FROM wishlist")).scalar(), "blob")
+        wishlist = Wishlist.find(wishlist_id)
+        self.assertEqual(wishlist.id, wishlist_id)
+        self.assertEqual([item.id for item in wishlist.items], [item_id])
+
+    def test_migrate_prices_to_cents(self):
+        """It should convert the Numeric prices of existing items into cents"""
+        wishlist = WishlistFactory()
+        wishlist.items = [WishlistItemFactory(wishlist=wishlist, price=price) for price in (12.34, 0.1)]
+        wishlist.create()
+        db.session.remove()
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_wishlist_item_wishlist_id_price"))
+            connection.execute(text("ALTER TABLE wishlist_item ADD COLUMN price NUMERIC(10, 2)"))
+            connection.execute(text("UPDATE wishlist_item SET price = price_cents / 100.0"))
+            connection.execute(text("ALTER TABLE wishlist_item DROP COLUMN price_cents"))
+        migrations.migrate(db.engine, target=3)
+        self.assertNotIn("ix_wishlist_item_wishlist_id_price", self.index_names("wishlist_item"))
+        self.assertEqual(sorted(item.price_cents for item in WishlistItem.all()), [10, 1234])
+        with db.engine.connect() as connection:
+            self.assertIsInstance(migrations.column_type(connection, "wishlist_item", "price_cents"), BigInteger)
+        self.assertEqual(migrations.migrate(db.engine, target=3), [])
+        # The index is built again outside of the transaction of migration 3
+        applied = migrations.migrate(db.engine, target=6)
+        self.assertTrue(applied[-1].concurrent)
+        self.assertIn("ix_wishlist_item_wishlist_id_price", self.index_names("wishlist_item"))
+        index = next(
+            index for index in inspect(db.engine).get_indexes("wishlist_item")
+            if index["name"] == "ix_wishlist_item_wishlist_id_price"
+        )
+        self.assertEqual(index["column_names"], ["wishlist_id", "price_cents"])
+
+    def test_migrate_wishlist_totals(self):
+        """It should add the item totals to existing wishlists and fill them"""
+        wishlist = WishlistFactory()
+        wishlist.items = [WishlistItemFactory(wishlist=wishlist, price=price) for price in (1, 2.5)]
+        wishlist.create()
+        wishlist_id = wishlist.id
+        db.session.remove()
+        with db.engine.begin() as connection:
+            for column in ("item_count", "total_value_cents", "last_item_added"):
+                connection.execute(text(f"ALTER TABLE wishlist DROP COLUMN {column}"))
+        migrations.migrate(db.engine, target=4)
+        wishlist = Wishlist.find(wishlist_id)
+        self.assertEqual((wishlist.item_count, wishlist.total_value_cents), (2, 350))
+        self.assertEqual(wishlist.last_item_added, max(item.added_date for item in wishlist.items))
+
+    def test_migrate_wishlist_version(self):
+        """It should add the version of existing wishlists"""
+        wishlist = WishlistFactory()
+        wishlist.create()
+        wishlist_id = wishlist.id
+        db.session.remove()
+        with db.engine.begin() as connection:
+            connection.execute(text("ALTER TABLE wishlist DROP COLUMN version"))
+        migrations.migrate(db.engine, target=5)
+        self.assertEqual(Wishlist.find_version(wishlist_id), 1)
+        self.assertEqual(migrations.migrate(db.engine, target=5), [])
@@ -0,0 +1,107 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the connection pool metrics
+"""
+
+from unittest import TestCase
+from flask import Flask
+from sqlalchemy import create_engine, exc, text
+from service.common import status
+from service.common.pool_metrics import (
+    PoolMetrics,
+    InstrumentedQueuePool,
+    engines,
+    init_pool_metrics,
+    instrument_engine,
+    metrics,
+)
+from .test_base import TestBase
+
+
+######################################################################
+#  P O O L   M E T R I C S   T E S T   C A S E S
+######################################################################
+class TestPoolMetrics(TestCase):
+    """Pool Metrics Test Cases"""
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_counters(self):
+        """It should count checkouts, connects and wait time"""
+        engine = create_engine("sqlite://", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0)
+        counters = instrument_engine(engine, "test")
+        self.addCleanup(engines.pop, "test")
+        for _ in range(2):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        stats = counters.snapshot(engine.pool)
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["checkins"], 2)
+        self.assertEqual(stats["connects"], 1)
+        self.assertEqual(stats["pool_size"], 1)
+        self.assertEqual(stats["checked_out"], 0)
+        self.assertGreater(stats["wait_seconds_total"], 0)
+        self.assertEqual(metrics.snapshot()["checkouts"], 0)
+
+        engine.dispose()
+        with engine.connect():
+            self.assertEqual(counters.snapshot(engine.pool)["checked_out"], 1)
+        self.assertEqual(counters.snapshot()["checkouts"], 3)
+        self.assertGreater(counters.snapshot()["wait_seconds_total"], stats["wait_seconds_total"])
+
+    def test_timeout(self):
+        """It should count the checkouts that timed out"""
+        engine = create_engine(
+            "sqlite://", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.01
+        )
+        with engine.connect():
+            self.assertRaises(exc.TimeoutError, engine.connect)
+        self.assertEqual(metrics.snapshot()["timeouts"], 1)
+
+    def test_snapshot_without_pool(self):
+        """It should report the counters of an idle process"""
+        stats = PoolMetrics().snapshot()
+        self.assertEqual(stats["checkouts"], 0)
+        self.assertEqual(stats["wait_seconds_avg"], 0.0)
+        self.assertNotIn("overflow", stats)
+
+    def test_init_pool_metrics(self):
+        """It should only instrument queue pools"""
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_size": 2}
+        init_pool_metrics(app)
+        self.assertIs(app.config["SQLALCHEMY_ENGINE_OPTIONS"]["poolclass"], InstrumentedQueuePool)
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {}
+        init_pool_metrics(app)
+        self.assertNotIn("poolclass", app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+
+
+class TestPoolHealth(TestBase):
+    """Pool statistics route Test Cases"""
+
+    def test_pool_health(self):
+        """It should report the pool statistics of the worker"""
+        self.client.get("/api/wishlists")
+        resp = self.client.get("/health/pool")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.get_json()
+        self.assertIn("pid", data)
+        self.assertIn("wait_seconds_max", data)
+        self.assertGreater(data["checkouts"], 0)
+        self.assertEqual(data["replicas"], {})
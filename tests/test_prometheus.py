@@ -0,0 +1,113 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Prometheus Metrics
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+from prometheus_client.parser import text_string_to_metric_families
+from service.common import pool_metrics, prometheus, status
+from .factories import WishlistFactory
+from .test_base import TestBase
+
+BASE_URL = "/api/wishlists"
+# Sends requests from a process of its own, as a gunicorn worker would
+WORKER = """
+from wsgi import app
+client = app.test_client()
+for _ in range(3):
+    assert client.get("/health").status_code == 200
+"""
+
+
+######################################################################
+#  P R O M E T H E U S   T E S T   C A S E S
+######################################################################
+class TestPrometheus(TestBase):
+    """Prometheus Metrics Test Cases"""
+
+    def scrape(self) -> dict:
+        """Returns the samples of /metrics by name and labels"""
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.content_type.startswith("text/plain"))
+        return {
+            (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+            for family in text_string_to_metric_families(resp.get_data(as_text=True))
+            for sample in family.samples
+        }
+
+    @staticmethod
+    def value(samples, name, **labels) -> float:
+        """Returns the value of a sample, 0 when it is missing"""
+        return samples.get((name, tuple(sorted(labels.items()))), 0.0)
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_requests_by_route(self):
+        """It should count the requests and their latency by route template and status"""
+        self.cache_responses()
+        wishlist = WishlistFactory()
+        wishlist.create()
+        route = {"method": "GET", "route": "/api/wishlists/<wishlist_id>"}
+        before = self.scrape()
+        self.client.get(f"{BASE_URL}/{wishlist.id}")
+        self.client.get(f"{BASE_URL}/{wishlist.id}")
+        self.client.get(f"{BASE_URL}/missing")
+        self.client.get("/no/such/page")
+        after = self.scrape()
+
+        def grew(name, **labels):
+            return self.value(after, name, **labels) - self.value(before, name, **labels)
+
+        self.assertEqual(grew("http_requests_total", status="200", **route), 2)
+        self.assertEqual(grew("http_requests_total", status="404", **route), 1)
+        self.assertEqual(grew("http_request_duration_seconds_count", status="200", **route), 2)
+        self.assertEqual(grew("http_requests_total", method="GET", route="<unmatched>", status="404"), 1)
+        self.assertEqual(self.value(after, "http_requests_in_flight", **route), 0)
+        self.assertEqual(grew("http_requests_total", method="GET", route="/metrics", status="200"), 0)
+        self.assertGreater(grew("db_query_duration_seconds_count", route="/api/wishlists/<wishlist_id>"), 0)
+        self.assertEqual(grew("response_cache_events_total", event="hits"), 1)
+
+    def test_pool_statistics(self):
+        """It should count the pool activity of the process, even after the counters were reset"""
+        primary = {"engine": pool_metrics.PRIMARY, "event": "timeouts"}
+        timeouts = self.value(self.scrape(), "db_pool_events_total", **primary)
+        pool_metrics.metrics.increment("timeouts")
+        self.assertEqual(self.value(self.scrape(), "db_pool_events_total", **primary), timeouts + 1)
+        pool_metrics.metrics.reset()
+        pool_metrics.metrics.increment("timeouts")
+        samples = self.scrape()
+        self.assertEqual(self.value(samples, "db_pool_events_total", **primary), timeouts + 2)
+        self.assertIn(("db_pool_wait_seconds_total", (("engine", pool_metrics.PRIMARY),)), samples)
+        self.assertEqual(prometheus.route_label(), prometheus.NO_REQUEST)
+
+    def test_workers_add_up(self):
+        """It should add up the metrics that every worker process wrote"""
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory)
+            for _ in range(2):
+                subprocess.run([sys.executable, "-c", WORKER], env=env, check=True, timeout=60)
+            with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": directory}):
+                samples = self.scrape()
+        self.assertEqual(self.value(samples, "http_requests_total", method="GET", route="/health", status="200"), 6)
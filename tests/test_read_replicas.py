@@ -0,0 +1,145 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the read replica routing
+"""
+
+import os
+import tempfile
+import time
+from unittest.mock import patch
+from sqlalchemy.orm import Session
+from wsgi import app
+from service.common import pool_metrics, status
+from service.common.response_cache import cache
+from service.common.read_replicas import STICKY_COOKIE, create_replica_engines
+from service.models import db
+from .factories import WishlistFactory
+from .test_base import TestBase
+
+BASE_URL = "/api/wishlists"
+
+
+######################################################################
+#  R E A D   R E P L I C A   T E S T   C A S E S
+######################################################################
+class TestReadReplicas(TestBase):
+    """Read Replica Test Cases"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Creates a replica database that holds different data than the primary"""
+        super().setUpClass()
+        handle, cls.replica_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        cls.replica = create_replica_engines([f"sqlite:///{cls.replica_path}"], {})[0]
+        db.metadata.create_all(cls.replica)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drops the replica database"""
+        super().tearDownClass()
+        cls.replica.dispose()
+        pool_metrics.engines.pop("replica-1")
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        """Routes the reads to the replica, which holds one Wishlist"""
+        super().setUp()
+        with Session(self.replica) as session:
+            session.query(db.metadata.tables["wishlist"]).delete()
+            self.replica_wishlist = WishlistFactory(name="replica")
+            session.add(self.replica_wishlist)
+            session.commit()
+            self.replica_id = self.replica_wishlist.id
+        self.saved_replicas = app.extensions["read_replicas"]
+        app.extensions["read_replicas"] = [self.replica]
+
+    def tearDown(self):
+        """Restores the replicas of the app"""
+        app.extensions["read_replicas"] = self.saved_replicas
+        super().tearDown()
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_get_reads_from_replica(self):
+        """It should serve a GET from the replica"""
+        resp = self.client.get(f"{BASE_URL}/{self.replica_id}")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.get_json()["name"], "replica")
+
+        resp = self.client.get(BASE_URL)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([wishlist["id"] for wishlist in resp.get_json()], [self.replica_id])
+
+    def test_do_not_cache_replica_reads(self):
+        """It should not cache a response read from a replica, which can be behind"""
+        self.cache_responses()
+        for url in (f"{BASE_URL}/{self.replica_id}", f"{BASE_URL}/{self.replica_id}/items"):
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertIn("ETag", resp.headers)
+        self.assertEqual(cache.snapshot()["entries"], 0)
+
+    def test_replica_pool_metrics(self):
+        """It should count the pool of each replica apart from the pool of the primary"""
+        pool = self.client.get("/health/pool").get_json()
+        resp = self.client.get(f"{BASE_URL}/{self.replica_id}")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        after = self.client.get("/health/pool").get_json()
+        self.assertEqual(list(after["replicas"]), ["replica-1"])
+        self.assertGreater(after["replicas"]["replica-1"]["checkouts"], pool["replicas"]["replica-1"]["checkouts"])
+        self.assertEqual(after["checkouts"], pool["checkouts"])
+        scrape = self.client.get("/metrics").get_data(as_text=True)
+        self.assertIn('db_pool_events_total{engine="replica-1",event="checkouts"}', scrape)
+
+    def test_write_goes_to_primary(self):
+        """It should write to the primary and not to the replica"""
+        resp = self.client.post(BASE_URL, json=WishlistFactory().serialize())
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(db.session.execute(db.text("SELECT count(*) FROM wishlist")).scalar(), 1)
+        with self.replica.connect() as connection:
+            self.assertEqual(connection.execute(db.text("SELECT count(*) FROM wishlist")).scalar(), 1)
+
+    def test_read_your_writes(self):
+        """It should read from the primary right after a write"""
+        resp = self.client.post(BASE_URL, json=WishlistFactory().serialize())
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertIn(STICKY_COOKIE, resp.headers["Set-Cookie"])
+        new_id = resp.get_json()["id"]
+
+        resp = self.client.get(f"{BASE_URL}/{new_id}")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_sticky_window_expires(self):
+        """It should go back to the replica once the sticky window is over"""
+        resp = self.client.post(BASE_URL, json=WishlistFactory().serialize())
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        new_id = resp.get_json()["id"]
+
+        later = time.time() + app.config["DATABASE_STICKY_SECONDS"] + 1
+        with patch("service.common.read_replicas.time.time", return_value=later):
+            resp = self.client.get(f"{BASE_URL}/{new_id}")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_failed_write_does_not_stick(self):
+        """It should not keep a client on the primary after a failed write"""
+        resp = self.client.post(BASE_URL, json={"name": "missing fields"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn("Set-Cookie", resp.headers)
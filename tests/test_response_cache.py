@@ -0,0 +1,265 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Response Cache
+"""
+
+from unittest import TestCase
+from unittest.mock import patch
+from wsgi import app
+from service.common import status
+from service.common.response_cache import ResponseCache, cache, init_response_cache
+from service.models import Wishlist, WishlistItem, db
+from .factories import WishlistFactory, WishlistItemFactory
+from .test_base import TestBase
+
+BASE_URL = "/api/wishlists"
+HEADERS = [("Content-Type", "application/json")]
+HEADER_BYTES = len("Content-Type") + len("application/json")
+
+
+######################################################################
+#  R E S P O N S E   C A C H E   T E S T   C A S E S
+######################################################################
+class TestResponseCache(TestCase):
+    """Response Cache Test Cases"""
+
+    def test_get_what_was_put(self):
+        """It should return the cached body and headers"""
+        responses = ResponseCache()
+        self.assertIsNone(responses.get("a", "/a"))
+        self.assertTrue(responses.put("a", "/a", b"body", HEADERS, responses.generation()))
+        cached = responses.get("a", "/a")
+        self.assertEqual((cached.body, cached.headers), (b"body", HEADERS))
+        self.assertIsNone(responses.get("a", "/a?fields=id"))
+        stats = responses.snapshot()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertEqual((stats["entries"], stats["bytes"]), (1, 4 + HEADER_BYTES))
+
+    def test_evict_least_recently_used(self):
+        """It should evict the least recently used responses to stay under the size cap"""
+        responses = ResponseCache(max_bytes=3 * (10 + HEADER_BYTES))
+        for key in "abc":
+            responses.put(key, "/", b"x" * 10, HEADERS, responses.generation())
+        responses.get("a", "/")
+        responses.put("d", "/", b"x" * 10, HEADERS, responses.generation())
+        self.assertIsNone(responses.get("b", "/"))
+        for key in "acd":
+            self.assertIsNotNone(responses.get(key, "/"))
+        self.assertEqual(responses.snapshot()["evictions"], 1)
+
+        self.assertFalse(responses.put("e", "/", b"x" * 1000, HEADERS, responses.generation()))
+        responses.configure(30, 10 + HEADER_BYTES)
+        self.assertEqual(responses.snapshot()["entries"], 1)
+
+    def test_expire_after_ttl(self):
+        """It should not return a response older than the TTL"""
+        responses = ResponseCache(ttl=5)
+        with patch("service.common.response_cache.time.monotonic", return_value=100.0):
+            responses.put("a", "/", b"body", HEADERS, responses.generation())
+        with patch("service.common.response_cache.time.monotonic", return_value=104.0):
+            self.assertIsNotNone(responses.get("a", "/"))
+        with patch("service.common.response_cache.time.monotonic", return_value=105.0):
+            self.assertIsNone(responses.get("a", "/"))
+        stats = responses.snapshot()
+        self.assertEqual((stats["expirations"], stats["entries"], stats["bytes"]), (1, 0, 0))
+
+    def test_invalidate(self):
+        """It should drop every response of the changed Wishlists only"""
+        responses = ResponseCache()
+        for variant in ("/a", "/a/items"):
+            responses.put("a", variant, b"body", HEADERS, responses.generation())
+        responses.put("b", "/b", b"body", HEADERS, responses.generation())
+        self.assertEqual(responses.invalidate(["a", "c"]), 2)
+        self.assertIsNone(responses.get("a", "/a"))
+        self.assertIsNotNone(responses.get("b", "/b"))
+        self.assertEqual(responses.snapshot()["invalidations"], 2)
+
+    def test_refuse_response_older_than_a_change(self):
+        """It should not cache a response built before a Wishlist changed"""
+        responses = ResponseCache()
+        generation = responses.generation()
+        responses.invalidate(["a"])
+        self.assertFalse(responses.put("a", "/a", b"old", HEADERS, generation))
+        self.assertIsNone(responses.get("a", "/a"))
+
+    def test_disabled(self):
+        """It should cache nothing when the TTL is 0"""
+        responses = ResponseCache(ttl=0)
+        self.assertFalse(responses.put("a", "/a", b"body", HEADERS, responses.generation()))
+        self.assertIsNone(responses.get("a", "/a"))
+        self.assertFalse(responses.snapshot()["enabled"])
+
+
+######################################################################
+#  C A C H E D   R O U T E S   T E S T   C A S E S
+######################################################################
+class TestCachedRoutes(TestBase):
+    """Cached Routes Test Cases"""
+
+    def setUp(self):
+        """Creates two Wishlists of one customer"""
+        super().setUp()
+        self.cache_responses()
+        self.wishlist = WishlistFactory()
+        self.wishlist.items = WishlistItemFactory.create_batch(2)
+        self.wishlist.create()
+        self.other = WishlistFactory(customer_id=self.wishlist.customer_id)
+        self.other.create()
+        self.urls = [f"{BASE_URL}/{self.wishlist.id}", f"{BASE_URL}/{self.wishlist.id}/items"]
+
+    def assert_cached(self, url):
+        """Checks that a response is served without any query"""
+        first = self.client.get(url)
+        with self.count_queries() as statements:
+            second = self.client.get(url)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.get_data(), first.get_data())
+        self.assertEqual(second.headers.get("Link"), first.headers.get("Link"))
+        self.assertEqual(statements, [])
+        return second
+
+    def assert_invalidated(self, change):
+        """Checks that a change makes the cached responses of the Wishlist read again"""
+        for url in self.urls:
+            self.assert_cached(url)
+        change()
+        for url in self.urls:
+            with self.count_queries() as statements:
+                self.client.get(url)
+            self.assertNotEqual(statements, [], url)
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_cache_wishlist_and_items(self):
+        """It should serve a Wishlist and its items again without a query"""
+        self.assertEqual(len(self.assert_cached(self.urls[0]).get_json()["items"]), 2)
+        resp = self.assert_cached(f"{self.urls[0]}?fields=name")
+        self.assertEqual(resp.get_json(), {"name": self.wishlist.name})
+        self.assertEqual(len(self.assert_cached(self.urls[1]).get_json()), 2)
+        resp = self.assert_cached(f"{self.urls[1]}?limit=1")
+        self.assertIn('rel="next"', resp.headers["Link"])
+        stats = self.client.get("/health/cache").get_json()
+        self.assertEqual(stats["hits"], 4)
+        self.assertEqual(stats["entries"], 4)
+
+    def test_warn_without_invalidation_bus(self):
+        """It should warn when the cache is on while other workers cannot tell it about changes"""
+        config = {"RESPONSE_CACHE_TTL": 30.0, "CACHE_INVALIDATION_URL": ""}
+        with patch.dict(app.config, config), self.assertLogs(app.logger, "WARNING") as logs:
+            init_response_cache(app)
+        self.assertIn("without CACHE_INVALIDATION_URL", logs.output[0])
+        with patch.dict(app.config, dict(config, CACHE_INVALIDATION_URL="memory://")):
+            with self.assertNoLogs(app.logger, "WARNING"):
+                init_response_cache(app)
+        with patch.dict(app.config, dict(config, RESPONSE_CACHE_TTL=0)):
+            with self.assertNoLogs(app.logger, "WARNING"):
+                init_response_cache(app)
+        self.assertFalse(cache.enabled)
+
+    def test_do_not_cache_errors(self):
+        """It should not cache a Wishlist that was not found"""
+        for _ in range(2):
+            resp = self.client.get(f"{BASE_URL}/{WishlistFactory().id}")
+            self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(cache.snapshot()["entries"], 0)
+
+    def test_update_wishlist_invalidates(self):
+        """It should read a Wishlist again after it is updated"""
+        self.assert_invalidated(
+            lambda: self.client.put(self.urls[0], json={"name": "renamed", "customer_id": self.wishlist.customer_id})
+        )
+        self.assertEqual(self.client.get(self.urls[0]).get_json()["name"], "renamed")
+
+    def test_non_canonical_id_invalidates(self):
+        """It should read a Wishlist again after it is updated, whatever the spelling of its id"""
+        wishlist = WishlistFactory(id="0badc0de-0000-4000-8000-00000000abcd")
+        wishlist.items = [WishlistItemFactory()]
+        wishlist.create()
+        self.urls = [f"{BASE_URL}/{wishlist.id.upper()}", f"{BASE_URL}/{wishlist.id.upper()}/items"]
+        body = {"name": "renamed", "customer_id": wishlist.customer_id}
+        self.assert_invalidated(lambda: self.client.put(f"{BASE_URL}/{wishlist.id}", json=body))
+        self.assertEqual(self.client.get(self.urls[0]).get_json()["name"], "renamed")
+        self.urls = [url.lower() for url in self.urls]
+        self.assert_invalidated(lambda: self.client.put(f"{BASE_URL}/{wishlist.id.upper()}", json=body))
+        item = WishlistItemFactory().serialize()
+        self.assert_invalidated(lambda: self.client.post(f"{BASE_URL}/{wishlist.id.upper()}/items", json=item))
+        self.assertEqual(len(self.client.get(self.urls[1]).get_json()), 2)
+
+    def test_item_changes_invalidate(self):
+        """It should read a Wishlist again after its items change"""
+        item = self.wishlist.items[0]
+        self.assert_invalidated(
+            lambda: self.client.put(f"{self.urls[1]}/{item.id}", json=dict(item.serialize(), description="new"))
+        )
+        self.assert_invalidated(lambda: self.client.post(self.urls[1], json=WishlistItemFactory().serialize()))
+        self.assert_invalidated(lambda: self.client.delete(f"{self.urls[1]}/{item.id}"))
+        self.assertEqual(len(self.client.get(self.urls[1]).get_json()), 2)
+
+    def test_bulk_changes_invalidate(self):
+        """It should read a Wishlist again after the batch and bulk endpoints change it"""
+        self.assert_invalidated(
+            lambda: self.client.post(f"{self.urls[1]}:batch", json=[WishlistItemFactory().serialize()])
+        )
+        self.assert_invalidated(lambda: self.client.delete(self.urls[1]))
+        self.assertEqual(self.client.get(self.urls[1]).get_json(), [])
+        self.assert_invalidated(lambda: self.client.delete(f"{BASE_URL}/customers/{self.wishlist.customer_id}"))
+        self.assertEqual(self.client.get(self.urls[0]).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_move_invalidates_both_wishlists(self):
+        """It should read both Wishlists again after an item moved between them"""
+        item = self.wishlist.items[0]
+        self.urls.append(f"{BASE_URL}/{self.other.id}")
+        self.assert_invalidated(
+            lambda: self.client.put(f"{self.urls[1]}/{item.id}/move-to/{self.other.id}")
+        )
+        self.assertEqual(len(self.client.get(self.urls[2]).get_json()["items"]), 1)
+
+    def test_model_changes_invalidate(self):
+        """It should invalidate on create, update and delete of the models"""
+        wishlist = Wishlist.find(self.wishlist.id)
+
+        def rename():
+            wishlist.name = "renamed"
+            wishlist.update(commit=True)
+
+        self.assert_invalidated(rename)
+        db.session.execute(db.update(Wishlist).where(Wishlist.id == self.wishlist.id).values(item_count=7))
+        db.session.commit()
+        self.assert_invalidated(Wishlist.recount_totals)
+        added = []
+
+        def add_item():
+            added.append(WishlistItemFactory(wishlist=wishlist))
+            added[0].create(commit=True)
+
+        self.assert_invalidated(add_item)
+        self.assert_invalidated(lambda: WishlistItem.find(added[0].id).delete(commit=True))
+        self.assert_invalidated(lambda: Wishlist.find(self.wishlist.id).delete(commit=True))
+
+    def test_rollback_keeps_cache(self):
+        """It should keep the cached responses when a change is rolled back"""
+        for url in self.urls:
+            self.assert_cached(url)
+        wishlist = Wishlist.find(self.wishlist.id)
+        wishlist.name = "renamed"
+        wishlist.update(commit=False)
+        db.session.rollback()
+        db.session.commit()
+        self.assertEqual(cache.snapshot()["entries"], 2)
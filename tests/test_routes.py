@@ -18,10 +18,14 @@ WishlistModel API Service Test Suite
 """
 
 import logging
+import threading
 from datetime import date, datetime
+from unittest.mock import patch
+from wsgi import app
 from service.common import status
+from service.models import Wishlist, WishlistItem, db
 from .factories import WishlistFactory, WishlistItemFactory
-from .test_base import TestBase
+from .test_base import DATABASE_URI, TestBase
 
 BASE_URL = "/api/wishlists"
 
@@ -29,7 +33,7 @@ BASE_URL = "/api/wishlists"
 ######################################################################
 #  T E S T   C A S E S
 ######################################################################
-# pylint: disable=too-many-public-methods
+# pylint: disable=too-many-public-methods, too-many-lines
 class WishlistService(TestBase):
     """REST API Server Tests"""
 
@@ -148,6 +152,131 @@ class WishlistService(TestBase):
         data = resp.get_json()
         self.assertEqual(len(data), 5)
 
+    def test_get_wishlist_list_by_page(self):
+        """It should Get a list of Wishlists one page at a time"""
+        self._create_wishlists(5)
+        resp = self.client.get(BASE_URL, query_string="limit=2")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        first_page = resp.get_json()
+        self.assertEqual(len(first_page), 2)
+        cursor = resp.headers.get("X-Next-Cursor")
+        self.assertIsNotNone(cursor)
+        self.assertIn('rel="next"', resp.headers.get("Link"))
+
+        resp = self.client.get(BASE_URL, query_string=f"limit=2&next={cursor}")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        second_page = resp.get_json()
+        self.assertEqual(len(second_page), 2)
+        cursor = resp.headers.get("X-Next-Cursor")
+
+        resp = self.client.get(BASE_URL, query_string=f"limit=2&next={cursor}")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        last_page = resp.get_json()
+        self.assertEqual(len(last_page), 1)
+        self.assertIsNone(resp.headers.get("X-Next-Cursor"))
+        self.assertIsNone(resp.headers.get("Link"))
+
+        ids = [wishlist["id"] for wishlist in first_page + second_page + last_page]
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_get_wishlist_list_query_count(self):
+        """It should List Wishlists and their items in a fixed number of queries"""
+        for count in (2, 6):
+            for _ in range(count):
+                wishlist = WishlistFactory()
+                wishlist.items = WishlistItemFactory.create_batch(3)
+                wishlist.create()
+            with self.count_queries() as statements:
+                resp = self.client.get(BASE_URL)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertTrue(all(len(wishlist["items"]) == 3 for wishlist in resp.get_json()))
+            # one query for the page of wishlists and one for all of their items
+            self.assertEqual(len(statements), 2)
+
+        wishlist_id = resp.get_json()[0]["id"]
+        with self.count_queries() as statements:
+            resp = self.client.get(f"{BASE_URL}/{wishlist_id}")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(statements), 2)
+
+    def test_get_wishlist_list_default_page_size(self):
+        """It should apply the default page size when no limit is sent"""
+        self._create_wishlists(3)
+        with patch.dict(app.config, {"PAGE_SIZE_DEFAULT": 2}):
+            resp = self.client.get(BASE_URL)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.get_json()), 2)
+        self.assertIsNotNone(resp.headers.get("X-Next-Cursor"))
+
+        with patch.dict(app.config, {"PAGE_SIZE_MAX": 1}):
+            resp = self.client.get(BASE_URL, query_string="limit=50")
+        self.assertEqual(len(resp.get_json()), 1)
+
+    def test_get_wishlist_list_bad_page(self):
+        """It should not Get a list of Wishlists with a bad limit or cursor"""
+        resp = self.client.get(BASE_URL, query_string="limit=0")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.get(BASE_URL, query_string="next=not-a-cursor")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.get(BASE_URL, query_string="next=WzFd")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_wishlists_batch(self):
+        """It should Create many Wishlists and their items in one request"""
+        payload = []
+        for wishlist in WishlistFactory.create_batch(3):
+            data = wishlist.serialize()
+            data["items"] = [item.serialize() for item in WishlistItemFactory.create_batch(2)]
+            payload.append(data)
+
+        with self.count_queries() as statements:
+            resp = self.client.post(f"{BASE_URL}:batch", json=payload)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        # one multi-row INSERT per table
+        self.assertEqual(len([sql for sql in statements if sql.startswith("INSERT")]), 2)
+
+        results = resp.get_json()["results"]
+        self.assertEqual([result["index"] for result in results], [0, 1, 2])
+        self.assertTrue(all(result["status"] == status.HTTP_201_CREATED for result in results))
+        for data, result in zip(payload, results):
+            resp = self.client.get(f"{BASE_URL}/{result['id']}")
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertEqual(resp.get_json()["name"], data["name"])
+            self.assertEqual(len(resp.get_json()["items"]), 2)
+
+    def test_create_wishlists_batch_atomic(self):
+        """It should not Create any Wishlist of a batch with an invalid entry"""
+        payload = [WishlistFactory().serialize() for _ in range(3)]
+        payload[1]["name"] = ""
+        resp = self.client.post(f"{BASE_URL}:batch", json=payload)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        results = resp.get_json()["results"]
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["index"], 1)
+        self.assertIn("Missing name", results[0]["message"])
+        self.assertEqual(len(self.client.get(BASE_URL).get_json()), 0)
+
+    def test_create_wishlists_batch_partial(self):
+        """It should Create the valid Wishlists of a batch when atomic is false"""
+        payload = [WishlistFactory().serialize() for _ in range(3)]
+        payload[1] = "not a wishlist"
+        resp = self.client.post(f"{BASE_URL}:batch?atomic=false", json=payload)
+        self.assertEqual(resp.status_code, status.HTTP_207_MULTI_STATUS)
+        results = resp.get_json()["results"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            [status.HTTP_201_CREATED, status.HTTP_400_BAD_REQUEST, status.HTTP_201_CREATED],
+        )
+        self.assertEqual(len(self.client.get(BASE_URL).get_json()), 2)
+
+    def test_create_wishlists_batch_bad_body(self):
+        """It should not Create Wishlists from a batch that is not a list or too large"""
+        resp = self.client.post(f"{BASE_URL}:batch", json={"name": "wishlist"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        with patch.dict(app.config, {"BATCH_SIZE_MAX": 1}):
+            resp = self.client.post(f"{BASE_URL}:batch", json=[{}, {}])
+        self.assertEqual(resp.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
     def test_update_wishlist(self):
         """It should Update an existing Wishlist"""
         # create a Wishlist to update
@@ -410,6 +539,80 @@ class WishlistService(TestBase):
         )
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_add_item_does_not_load_existing_items(self):
+        """It should Add an item without reading the items already in the wishlist"""
+        wishlist = WishlistFactory()
+        wishlist.items = WishlistItemFactory.create_batch(5)
+        wishlist.create()
+        items_url = f"{BASE_URL}/{wishlist.id}/items"
+
+        with self.count_queries() as statements:
+            resp = self.client.post(items_url, json=WishlistItemFactory().serialize())
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        # only the new row is read back, never the items already in the wishlist
+        reads = [sql for sql in statements if "WHERE wishlist_item.wishlist_id" in sql]
+        self.assertEqual(reads, [])
+        self.assertEqual(len(self.client.get(items_url).get_json()), 6)
+
+    def test_add_item_non_canonical_id(self):
+        """It should Add items under the stored id of a wishlist, whatever the spelling of the URL"""
+        wishlist = WishlistFactory(id="0badc0de-0000-4000-8000-00000000abcd")
+        wishlist.items = [WishlistItemFactory(price=1)]
+        wishlist.create()
+        items_url = f"{BASE_URL}/{wishlist.id.upper()}/items"
+
+        resp = self.client.post(items_url, json=WishlistItemFactory(price=2).serialize())
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.get_json()["wishlist_id"], wishlist.id)
+        self.assertIn(f"/{wishlist.id}/items/", resp.headers["Location"])
+        resp = self.client.post(f"{items_url}:batch", json=[WishlistItemFactory(price=4).serialize()])
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        db.session.expire_all()
+        found = Wishlist.find(wishlist.id)
+        self.assertEqual((found.item_count, found.total_value_cents), (3, 700))
+        self.assertEqual({item.wishlist_id for item in found.items}, {wishlist.id})
+
+    def test_add_items_batch(self):
+        """It should Add many items to a wishlist with one INSERT"""
+        wishlist = WishlistFactory()
+        wishlist.items = WishlistItemFactory.create_batch(2)
+        wishlist.create()
+        items_url = f"{BASE_URL}/{wishlist.id}/items"
+        payload = [item.serialize() for item in WishlistItemFactory.create_batch(3)]
+
+        with self.count_queries() as statements:
+            resp = self.client.post(f"{items_url}:batch", json=payload)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len([sql for sql in statements if sql.startswith("INSERT")]), 1)
+        results = resp.get_json()["results"]
+        self.assertEqual(len(results), 3)
+
+        resp = self.client.get(f"{items_url}/{results[0]['id']}")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.get_json()["product_id"], payload[0]["product_id"])
+        self.assertEqual(len(self.client.get(items_url).get_json()), 5)
+
+    def test_add_items_batch_bad_path(self):
+        """It should not Add a batch of items that is invalid or has no wishlist"""
+        payload = [item.serialize() for item in WishlistItemFactory.create_batch(2)]
+        resp = self.client.post(f"{BASE_URL}/wishlist_not_exist/items:batch", json=payload)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+        wishlist = self._create_wishlists(1)[0]
+        items_url = f"{BASE_URL}/{wishlist.id}/items"
+        payload[0]["product_id"] = ""
+        resp = self.client.post(f"{items_url}:batch", json=payload)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(self.client.get(items_url).get_json()), 0)
+
+        resp = self.client.post(f"{items_url}:batch?atomic=false", json=payload)
+        self.assertEqual(resp.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(len(self.client.get(items_url).get_json()), 1)
+
+        resp = self.client.post(f"{items_url}:batch?atomic=false", json=payload[:1])
+        self.assertEqual(resp.status_code, status.HTTP_207_MULTI_STATUS)
+
     def test_add_item_wishlist_not_exist(self):
         """It cannot find the wishlist that does not exist, and return 404"""
         wishlist_id = "wishlist_not_exist"
@@ -549,6 +752,71 @@ class WishlistService(TestBase):
         )
         self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_move_item_in_one_update(self):
+        """It should Move an item with one UPDATE and without loading either wishlist's items"""
+        source = WishlistFactory()
+        source.items = WishlistItemFactory.create_batch(3)
+        source.create()
+        target = WishlistFactory(customer_id=source.customer_id)
+        target.items = WishlistItemFactory.create_batch(3)
+        target.create()
+        item_id = source.items[0].id
+        move_url = f"{BASE_URL}/{source.id}/items/{item_id}/move-to/{target.id}"
+        source_url = f"{BASE_URL}/{source.id}/items"
+        target_url = f"{BASE_URL}/{target.id}/items"
+
+        with self.count_queries() as statements:
+            resp = self.client.put(move_url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len([sql for sql in statements if sql.startswith("UPDATE wishlist_item")]), 1)
+        self.assertEqual(
+            [sql for sql in statements if sql.startswith("SELECT") and "WHERE wishlist_item.wishlist_id" in sql], []
+        )
+        self.assertEqual(len(self.client.get(source_url).get_json()), 2)
+        self.assertEqual(len(self.client.get(target_url).get_json()), 4)
+        self.assertEqual(Wishlist.find(source.id).item_count, 2)
+        self.assertEqual(Wishlist.find(target.id).item_count, 4)
+
+        # A second move from the same source finds nothing to move
+        resp = self.client.put(move_url)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_concurrent_moves(self):
+        """It should complete two moves between the same Wishlists that run at the same time"""
+        if not DATABASE_URI.startswith("postgresql"):
+            self.skipTest("needs Postgres row locks")
+        source = WishlistFactory()
+        source.items = WishlistItemFactory.create_batch(2)
+        source.create()
+        target = WishlistFactory(customer_id=source.customer_id)
+        target.create()
+        urls = [f"{BASE_URL}/{source.id}/items/{item.id}/move-to/{target.id}" for item in source.items]
+        find_owners = Wishlist.find_owners
+        # Holds each move after its lock, long enough for the other one to try and take it too
+        barrier = threading.Barrier(2, timeout=1)
+
+        def locked_owners(*args, **kwargs):
+            owners = find_owners(*args, **kwargs)
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                pass
+            return owners
+
+        def move(url):
+            codes.append(app.test_client().put(url).status_code)
+
+        codes = []
+        with patch.object(Wishlist, "find_owners", side_effect=locked_owners):
+            threads = [threading.Thread(target=move, args=(url,)) for url in urls]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(codes, [status.HTTP_200_OK] * 2)
+        db.session.expire_all()
+        self.assertEqual((Wishlist.find(source.id).item_count, Wishlist.find(target.id).item_count), (0, 2))
+
     def test_move_item_to_another_wishlist_bad_path(self):
         """It should not Move an item from one wishlist to another"""
         # Create two wishlists
@@ -806,6 +1074,73 @@ class WishlistService(TestBase):
         ]
         self.assertEqual(sorted_dates, expected_sorted_dates)
 
+    def test_filter_wishlist_items_by_price_and_date_range(self):
+        """It should filter wishlist items by a price range and an added_date range"""
+        wishlist = WishlistFactory()
+        wishlist.items = [
+            WishlistItemFactory(price=10, added_date=date(2022, 3, 12)),
+            WishlistItemFactory(price=20, added_date=date(2022, 3, 13)),
+            WishlistItemFactory(price=30, added_date=date(2022, 3, 14)),
+        ]
+        wishlist.create()
+
+        resp = self.client.get(
+            f"{BASE_URL}/{wishlist.id}/items", query_string="min_price=15&price=30"
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["price"] for item in resp.get_json()], [30, 20])
+
+        resp = self.client.get(
+            f"{BASE_URL}/{wishlist.id}/items",
+            query_string="added_from=2022-03-12&added_to=2022-03-13&sort_by=price",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["price"] for item in resp.get_json()], [10, 20])
+
+    def test_list_wishlist_items_by_page(self):
+        """It should list the items of a wishlist one page at a time"""
+        wishlist = WishlistFactory()
+        wishlist.items = [WishlistItemFactory(price=price) for price in (10, 20, 30)]
+        wishlist.create()
+        items_url = f"{BASE_URL}/{wishlist.id}/items"
+
+        with self.count_queries() as statements:
+            resp = self.client.get(items_url, query_string="sort_by=price&limit=2")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["price"] for item in resp.get_json()], [10, 20])
+        # one query to check the wishlist exists and one for the page
+        self.assertEqual(len(statements), 2)
+        link = resp.headers.get("Link")
+        self.assertIn("offset=2", link)
+
+        resp = self.client.get(items_url, query_string="sort_by=price&limit=2&offset=2")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["price"] for item in resp.get_json()], [30])
+        self.assertIsNone(resp.headers.get("Link"))
+
+    def test_list_wishlist_items_unpaged(self):
+        """It should list every item of a wishlist when no limit or offset is sent"""
+        wishlist = WishlistFactory()
+        wishlist.items = WishlistItemFactory.create_batch(3)
+        wishlist.create()
+        items_url = f"{BASE_URL}/{wishlist.id}/items"
+        with patch.dict(app.config, {"PAGE_SIZE_DEFAULT": 2}):
+            resp = self.client.get(items_url)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(resp.get_json()), 3)
+            self.assertIsNone(resp.headers.get("Link"))
+
+            resp = self.client.get(items_url, query_string="offset=0")
+            self.assertEqual(len(resp.get_json()), 2)
+            self.assertIn("offset=2", resp.headers.get("Link"))
+
+    def test_list_wishlist_items_bad_arguments(self):
+        """It should not list the items of a wishlist with bad query arguments"""
+        wishlist = self._create_wishlists(1)[0]
+        for query in ("sort_by=wishlist", "order=up", "price=cheap", "limit=0", "offset=-1"):
+            resp = self.client.get(f"{BASE_URL}/{wishlist.id}/items", query_string=query)
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST, query)
+
     def test_query_wishlists_by_customer_id(self):
         """It should Query Wishlists by Customer ID"""
         customer_id = "12345"
@@ -888,6 +1223,30 @@ class WishlistService(TestBase):
         response = self.client.delete(f"{BASE_URL}/customers/{not_exist_customer_id}")
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_delete_all_wishlists_by_customer_id_in_one_statement(self):
+        """It should delete all wishlists of a customer and their items with one DELETE"""
+        customer_id = "heavy_customer"
+        wishlist_ids = []
+        for _ in range(3):
+            wishlist = WishlistFactory(customer_id=customer_id)
+            wishlist.items = WishlistItemFactory.create_batch(2)
+            wishlist.create()
+            wishlist_ids.append(wishlist.id)
+        other = WishlistFactory()
+        other.items = [WishlistItemFactory()]
+        other.create()
+        other_id = other.id
+
+        with self.count_queries() as statements:
+            resp = self.client.delete(f"{BASE_URL}/customers/{customer_id}")
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(len([sql for sql in statements if sql.startswith("DELETE")]), 1)
+
+        for wishlist_id in wishlist_ids:
+            self.assertEqual(WishlistItem.find_by_wishlist_id(wishlist_id), [])
+        self.assertEqual(len(Wishlist.all()), 1)
+        self.assertEqual(len(WishlistItem.find_by_wishlist_id(other_id)), 1)
+
     def test_delete_all_items_by_wishlist_id(self):
         """It should delete all items for a specific wishlist"""
         wishlist = WishlistFactory()
@@ -0,0 +1,73 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the Synthetic Dataset
+"""
+
+import uuid
+from collections import Counter
+from sqlalchemy import func, select
+from service.common import seed
+from service.models import DataValidationError, Wishlist, WishlistItem, db
+from .test_base import TestBase
+
+
+######################################################################
+#  S E E D   T E S T   C A S E S
+######################################################################
+class TestSeed(TestBase):
+    """Synthetic Dataset Test Cases"""
+
+    def test_same_seed_same_rows(self):
+        """It should generate the same rows for the same seed only"""
+        first = list(seed.generate(50, seed=7))
+        self.assertEqual(first, list(seed.generate(50, seed=7)))
+        self.assertNotEqual(first, list(seed.generate(50, seed=8)))
+        wishlist, items = first[0]
+        self.assertEqual(str(uuid.UUID(wishlist["id"])), wishlist["id"])
+        self.assertEqual(uuid.UUID(wishlist["id"]).version, 4)
+        for item in items:
+            self.assertEqual(item["wishlist_id"], wishlist["id"])
+            self.assertTrue(wishlist["created_date"] <= item["added_date"] <= item["modified_date"] <= seed.LAST_DAY)
+
+    def test_skewed_distributions(self):
+        """It should give most customers one Wishlist and most Wishlists a few items, with long tails"""
+        shape = seed.Shape(max_wishlists=10, max_items=50, products=100)
+        rows = list(seed.generate(2000, shape))
+        per_customer = Counter(Counter(wishlist["customer_id"] for wishlist, _ in rows).values())
+        self.assertEqual(max(per_customer, key=per_customer.get), 1)
+        self.assertGreater(per_customer[1], per_customer[2])
+        self.assertLessEqual(max(per_customer), 10)
+        counts = sorted(wishlist["item_count"] for wishlist, _ in rows)
+        self.assertLessEqual(counts[len(counts) // 2], 3)
+        self.assertEqual(counts[-1], 50)
+        products = Counter(item["product_id"] for _, items in rows for item in items)
+        self.assertEqual(products.most_common(1)[0][0], "product-000000")
+
+    def test_seed_database(self):
+        """It should write the Wishlists, their items and totals through the bulk path"""
+        seeded = seed.seed_database(30, seed.Shape(max_items=20), chunk_size=7)
+        self.assertEqual(Wishlist.query.count(), seeded["wishlists"])
+        self.assertEqual(WishlistItem.query.count(), seeded["items"])
+        self.assertGreater(seeded["rows_per_second"], 0)
+        totals = select(
+            WishlistItem.wishlist_id, func.count(), func.sum(WishlistItem.price_cents)  # pylint: disable=not-callable
+        ).group_by(WishlistItem.wishlist_id)
+        for wishlist_id, count, cents in db.session.execute(totals):
+            wishlist = Wishlist.find(wishlist_id)
+            self.assertEqual((wishlist.item_count, wishlist.total_value_cents), (count, cents))
+        self.assertRaises(DataValidationError, seed.seed_database, 1)
@@ -0,0 +1,163 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the sparse fieldsets of the Wishlist responses
+"""
+
+import re
+from service.common import status
+from service.models import Wishlist, DataValidationError
+from .factories import WishlistFactory, WishlistItemFactory
+from .test_base import TestBase
+
+BASE_URL = "/api/wishlists"
+
+
+######################################################################
+#  S P A R S E   F I E L D S   T E S T   C A S E S
+######################################################################
+class TestSparseFields(TestBase):
+    """Sparse Fieldset Test Cases"""
+
+    def setUp(self):
+        """Creates a Wishlist with two items"""
+        super().setUp()
+        self.wishlist = WishlistFactory()
+        self.wishlist.items = WishlistItemFactory.create_batch(2)
+        self.wishlist.create()
+        self.wishlist_id = self.wishlist.id
+
+    def item_queries(self, statements) -> list:
+        """Returns the statements that read the wishlist_item table"""
+        return [sql for sql in statements if re.search(r"\bwishlist_item\b", sql)]
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_default_response_is_unchanged(self):
+        """It should return the whole Wishlist with its items by default"""
+        resp = self.client.get(f"{BASE_URL}/{self.wishlist_id}")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.get_json()
+        self.assertEqual(
+            set(data), {"id", "customer_id", "name", "created_date", "modified_date", "items"}
+        )
+        self.assertEqual(len(data["items"]), 2)
+
+    def test_fields_of_one_wishlist(self):
+        """It should read and return only the requested fields of a Wishlist"""
+        with self.count_queries() as statements:
+            resp = self.client.get(f"{BASE_URL}/{self.wishlist_id}", query_string="fields=name,item_count")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.get_json(), {"name": self.wishlist.name, "item_count": 2})
+        self.assertEqual(self.item_queries(statements), [])
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn("wishlist.customer_id", statements[0])
+        self.assertNotIn("wishlist.modified_date", statements[0])
+
+    def test_fields_with_items(self):
+        """It should return the items when they are included"""
+        resp = self.client.get(
+            f"{BASE_URL}/{self.wishlist_id}", query_string="fields=id,total_value&include=items"
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.get_json()
+        self.assertEqual(set(data), {"id", "total_value", "items"})
+        self.assertEqual(data["total_value"], sum(item.price_cents for item in self.wishlist.items) / 100)
+        self.assertEqual(
+            {item["id"] for item in data["items"]}, {item.id for item in self.wishlist.items}
+        )
+        self.assertTrue(all(item["wishlist_id"] == self.wishlist_id for item in data["items"]))
+
+    def test_compact_items(self):
+        """It should leave the wishlist_id out of compact items"""
+        resp = self.client.get(f"{BASE_URL}/{self.wishlist_id}", query_string="compact=true")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.get_json()
+        self.assertEqual(set(data), {"id", "customer_id", "name", "created_date", "modified_date", "items"})
+        self.assertEqual(len(data["items"]), 2)
+        for item in data["items"]:
+            self.assertNotIn("wishlist_id", item)
+            self.assertIn("price", item)
+
+    def test_fields_of_wishlist_list(self):
+        """It should list only the requested fields without reading the items"""
+        WishlistFactory(customer_id=self.wishlist.customer_id).create()
+        with self.count_queries() as statements:
+            resp = self.client.get(
+                BASE_URL, query_string={"fields": "id,item_count", "customer_id": self.wishlist.customer_id, "limit": 1}
+            )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.item_queries(statements), [])
+        self.assertIn("fields=id,item_count", resp.headers["Link"])
+        data = resp.get_json()
+        self.assertEqual(len(data), 1)
+        self.assertEqual(set(data[0]), {"id", "item_count"})
+
+        resp = self.client.get(BASE_URL, query_string="fields=name&include=items&compact=1")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        listed = next(entry for entry in resp.get_json() if entry["items"])
+        self.assertEqual(set(listed), {"name", "items"})
+        self.assertNotIn("wishlist_id", listed["items"][0])
+
+    def test_x_fields_mask(self):
+        """It should apply the X-Fields mask to the Wishlists and their items, over the fields asked for"""
+        url = f"{BASE_URL}/{self.wishlist_id}"
+        mask = {"X-Fields": "name,items{product_id}"}
+        products = sorted(item.product_id for item in self.wishlist.items)
+        resp = self.client.get(url, headers=mask)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.get_json()
+        self.assertEqual(set(data), {"name", "items"})
+        self.assertEqual(sorted(item["product_id"] for item in data["items"]), products)
+        self.assertEqual(set(data["items"][0]), {"product_id"})
+
+        resp = self.client.get(BASE_URL, headers=mask)
+        self.assertEqual([set(wishlist) for wishlist in resp.get_json()], [{"name", "items"}])
+        resp = self.client.get(url, query_string="fields=name,item_count", headers={"X-Fields": "item_count"})
+        self.assertEqual(resp.get_json(), {"item_count": 2})
+        resp = self.client.get(f"{url}/items", headers={"X-Fields": "product_id"})
+        self.assertEqual(sorted(item["product_id"] for item in resp.get_json()), products)
+        self.assertEqual(set(resp.get_json()[0]), {"product_id"})
+
+    def test_x_fields_representations(self):
+        """It should cache and tag each X-Fields mask as its own representation"""
+        self.cache_responses()
+        url = f"{BASE_URL}/{self.wishlist_id}"
+        whole = self.client.get(url)
+        masked = self.client.get(url, headers={"X-Fields": "name"})
+        self.assertEqual(masked.get_json(), {"name": self.wishlist.name})
+        self.assertNotEqual(masked.headers["ETag"], whole.headers["ETag"])
+        self.assertEqual(set(self.client.get(url).get_json()), set(whole.get_json()))
+        resp = self.client.get(url, headers={"X-Fields": "id", "If-None-Match": masked.headers["ETag"]})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.get_json(), {"id": self.wishlist_id})
+        resp = self.client.get(url, headers={"X-Fields": "name", "If-None-Match": masked.headers["ETag"]})
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_bad_fields(self):
+        """It should not accept unknown fields or includes"""
+        for url in (f"{BASE_URL}/{self.wishlist_id}", BASE_URL):
+            for query in ("fields=id,password", "fields=,", "include=owner", "compact=maybe"):
+                resp = self.client.get(url, query_string=query)
+                self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST, f"{url}?{query}")
+
+    def test_parse_fields(self):
+        """It should parse a comma separated list of fields"""
+        self.assertEqual(Wishlist.parse_fields(" id, name "), ["id", "name"])
+        self.assertRaises(DataValidationError, Wishlist.parse_fields, "id,items")
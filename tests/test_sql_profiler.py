@@ -0,0 +1,83 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the SQL Profiler
+"""
+
+import re
+from unittest.mock import patch
+from wsgi import app
+from service.common import sql_profiler, status
+from service.models import Wishlist, db
+from .factories import WishlistFactory, WishlistItemFactory
+from .test_base import TestBase
+
+BASE_URL = "/api/wishlists"
+SERVER_TIMING = re.compile(r'^sql;dur=\d+\.\d{3};desc="(\d+) statements"')
+
+
+######################################################################
+#  S Q L   P R O F I L E R   T E S T   C A S E S
+######################################################################
+class TestSqlProfiler(TestBase):
+    """SQL Profiler Test Cases"""
+
+    def test_server_timing(self):
+        """It should send the number and time of the statements of a request in Server-Timing"""
+        wishlist = WishlistFactory()
+        wishlist.items = WishlistItemFactory.create_batch(3)
+        wishlist.create()
+        url = f"{BASE_URL}/{wishlist.id}"
+        with patch.dict(app.config, {"SQL_PROFILE": True}):
+            with self.count_queries() as statements:
+                resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        match = SERVER_TIMING.match(resp.headers["Server-Timing"])
+        self.assertIsNotNone(match)
+        self.assertEqual(int(match.group(1)), len(statements))
+        self.assertNotIn("sql-repeats", resp.headers["Server-Timing"])
+        self.assertIsNone(sql_profiler.current.get())
+
+    def test_profiling_off(self):
+        """It should neither profile nor send Server-Timing when SQL_PROFILE is off"""
+        with patch.dict(app.config, {"SQL_PROFILE": False}):
+            resp = self.client.get(BASE_URL)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Server-Timing", resp.headers)
+
+    def test_n_plus_one_suspects(self):
+        """It should flag the statements that a request runs more than the repeat limit"""
+        for _ in range(4):
+            wishlist = WishlistFactory()
+            wishlist.items = WishlistItemFactory.create_batch(2)
+            wishlist.create()
+        config = {"SQL_PROFILE": True, "SQL_PROFILE_REPEAT_LIMIT": 3}
+        with patch.dict(app.config, config), app.test_request_context(BASE_URL):
+            sql_profiler.start_profile()
+            db.session.expire_all()
+            # Loads the items of each Wishlist lazily, one query per Wishlist
+            wishlists = [wishlist.serialize() for wishlist in Wishlist.query.all()]
+            with self.assertLogs(app.logger, "WARNING") as logs:
+                resp = sql_profiler.report_profile(app.response_class())
+            sql_profiler.end_profile(None)
+        self.assertEqual(sum(len(wishlist["items"]) for wishlist in wishlists), 8)
+        self.assertTrue(resp.headers["Server-Timing"].startswith('sql;dur='))
+        self.assertIn('desc="5 statements"', resp.headers["Server-Timing"])
+        self.assertIn('sql-repeats;desc="1 statements run 4 times"', resp.headers["Server-Timing"])
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("N+1 suspect: GET /api/wishlists ran 4 times: SELECT ... FROM wishlist_item WHERE", logs.output[0])
+        self.assertIsNone(sql_profiler.current.get())
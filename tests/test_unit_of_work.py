@@ -0,0 +1,94 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the request-scoped Unit of Work
+"""
+
+from contextlib import contextmanager
+from unittest.mock import patch
+from sqlalchemy import event
+from wsgi import app
+from service.common import status
+from service.models import Wishlist, db, unit_of_work_active
+from .factories import WishlistFactory, WishlistItemFactory
+from .test_base import TestBase
+
+BASE_URL = "/api/wishlists"
+
+
+######################################################################
+#  U N I T   O F   W O R K   T E S T   C A S E S
+######################################################################
+class TestUnitOfWork(TestBase):
+    """Unit of Work Test Cases"""
+
+    @contextmanager
+    def count_commits(self):
+        """Counts the transactions committed inside the with block"""
+        commits = []
+
+        def after_commit(session):
+            commits.append(session)
+
+        event.listen(db.session, "after_commit", after_commit)
+        try:
+            yield commits
+        finally:
+            event.remove(db.session, "after_commit", after_commit)
+
+    def test_multi_object_request_commits_once(self):
+        """It should commit a Wishlist and its items exactly once"""
+        wishlist = WishlistFactory().serialize()
+        wishlist["items"] = [item.serialize() for item in WishlistItemFactory.create_batch(3)]
+        with self.count_commits() as commits:
+            resp = self.client.post(BASE_URL, json=wishlist)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(commits), 1)
+        self.assertFalse(unit_of_work_active())
+
+        found = Wishlist.find(resp.get_json()["id"])
+        self.assertEqual(len(found.items), 3)
+
+    def test_failed_request_rolls_back(self):
+        """It should discard the staged changes of a request that fails"""
+        with self.count_commits() as commits:
+            resp = self.client.post(BASE_URL, json={"name": "", "customer_id": "1"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(commits, [])
+
+    def test_commit_error(self):
+        """It should answer 500 and roll back when the final commit fails"""
+        with patch.object(db.session, "commit", side_effect=Exception("disk full")):
+            resp = self.client.post(BASE_URL, json=WishlistFactory().serialize())
+        self.assertEqual(resp.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertIn("disk full", resp.get_json()["message"])
+        self.assertEqual(Wishlist.all(), [])
+
+    def test_unit_of_work_disabled(self):
+        """It should commit in every model call when the unit of work is off"""
+        with patch.dict(app.config, {"UNIT_OF_WORK": False}):
+            resp = self.client.post(BASE_URL, json=WishlistFactory().serialize())
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(Wishlist.all()), 1)
+
+    def test_flush_only(self):
+        """It should only stage a Wishlist when asked not to commit"""
+        wishlist = WishlistFactory()
+        wishlist.create(commit=False)
+        self.assertIsNotNone(Wishlist.find(wishlist.id))
+        db.session.rollback()
+        self.assertEqual(Wishlist.all(), [])
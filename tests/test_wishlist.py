@@ -18,9 +18,12 @@
 Test cases for Wishlist Model
 """
 
+import uuid
 from datetime import date
 from unittest.mock import patch
-from service.models import Wishlist, DataValidationError
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from service.models import Wishlist, DataValidationError, db
 from .factories import WishlistFactory, WishlistItemFactory
 from .test_base import TestBase
 
@@ -28,6 +31,7 @@ from .test_base import TestBase
 ######################################################################
 #        W I S H L I S T   M O D E L   T E S T   C A S E S
 ######################################################################
+# pylint: disable=too-many-public-methods
 class TestWishlist(TestBase):
     """Wishlist Model Test Cases"""
 
@@ -238,3 +242,67 @@ class TestWishlist(TestBase):
         # Check if the item is moved
         self.assertNotIn(item, source_wishlist.items)
         self.assertIn(item, target_wishlist.items)
+
+    def test_delete_by_customer_id(self):
+        """It should Delete all Wishlists of a customer and report how many"""
+        for wishlist in WishlistFactory.create_batch(3, customer_id="doomed"):
+            wishlist.create()
+        WishlistFactory(customer_id="spared").create()
+        self.assertEqual(Wishlist.delete_by_customer_id("doomed"), 3)
+        self.assertEqual(Wishlist.delete_by_customer_id("doomed"), 0)
+        self.assertEqual(len(Wishlist.all()), 1)
+
+    @patch("service.models.db.session.commit")
+    def test_delete_by_customer_id_failed(self, exception_mock):
+        """It should not Delete the Wishlists of a customer on database error"""
+        exception_mock.side_effect = Exception()
+        self.assertRaises(DataValidationError, Wishlist.delete_by_customer_id, "doomed")
+
+    def test_create_many(self):
+        """It should Create many Wishlists and their items at once"""
+        wishlists = []
+        for fake_wishlist in WishlistFactory.create_batch(2):
+            data = fake_wishlist.serialize()
+            data["items"] = [WishlistItemFactory().serialize()]
+            wishlists.append(Wishlist().deserialize(data))
+        Wishlist.create_many(wishlists)
+        for wishlist in wishlists:
+            found = Wishlist.find(wishlist.id)
+            self.assertEqual(found.name, wishlist.name)
+            self.assertEqual(len(found.items), 1)
+
+    @patch("service.models.db.session.commit")
+    def test_create_many_failed(self, exception_mock):
+        """It should not Create many Wishlists on database error"""
+        exception_mock.side_effect = Exception()
+        wishlist = Wishlist().deserialize(WishlistFactory().serialize())
+        self.assertRaises(DataValidationError, Wishlist.create_many, [wishlist])
+
+    def test_find_owners(self):
+        """It should find the customer of each existing Wishlist"""
+        wishlist = WishlistFactory()
+        wishlist.create()
+        statements = []
+        listener = lambda state: statements.append(state.statement)  # noqa: E731 pylint: disable=unnecessary-lambda-assignment
+        event.listen(db.session, "do_orm_execute", listener)
+        try:
+            owners = Wishlist.find_owners([wishlist.id, "missing"], lock=True)
+        finally:
+            event.remove(db.session, "do_orm_execute", listener)
+        self.assertEqual(owners, {wishlist.id: wishlist.customer_id})
+        # The totals of the rows are updated next, which a FOR SHARE lock would deadlock
+        sql = str(statements[-1].compile(dialect=postgresql.dialect()))
+        self.assertIn("FOR NO KEY UPDATE", sql)
+        self.assertNotIn("FOR SHARE", sql)
+
+    def test_uuid_keys(self):
+        """It should keep UUID keys as strings and find nothing for other ids"""
+        wishlist = WishlistFactory(id=None)
+        wishlist.create()
+        db.session.expire_all()
+        found = Wishlist.find(wishlist.id)
+        self.assertIsInstance(found.id, str)
+        self.assertEqual(found.id, str(uuid.UUID(wishlist.id)))
+        self.assertIsNone(Wishlist.find(wishlist.id.upper().replace("-", "") + "0"))
+        self.assertEqual(Wishlist.find(wishlist.id.upper()).id, wishlist.id)
+        self.assertIsNone(Wishlist.find("not-a-uuid"))
@@ -19,7 +19,7 @@ Test cases for WishlistItem Model
 """
 
 from unittest.mock import patch
-from service.models import Wishlist, WishlistItem, DataValidationError
+from service.models import Wishlist, WishlistItem, DataValidationError, db
 from tests.factories import WishlistFactory, WishlistItemFactory
 from .test_base import TestBase
 
@@ -74,14 +74,16 @@ class TestWishlistItem(TestBase):
 
         new_wishlist = Wishlist.find(wishlist.id)
         self.assertEqual(len(new_wishlist.items), 2)
-        self.assertEqual(new_wishlist.items[1].id, item2.id)
-        self.assertEqual(new_wishlist.items[1].wishlist_id, item2.wishlist_id)
-        self.assertEqual(new_wishlist.items[1].product_id, item2.product_id)
-        self.assertEqual(new_wishlist.items[1].description, item2.description)
-        self.assertEqual(new_wishlist.items[1].product_id, item2.product_id)
-        self.assertAlmostEqual(float(new_wishlist.items[1].price), float(item2.price))
-        self.assertEqual(new_wishlist.items[1].added_date, item2.added_date)
-        self.assertEqual(new_wishlist.items[1].modified_date, item2.modified_date)
+        # Items come back in no particular order
+        new_item2 = next(found for found in new_wishlist.items if found.id != item.id)
+        self.assertEqual(new_item2.id, item2.id)
+        self.assertEqual(new_item2.wishlist_id, item2.wishlist_id)
+        self.assertEqual(new_item2.product_id, item2.product_id)
+        self.assertEqual(new_item2.description, item2.description)
+        self.assertEqual(new_item2.product_id, item2.product_id)
+        self.assertAlmostEqual(float(new_item2.price), float(item2.price))
+        self.assertEqual(new_item2.added_date, item2.added_date)
+        self.assertEqual(new_item2.modified_date, item2.modified_date)
 
     @patch("service.models.db.session.commit")
     def test_add_wishlist_item_failed(self, exception_mock):
@@ -187,3 +189,97 @@ class TestWishlistItem(TestBase):
         item = WishlistItem()
 
         self.assertRaises(DataValidationError, item.deserialize, data)
+
+    def test_find_for_wishlist(self):
+        """It should find the sorted and filtered items of a Wishlist"""
+        wishlist = WishlistFactory()
+        wishlist.items = [WishlistItemFactory(price=price) for price in (30, 10, 20)]
+        wishlist.create()
+        items = WishlistItem.find_for_wishlist(
+            wishlist.id, sort_by="price", order="desc", max_price=25
+        )
+        self.assertEqual([float(item.price) for item in items], [20, 10])
+        items = WishlistItem.find_for_wishlist(
+            wishlist.id, sort_by="price", limit=1, offset=1
+        )
+        self.assertEqual([float(item.price) for item in items], [20])
+        self.assertRaises(
+            DataValidationError, WishlistItem.find_for_wishlist, wishlist.id, sort_by="wishlist"
+        )
+        self.assertRaises(
+            DataValidationError, WishlistItem.find_for_wishlist, wishlist.id, order="up"
+        )
+
+    def test_delete_by_wishlist_id(self):
+        """It should delete all items of a Wishlist and report how many"""
+        wishlist = WishlistFactory()
+        wishlist.items = WishlistItemFactory.create_batch(3)
+        wishlist.create()
+        self.assertEqual(WishlistItem.delete_by_wishlist_id(wishlist.id), 3)
+        self.assertEqual(WishlistItem.find_by_wishlist_id(wishlist.id), [])
+        self.assertEqual(WishlistItem.delete_by_wishlist_id(wishlist.id), 0)
+
+    @patch("service.models.db.session.commit")
+    def test_delete_by_wishlist_id_failed(self, exception_mock):
+        """It should not delete the items of a Wishlist on database error"""
+        exception_mock.side_effect = Exception()
+        self.assertRaises(DataValidationError, WishlistItem.delete_by_wishlist_id, "0")
+
+    @patch("service.models.db.session.commit")
+    def test_create_many_failed(self, exception_mock):
+        """It should not add many items to a Wishlist on database error"""
+        exception_mock.side_effect = Exception()
+        items = [WishlistItemFactory()]
+        self.assertRaises(DataValidationError, WishlistItem.create_many, "0", items)
+
+    def test_move(self):
+        """It should move an item to another Wishlist only from its own Wishlist"""
+        source = WishlistFactory()
+        source.items = [WishlistItemFactory()]
+        source.create()
+        target = WishlistFactory(customer_id=source.customer_id)
+        target.create()
+        item_id = source.items[0].id
+
+        self.assertIsNone(WishlistItem.move(item_id, target.id, source.id))
+        item = WishlistItem.move(item_id, source.id, target.id)
+        self.assertEqual(item.id, item_id)
+        self.assertEqual(item.wishlist_id, target.id)
+        self.assertEqual(WishlistItem.find(item_id).wishlist_id, target.id)
+
+    @patch("service.models.db.session.commit")
+    def test_move_failed(self, exception_mock):
+        """It should not move an item on database error"""
+        exception_mock.side_effect = Exception()
+        wishlist = WishlistFactory()
+        wishlist.items = [WishlistItemFactory()]
+        db.session.add(wishlist)
+        db.session.flush()
+        self.assertRaises(
+            DataValidationError, WishlistItem.move, wishlist.items[0].id, wishlist.id, wishlist.id
+        )
+
+    def test_price_in_cents(self):
+        """It should store the price in cents and serialize it in dollars"""
+        wishlist = WishlistFactory()
+        wishlist.items = [WishlistItemFactory(price=19.99), WishlistItemFactory(price=20.01)]
+        wishlist.create()
+        self.assertEqual(wishlist.items[0].price_cents, 1999)
+        self.assertEqual(wishlist.items[0].serialize()["price"], 19.99)
+
+        condition = (WishlistItem.price <= "20").compile()
+        self.assertIn("price_cents", str(condition))
+        self.assertEqual(list(condition.params.values()), [2000])
+        items = WishlistItem.find_by_price(wishlist.id, 20)
+        self.assertEqual([item.price for item in items], [19.99])
+
+    def test_largest_price(self):
+        """It should store the prices of the old Numeric(10, 2) column past 32 bits of cents"""
+        wishlist = WishlistFactory()
+        wishlist.items = [WishlistItemFactory(price=99999999.99)]
+        wishlist.create()
+        db.session.expire_all()
+        item = WishlistItem.find(wishlist.items[0].id)
+        self.assertEqual((item.price_cents, item.price), (9999999999, 99999999.99))
+        self.assertEqual(Wishlist.find(wishlist.id).total_value_cents, 9999999999)
+        self.assertIsInstance(WishlistItem.__table__.c.price_cents.type, db.BigInteger)
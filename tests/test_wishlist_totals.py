@@ -0,0 +1,183 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Test cases for the item totals kept on the Wishlists
+"""
+
+import re
+from datetime import date
+from unittest.mock import patch
+from sqlalchemy import update
+from service.common import status
+from service.models import Wishlist, WishlistItem, DataValidationError, db
+from .factories import WishlistFactory, WishlistItemFactory
+from .test_base import TestBase
+
+BASE_URL = "/api/wishlists"
+
+
+######################################################################
+#  W I S H L I S T   T O T A L S   T E S T   C A S E S
+######################################################################
+class TestWishlistTotals(TestBase):
+    """Wishlist Totals Test Cases"""
+
+    def assert_totals(self, wishlist_id, count, cents, last_added):
+        """Checks the totals in the session and in the database"""
+        wishlist = Wishlist.find(wishlist_id)
+        self.assertEqual(
+            (wishlist.item_count, wishlist.total_value_cents, wishlist.last_item_added),
+            (count, cents, last_added),
+        )
+        db.session.expire(wishlist)
+        self.assertEqual(
+            (wishlist.item_count, wishlist.total_value_cents, wishlist.last_item_added),
+            (count, cents, last_added),
+        )
+
+    def create_wishlist(self, *items, **kwargs):
+        """Creates a Wishlist with items of the given (price, added_date)"""
+        wishlist = WishlistFactory(**kwargs)
+        wishlist.items = [WishlistItemFactory(price=price, added_date=added) for price, added in items]
+        wishlist.create()
+        return wishlist
+
+    ######################################################################
+    #  T E S T   C A S E S
+    ######################################################################
+
+    def test_totals_of_new_wishlist(self):
+        """It should count the items a Wishlist is created with"""
+        wishlist = self.create_wishlist((1.5, date(2024, 1, 2)), (2.25, date(2024, 1, 1)))
+        self.assertEqual(wishlist.item_count, 2)
+        self.assertEqual(wishlist.total_value, 3.75)
+        self.assert_totals(wishlist.id, 2, 375, date(2024, 1, 2))
+
+        empty = WishlistFactory()
+        empty.create()
+        self.assert_totals(empty.id, 0, 0, None)
+
+    def test_totals_follow_item_changes(self):
+        """It should update the totals when an item is added, repriced or deleted"""
+        wishlist = self.create_wishlist((10, date(2024, 1, 1)))
+        item = WishlistItemFactory(wishlist=wishlist, price=5, added_date=date(2024, 2, 1))
+        item.create()
+        self.assert_totals(wishlist.id, 2, 1500, date(2024, 2, 1))
+
+        item.price = 7.5
+        item.update()
+        self.assert_totals(wishlist.id, 2, 1750, date(2024, 2, 1))
+
+        item.added_date = date(2023, 12, 1)
+        item.update()
+        self.assert_totals(wishlist.id, 2, 1750, date(2024, 1, 1))
+
+        item.delete()
+        self.assert_totals(wishlist.id, 1, 1000, date(2024, 1, 1))
+
+    def test_totals_of_appended_items(self):
+        """It should count the items appended to an existing Wishlist"""
+        wishlist = self.create_wishlist((10, date(2024, 1, 1)))
+        wishlist.items.append(WishlistItemFactory(price=1, added_date=date(2024, 3, 1)))
+        wishlist.update()
+        self.assert_totals(wishlist.id, 2, 1100, date(2024, 3, 1))
+
+    def test_totals_of_bulk_inserts(self):
+        """It should count the items of the bulk inserts"""
+        wishlist = Wishlist().deserialize(WishlistFactory().serialize())
+        wishlist.items = [
+            WishlistItem().deserialize(WishlistItemFactory(price=price).serialize()) for price in (1, 2)
+        ]
+        Wishlist.create_many([wishlist])
+        self.assert_totals(wishlist.id, 2, 300, date.today())
+
+        items = [WishlistItem().deserialize(WishlistItemFactory(price=4).serialize())]
+        WishlistItem.create_many(wishlist.id, items)
+        self.assert_totals(wishlist.id, 3, 700, date.today())
+
+    def test_totals_of_move(self):
+        """It should move an item between the totals of two Wishlists"""
+        source = self.create_wishlist((1, date(2024, 1, 1)), (2, date(2024, 5, 1)))
+        target = self.create_wishlist((4, date(2024, 2, 1)))
+        moved = next(item for item in source.items if item.price == 2)
+        WishlistItem.move(moved.id, source.id, target.id)
+        self.assert_totals(source.id, 1, 100, date(2024, 1, 1))
+        self.assert_totals(target.id, 2, 600, date(2024, 5, 1))
+
+    def test_totals_of_bulk_delete(self):
+        """It should reset the totals when every item is deleted"""
+        wishlist = self.create_wishlist((1, date(2024, 1, 1)), (2, date(2024, 5, 1)))
+        WishlistItem.delete_by_wishlist_id(wishlist.id)
+        self.assert_totals(wishlist.id, 0, 0, None)
+
+    def test_rollback_discards_totals(self):
+        """It should not apply the totals of a change that was rolled back"""
+        wishlist = self.create_wishlist((1, date(2024, 1, 1)))
+        with patch("service.models.wishlist_item.apply_totals", side_effect=Exception()):
+            self.assertRaises(DataValidationError, WishlistItem.delete_by_wishlist_id, wishlist.id)
+        self.assertNotIn("wishlist_totals", db.session.info)
+        self.assert_totals(wishlist.id, 1, 100, date(2024, 1, 1))
+
+    def test_recount_totals(self):
+        """It should repair the totals that drifted from the items"""
+        good = self.create_wishlist((1, date(2024, 1, 1)))
+        bad = self.create_wishlist((2, date(2024, 5, 1)), (3, date(2024, 6, 1)))
+        db.session.execute(
+            update(Wishlist)
+            .where(Wishlist.id == bad.id)
+            .values(item_count=9, total_value_cents=1, last_item_added=None)
+        )
+        db.session.commit()
+        self.assertEqual(Wishlist.recount_totals(), 1)
+        db.session.expire_all()
+        self.assert_totals(good.id, 1, 100, date(2024, 1, 1))
+        self.assert_totals(bad.id, 2, 500, date(2024, 6, 1))
+        self.assertEqual(Wishlist.recount_totals(), 0)
+
+    @patch("service.models.db.session.commit")
+    def test_recount_totals_failed(self, exception_mock):
+        """It should not recount the totals on database error"""
+        exception_mock.side_effect = Exception()
+        self.assertRaises(DataValidationError, Wishlist.recount_totals)
+
+    def test_summary_view(self):
+        """It should list the totals of the Wishlists without reading their items"""
+        wishlist = self.create_wishlist(
+            (1.25, date(2024, 1, 1)), (2, date(2024, 5, 1)), created_date=date(1999, 1, 1)
+        )
+        WishlistFactory(customer_id=wishlist.customer_id).create()
+
+        with self.count_queries() as statements:
+            resp = self.client.get(
+                BASE_URL, query_string={"view": "summary", "customer_id": wishlist.customer_id, "limit": 1}
+            )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([sql for sql in statements if re.search(r"\bwishlist_item\b", sql)], [])
+        self.assertIn("view=summary", resp.headers["Link"])
+        data = resp.get_json()
+        self.assertEqual(len(data), 1)
+        summary = data[0]
+        self.assertNotIn("items", summary)
+        self.assertEqual(summary["id"], wishlist.id)
+        self.assertEqual(summary["item_count"], 2)
+        self.assertEqual(summary["total_value"], 3.25)
+        self.assertEqual(summary["last_item_added"], "2024-05-01")
+
+    def test_summary_view_bad_value(self):
+        """It should not accept an unknown view"""
+        resp = self.client.get(BASE_URL, query_string="view=everything")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)